@@ -0,0 +1,118 @@
+"""
+Benchmark dos backends de armazenamento do chat bot (JSON write-behind x SQLite WAL).
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_chat_storage --users 10000 --turns 20 --ops 2000
+"""
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chat_storage import JsonChatStorage, SqliteChatStorage
+from utils.persistence import atomic_write_json
+
+
+def build_json_fixture(path, users, turns):
+    """Gera um gemini_chat_data.json com `users` usuários e `turns` mensagens cada"""
+    base = datetime(2025, 1, 1)
+    history = {}
+    for user_id in range(1, users + 1):
+        history[str(user_id)] = [
+            {
+                "role": "user" if i % 2 == 0 else "model",
+                "content": f"mensagem {i} do usuário {user_id} " + "x" * 120,
+                "timestamp": (base + timedelta(seconds=i)).isoformat()
+            }
+            for i in range(turns)
+        ]
+    atomic_write_json(path, {"conversation_history": history})
+
+
+def timed(label, func, results):
+    start = time.perf_counter()
+    value = func()
+    results[label] = time.perf_counter() - start
+    return value
+
+
+async def bench_backend(name, storage, user_ids, ops, keep_last):
+    """Roda dentro do event loop, como no bot: o JSON agrupa as gravações em lote"""
+    results = {}
+    timed("load", storage.load, results)
+
+    sample = [random.choice(user_ids) for _ in range(ops)]
+
+    def appends():
+        for user_id in sample:
+            storage.append(user_id, "user", "nova mensagem " + "y" * 120, datetime.now().isoformat(), keep_last)
+
+    timed("append", appends, results)
+    start = time.perf_counter()
+    await storage.flush()
+    results["flush"] = time.perf_counter() - start
+    timed("get_history", lambda: [storage.get_history(user_id) for user_id in sample], results)
+    timed("stats", lambda: [storage.stats(user_id) for user_id in sample], results)
+
+    print(f"\n[{name}]")
+    print(f"  carga inicial:           {results['load'] * 1000:10.1f} ms")
+    print(f"  {ops} appends:          {results['append'] * 1000:10.1f} ms "
+          f"({results['append'] / ops * 1e6:.1f} µs/op)")
+    print(f"  gravação final (flush):  {results['flush'] * 1000:10.1f} ms")
+    print(f"  {ops} get_history:      {results['get_history'] * 1000:10.1f} ms "
+          f"({results['get_history'] / ops * 1e6:.1f} µs/op)")
+    print(f"  {ops} stats:            {results['stats'] * 1000:10.1f} ms "
+          f"({results['stats'] / ops * 1e6:.1f} µs/op)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    user_ids = list(range(1, args.users + 1))
+    keep_last = args.turns
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_file = os.path.join(tmp, "gemini_chat_data.json")
+        db_file = os.path.join(tmp, "gemini_chat_data.db")
+
+        print(f"Gerando fixture: {args.users} usuários x {args.turns} mensagens...")
+        build_json_fixture(json_file, args.users, args.turns)
+        print(f"Tamanho do JSON: {os.path.getsize(json_file) / 1024 / 1024:.1f} MB")
+
+        # Custo antigo: cada mensagem regravava o arquivo inteiro com indent=4
+        with open(json_file, "r", encoding="utf-8") as f:
+            document = json.load(f)
+        start = time.perf_counter()
+        with open(os.path.join(tmp, "legacy.json"), "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=4, ensure_ascii=False)
+        legacy_save = time.perf_counter() - start
+        print(f"\n[legado] save_data() síncrono por mensagem: {legacy_save * 1000:.1f} ms "
+              f"(até 3x por mensagem no event loop)")
+        del document
+
+        json_storage = JsonChatStorage(json_file)
+        asyncio.run(bench_backend("json (write-behind)", json_storage, user_ids, args.ops, keep_last))
+
+        sqlite_storage = SqliteChatStorage(db_file)
+        start = time.perf_counter()
+        migrated = sqlite_storage.migrate_from_json(json_file)
+        print(f"\n[migração] {migrated} mensagens em {(time.perf_counter() - start) * 1000:.1f} ms")
+        asyncio.run(bench_backend("sqlite (WAL)", sqlite_storage, user_ids, args.ops, keep_last))
+        asyncio.run(sqlite_storage.close())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark dos modos de contador regressivo do StudyCamMode.
+
+Compara, por aviso, as chamadas à API do Discord e os despertares do event loop:
+  - legado:    uma task por membro acordando a cada 1 s e editando nos marcos
+  - edits:     agendador único, edições só nos marcos (30/20/15/10/5/3/2/1 s)
+  - timestamp: agendador único, embed com <t:prazo:R>; só o envio e a edição final
+
+O tempo é comprimido por --scale (0.02 = 1 s simulado dura 20 ms).
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_countdown_modes --members 20 --scale 0.02
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scheduler import DeadlineScheduler
+from utils.countdown import (COUNTDOWN_MODE_EDITS, COUNTDOWN_MODE_TIMESTAMP, COUNTDOWN_INTERVALS,
+                             countdown_intervals_for_mode, next_countdown_step)
+
+WARNING_TIME = 60
+
+
+class Counters:
+    def __init__(self):
+        self.api_calls = 0
+        self.wakeups = 0
+
+
+async def run_legacy(members, scale):
+    """Reproduz o loop antigo: asyncio.sleep(1) por membro e edição quando cruza um marco"""
+    counters = Counters()
+    loop = asyncio.get_running_loop()
+
+    async def monitor():
+        counters.api_calls += 1  # envio do aviso
+        start = loop.time()
+        last_update = WARNING_TIME + 1
+        while True:
+            counters.wakeups += 1
+            elapsed = (loop.time() - start) / scale
+            remaining = max(0, int(WARNING_TIME - elapsed))
+            if elapsed >= WARNING_TIME:
+                counters.api_calls += 1  # edição final (expulsão)
+                return
+            for interval in COUNTDOWN_INTERVALS:
+                if remaining <= interval and last_update > interval:
+                    last_update = interval
+                    counters.api_calls += 1
+                    break
+            await asyncio.sleep(1.0 * scale)
+
+    await asyncio.gather(*(monitor() for _ in range(members)))
+    return counters
+
+
+async def run_scheduler(members, scale, mode):
+    """Reproduz o fluxo atual: um único agendador com um prazo por membro"""
+    counters = Counters()
+    scheduler = DeadlineScheduler()
+    intervals = countdown_intervals_for_mode(mode)
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+    finished = 0
+
+    def schedule(member_id, start, last_step=None):
+        remaining = WARNING_TIME - (loop.time() - start) / scale
+        step = next_countdown_step(remaining, intervals, last_step)
+        if step is not None:
+            async def tick():
+                schedule(member_id, start, last_step=step)
+                counters.api_calls += 1
+            scheduler.schedule(member_id, (remaining - step) * scale, tick)
+        else:
+            async def expire():
+                nonlocal finished
+                counters.api_calls += 1  # edição final (expulsão)
+                finished += 1
+                if finished == members:
+                    done.set()
+            scheduler.schedule(member_id, remaining * scale, expire)
+
+    for member_id in range(members):
+        counters.api_calls += 1  # envio do aviso
+        schedule(member_id, loop.time())
+        await asyncio.sleep(0.137 * scale)  # entradas espalhadas no tempo
+
+    await done.wait()
+    counters.wakeups = scheduler.wakeups
+    return counters
+
+
+def report(name, counters, members):
+    print(f"  {name:<10} API/aviso: {counters.api_calls / members:5.1f}   "
+          f"despertares/aviso: {counters.wakeups / members:6.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"{args.members} avisos simultâneos de {WARNING_TIME}s (escala {args.scale}):")
+    report("legado", await run_legacy(args.members, args.scale), args.members)
+    report(COUNTDOWN_MODE_EDITS, await run_scheduler(args.members, args.scale, COUNTDOWN_MODE_EDITS), args.members)
+    report(COUNTDOWN_MODE_TIMESTAMP, await run_scheduler(args.members, args.scale, COUNTDOWN_MODE_TIMESTAMP),
+           args.members)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,6 @@
+import os
 import time
+import random
 import asyncio
 import discord
 from discord import app_commands
@@ -7,29 +9,170 @@ from constants.constants_prod import Config
 # Importar os módulos
 from events.focus_mode import FocusMode
 from slash_commands.basic_commands import setup_commands
+from slash_commands.admin_commands import setup_admin_commands, build_stall_embed
 # from slash_commands.gemini_commands import setup_tribunaldo_chat_bot
 from events.chat_bot import TribunaldoChatBot
 from events.study_cam_mode import StudyCamMode
+from utils.dispatcher import OutboundDispatcher, PRIORITY_COSMETIC
+from utils.event_router import VoiceEventRouter
+from utils.startup import resolve_members, sync_commands_if_changed
+from utils.memory_profiler import MemoryProfiler
+from utils.metrics import MetricsRegistry, start_metrics_server
+from utils.loop_watchdog import LoopWatchdog
+
+# Amostragem de memória por subsistema (tracemalloc ligado já na importação, antes do login)
+memory_profiler = MemoryProfiler(interval=Config.MEMORY_PROFILE_INTERVAL)
+if Config.MEMORY_PROFILE_INTERVAL > 0:
+    memory_profiler.start_tracing()
 
 # Configuração do cliente e intents
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True  # NECESSÁRIO para ler conteúdo das mensagens
-client = discord.Client(intents=intents)
+
+client_options = {}
+if Config.LOW_MEMORY_MODE:
+    # Só os eventos que os módulos usam (voz, mensagens, membros); o resto nem chega ao bot
+    intents.typing = False
+    intents.reactions = False
+    intents.invites = False
+    intents.integrations = False
+    intents.webhooks = False
+    intents.emojis_and_stickers = False
+    intents.scheduled_events = False
+    intents.auto_moderation = False
+    # Cache de membros só com quem está em voz; os rastreados entram pelo query_members e saem
+    # do cache ao sair da voz. Cache de mensagens bem menor que o padrão (1000)
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    client_options = {"member_cache_flags": member_cache_flags, "max_messages": 100}
+
+# Sem chunk de todos os membros no login: o cache recebe quem está em voz (GUILD_CREATE),
+# quem aparece nos eventos e os membros rastreados pelos módulos, pedidos sob demanda
+client = discord.Client(intents=intents, chunk_guilds_at_startup=False, **client_options)
 tree = app_commands.CommandTree(client)
 
 # Variáveis globais
 synced = False
+startup_started_at = time.monotonic()
+
+# Hash da última árvore de comandos sincronizada (evita tree.sync quando nada mudou)
+COMMAND_SYNC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "command_sync.json")
+
+# Despachante único das chamadas REST: prioriza moderação e cargos e respeita o orçamento de cada rota
+dispatcher = OutboundDispatcher()
 
 # Inicializar o módulo de modo foco
-focus_mode = FocusMode(client)
-tribunaldo_chat_bot = TribunaldoChatBot(client)
-study_cam_mode = StudyCamMode(client)
+focus_mode = FocusMode(client, dispatcher)
+tribunaldo_chat_bot = TribunaldoChatBot(client, dispatcher)
+study_cam_mode = StudyCamMode(client, dispatcher)
+
+# Eventos de voz: módulos em paralelo, eventos do mesmo membro em ordem dentro de cada módulo.
+# Eventos fora dos canais observados são descartados antes de chegar aos handlers.
+voice_router = VoiceEventRouter()
+voice_router.register("focus_mode", focus_mode.handle_voice_state_update, focus_mode.watched_channel_ids)
+voice_router.register("study_cam_mode", study_cam_mode.handle_voice_state_update,
+                      study_cam_mode.watched_channel_ids)
+
+# Métricas no formato texto do Prometheus, servidas em /metrics pelo próprio event loop do bot.
+# Os módulos guardam os próprios contadores; aqui eles só são lidos na hora da coleta.
+metrics = MetricsRegistry()
+message_latency = metrics.histogram("tribunaldo_message_handler_seconds",
+                                    "Duração de cada handler de on_message", ["subsystem"])
+
+
+async def report_stall(report):
+    """Envia o relatório de travamento do event loop para o canal de log técnico, se configurado"""
+    if not Config.Channels.ID_CANAL_LOG_BOT or not client.is_ready():
+        return
+    channel = client.get_channel(Config.Channels.ID_CANAL_LOG_BOT)
+    if channel:
+        await dispatcher.send(channel, embed=build_stall_embed(report), priority=PRIORITY_COSMETIC)
+
+
+# Vigia do event loop: atraso contínuo, travamentos atribuídos por amostragem de pilha e callbacks lentos
+loop_watchdog = LoopWatchdog(
+    stall_threshold=Config.LOOP_STALL_THRESHOLD_MS / 1000,
+    slow_callback_duration=Config.LOOP_SLOW_CALLBACK_MS / 1000,
+    debug=Config.LOOP_DEBUG,
+    histogram=metrics.histogram("tribunaldo_event_loop_lag_seconds", "Atraso do event loop (medido a cada 0,25s)",
+                                buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)),
+    on_stall=report_stall,
+)
+
+
+def _register_metrics():
+    gemini = tribunaldo_chat_bot.gemini
+    admission = tribunaldo_chat_bot.admission
+    cache = tribunaldo_chat_bot.contextual_cache
+
+    metrics.gauge("tribunaldo_event_loop_lag_max_seconds", "Maior atraso do event loop desde o início",
+                  function=lambda: loop_watchdog.max_lag)
+    metrics.counter("tribunaldo_event_loop_stalls_total", "Travamentos do event loop acima do limite",
+                    function=lambda: loop_watchdog.stall_count)
+    metrics.counter("tribunaldo_event_loop_slow_callbacks_total", "Callbacks lentos (só com LOOP_DEBUG)",
+                    function=lambda: loop_watchdog.slow_callback_count)
+
+    # Eventos de voz
+    metrics.register(voice_router.latency)
+    metrics.counter("tribunaldo_voice_events_total", "Eventos de voz recebidos, roteados ou descartados no filtro",
+                    ["result"], function=lambda: {"routed": voice_router.routed, "dropped": voice_router.dropped})
+    metrics.counter("tribunaldo_voice_handler_errors_total", "Erros nos handlers de voz", ["subsystem"],
+                    function=lambda: voice_router.errors)
+    metrics.gauge("tribunaldo_voice_pending_events", "Eventos de voz aguardando nas filas por membro",
+                  function=lambda: voice_router.metrics()["pending_events"])
+
+    # Gemini
+    metrics.register(gemini.latency)
+    metrics.counter("tribunaldo_gemini_requests_total", "Chamadas ao Gemini por resultado", ["outcome"],
+                    function=lambda: {"completed": gemini.completed, "timeout": gemini.timeouts,
+                                      "cancelled": gemini.cancelled, "error": gemini.errors})
+    metrics.gauge("tribunaldo_gemini_in_flight", "Chamadas ao Gemini em andamento", function=lambda: gemini.in_flight)
+    metrics.counter("tribunaldo_gemini_tokens_total",
+                    "Tokens do Gemini: informados pela API (prompt/output) e reservados na cota", ["kind"],
+                    function=lambda: {"prompt": gemini.prompt_tokens, "output": gemini.output_tokens,
+                                      "reserved": gemini.tokens_reserved})
+    metrics.gauge("tribunaldo_gemini_queue_depth", "Pedidos na fila de admissão por faixa", ["lane"],
+                  function=lambda: admission.metrics()["queue_depth"])
+    metrics.counter("tribunaldo_gemini_admitted_total", "Pedidos admitidos na cota por faixa", ["lane"],
+                    function=lambda: admission.admitted)
+    metrics.counter("tribunaldo_gemini_rejected_total", "Pedidos recusados ou deslocados por faixa", ["lane"],
+                    function=lambda: admission.rejected)
+
+    # Chat bot
+    metrics.counter("tribunaldo_opinion_cache_lookups_total", "Consultas ao cache de respostas de opinião",
+                    ["result"], function=lambda: {"hit": cache.hits, "miss": cache.misses,
+                                                  "deduplicated": cache.deduplicated})
+    metrics.gauge("tribunaldo_opinion_cache_bytes", "Tamanho estimado do cache de respostas de opinião",
+                  function=lambda: cache.metrics()["bytes"])
+    metrics.gauge("tribunaldo_chat_sessions", "Sessões de chat vivas no pool",
+                  function=lambda: tribunaldo_chat_bot.sessions.metrics()["sessions"])
+    metrics.gauge("tribunaldo_chat_history", "Histórico do chat bot guardado", ["kind"],
+                  function=lambda: tribunaldo_chat_bot.storage.size())
+
+    # Modo foco e study cam
+    metrics.gauge("tribunaldo_focus_pending_jobs", "Remoções de cargo de restrição agendadas",
+                  function=lambda: len(focus_mode.jobs))
+    metrics.gauge("tribunaldo_study_cam_members", "Membros monitorados no canal com câmera", ["state"],
+                  function=lambda: {"monitoring": len(study_cam_mode.monitoring_members),
+                                    "continuous": len(study_cam_mode.continuous_monitoring)})
+
+    # Chamadas REST ao Discord
+    metrics.counter("tribunaldo_discord_calls_total", "Chamadas REST ao Discord por tipo de rota", ["route"],
+                    function=lambda: dispatcher.calls_by_route)
+    metrics.counter("tribunaldo_discord_rate_limited_total", "Respostas 429 recebidas do Discord",
+                    function=lambda: dispatcher.rate_limited)
+    metrics.gauge("tribunaldo_discord_queue_depth", "Chamadas REST na fila por prioridade", ["priority"],
+                  function=lambda: dispatcher.metrics()["queue_depth"])
+
+
+_register_metrics()
 
 
 @client.event
 async def on_ready():
-    global synced
+    """Roda no primeiro login e em cada nova sessão do gateway (retomadas não disparam on_ready)"""
+    global synced, startup_started_at
     await client.wait_until_ready()
 
     if not synced:
@@ -37,13 +180,16 @@ async def on_ready():
         try:
             # Configurar comandos slash
             setup_commands(tree)
+            setup_admin_commands(tree, loop_watchdog)
             # setup_tribunaldo_chat_bot(tree, tribunaldo_chat_bot)
 
             # Log dos comandos registrados no CommandTree
-            print(
-                f"Comandos registrados no CommandTree: {[command.name for command in tree.get_commands(guild=discord.Object(id=Config.ID_DO_SERVIDOR))]}")
-            await tree.sync(guild=discord.Object(id=Config.ID_DO_SERVIDOR))
-            print("Comandos sincronizados com sucesso!")
+            server = discord.Object(id=Config.ID_DO_SERVIDOR)
+            print(f"Comandos registrados no CommandTree: {[command.name for command in tree.get_commands(guild=server)]}")
+            if await sync_commands_if_changed(tree, server, COMMAND_SYNC_FILE):
+                print("Comandos sincronizados com sucesso!")
+            else:
+                print("Comandos inalterados desde a última sincronização - tree.sync ignorado")
             synced = True
         except Exception as e:
             print(f"Erro ao sincronizar comandos: {e}")
@@ -55,57 +201,150 @@ async def on_ready():
         print("Servidor não encontrado. Verifique o ID.")
         return
 
-    # Forçar a busca dos membros para preencher o cache
-    print("Buscando membros do servidor para preencher o cache...")
-    async for member in guild.fetch_members(limit=None):
-        pass
-    print(f"Cache de membros preenchido. Total de membros: {len(guild.members)}")
+    # Buscar pelo gateway só os membros que os módulos rastreiam (quem está em voz já vem no cache)
+    tracked = focus_mode.tracked_member_ids() | study_cam_mode.tracked_member_ids()
+    fetched = await resolve_members(guild, tracked)
+    print(f"Membros rastreados: {len(tracked)} ({fetched} buscados). Membros em cache: {len(guild.members)}")
 
     # Inicializar o modo foco e modo study cam na inicialização
     await focus_mode.initialize_restrictions()
+    await study_cam_mode.initialize()
+
+    if Config.MEMORY_PROFILE_INTERVAL > 0:
+        memory_profiler.start()
+    if startup_started_at is not None:
+        print(f"Modos foco e study cam ativos {time.monotonic() - startup_started_at:.1f}s após o início")
+        startup_started_at = None
+
+
+@client.event
+async def on_resumed():
+    """Sessão retomada: o cache foi mantido e os eventos perdidos são reenviados, nada a refazer"""
+    print("Sessão do gateway retomada.")
 
 
 @client.event
 async def on_voice_state_update(member, before, after):
-    await focus_mode.handle_voice_state_update(member, before, after)
-    await study_cam_mode.handle_voice_state_update(member, before, after)
+    voice_router.dispatch(member, before, after)
 
 
 @client.event
 async def on_message(message):
     """Processa mensagens para o chat bot"""
-    await tribunaldo_chat_bot.handle_message(message)
+    with message_latency.time(subsystem="chat_bot"):
+        await tribunaldo_chat_bot.handle_message(message)
+
+
+@client.event
+async def on_raw_message_delete(payload):
+    """Cancela a resposta do chat bot se a mensagem do usuário for apagada antes dela"""
+    tribunaldo_chat_bot.cancel_request(payload.message_id)
+
+
+async def flush_state():
+    """Grava em disco o estado pendente dos módulos antes de reiniciar ou encerrar"""
+    try:
+        await voice_router.join()
+        await tribunaldo_chat_bot.flush()
+        await focus_mode.jobs.flush()
+        await study_cam_mode.flush()
+    except Exception as e:
+        print(f"Erro ao gravar estado pendente: {e}")
+
+
+# Espera entre tentativas de reconexão: exponencial com jitter, de RECONNECT_BASE_DELAY até RECONNECT_MAX_DELAY
+RECONNECT_BASE_DELAY = 2
+RECONNECT_MAX_DELAY = 1800
+# Uma sessão que durou pelo menos isso (segundos) zera a sequência de falhas
+RECONNECT_STABLE_AFTER = 300
+
+
+def _retry_after(error):
+    """Tempo de espera pedido pelo Discord em um 429 (None se não veio na resposta)"""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    if isinstance(error, discord.HTTPException) and error.status == 429:
+        headers = getattr(error.response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _backoff_delay(attempt):
+    """Espera exponencial com jitter: metade fixa e metade sorteada, para não reconectar em rajada"""
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def supervise():
+    """Mantém o bot conectado, reabrindo o cliente após falhas que o discord.py não recupera sozinho.
+
+    Quedas do gateway são retomadas (RESUME) pelo próprio client.start(reconnect=True); só
+    chegam aqui erros de login, rate limit (429) e afins. Antes de cada nova tentativa o
+    cliente é fechado e limpo (client.clear) e o estado pendente dos módulos vai para o disco.
+    """
+    metrics_runner = None
+    if Config.METRICS_PORT:
+        try:
+            metrics_runner = await start_metrics_server(metrics, Config.METRICS_PORT, Config.METRICS_HOST)
+            print(f"Métricas disponíveis em {Config.METRICS_HOST}:{Config.METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"Não foi possível abrir o endpoint de métricas na porta {Config.METRICS_PORT}: {e}")
+    loop_watchdog.start()
+
+    attempt = 0
+    try:
+        while True:
+            started_at = time.monotonic()
+            try:
+                await client.start(Config.TOKEN, reconnect=True)
+                print("Cliente do Discord encerrado.")
+                return
+            except (discord.LoginFailure, discord.PrivilegedIntentsRequired) as e:
+                # Token inválido ou intents não liberadas no portal: tentar de novo não resolve
+                print(f"Erro fatal ao conectar, o bot não vai tentar de novo: {e}")
+                return
+            except Exception as e:
+                error = e
+
+            if not client.is_closed():
+                await client.close()
+            client.clear()
+            await flush_state()
+
+            if time.monotonic() - started_at >= RECONNECT_STABLE_AFTER:
+                attempt = 0
+            retry_after = _retry_after(error)
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, 1)
+                print(f"Rate limit (Erro 429). Aguardando {delay:.1f}s (retry_after) antes de reconectar...")
+            else:
+                delay = _backoff_delay(attempt)
+                print(f"Erro na conexão ({type(error).__name__}: {error}). "
+                      f"Tentativa {attempt + 1}, reconectando em {delay:.1f}s...")
+            attempt += 1
+            await asyncio.sleep(delay)
+    finally:
+        print("Encerrando o bot. Gravando dados pendentes...")
+        if not client.is_closed():
+            await client.close()
+        await flush_state()
+        loop_watchdog.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+
 
 def run_bot():
     """
     Função que o server.py chama para rodar o bot no deploy.
-    Inclui um loop infinito com tratamento de exceções para garantir
-    que o bot continue rodando mesmo após erros de conexão ou rate limit.
+    Roda o supervisor de reconexão em um event loop próprio (o Flask fica na sua thread).
     """
-    loop = asyncio.get_event_loop()
-    while True:
-        try:
-            # Inicia o bot
-            loop.run_until_complete(client.start(Config.TOKEN))
-        except discord.errors.HTTPException as e:
-            # Verifica se o erro é de "Too Many Requests" (Rate Limit)
-            if e.status == 429:
-                print("======================================================")
-                print("Fomos bloqueados por Rate Limit (Erro 429).")
-                print("Aguardando 30 minutos antes de tentar reconectar...")
-                print(f"Detalhes do erro: {e.text}")
-                print("======================================================")
-                time.sleep(1800)  # Dorme por 30 minutos
-            # Trata outros erros de HTTP
-            else:
-                print(f"Ocorreu um erro de HTTP não tratado: {e}")
-                print("Aguardando 1 minuto antes de tentar de novo...")
-                time.sleep(60)  # Espera 1 minuto
-        except Exception as e:
-            # Trata qualquer outro erro inesperado
-            print(f"Ocorreu um erro inesperado: {e}")
-            print("Aguardando 10 segundos antes de reiniciar...")
-            time.sleep(10)
+    try:
+        asyncio.run(supervise())
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
-     run_bot()
\ No newline at end of file
+     run_bot()
@@ -7,12 +7,42 @@ class Config:
     TOKEN = os.getenv("TOKEN")
     ID_DO_SERVIDOR = int(os.getenv("ID_DO_SERVIDOR"))
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    # Perfil para o container de 128 MB: cache de membros só de voz/rastreados, menos intents e caches menores
+    LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "false").lower() in ("1", "true", "yes")
+    # Intervalo (segundos, mínimo 60) da amostragem de memória por subsistema com tracemalloc; 0 desativa
+    MEMORY_PROFILE_INTERVAL = int(os.getenv("MEMORY_PROFILE_INTERVAL", "0"))
+    # Porta do endpoint /metrics (formato Prometheus) servido pelo event loop do bot; 0 (padrão) desativa.
+    # Só escuta localmente; para expor a outra máquina, definir METRICS_HOST (ex.: 0.0.0.0)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    # Vigia do event loop: atraso (ms) que conta como travamento e limite (ms) de callback lento.
+    # O registro de callbacks lentos usa o modo debug do asyncio, que custa CPU: desligado por padrão
+    LOOP_STALL_THRESHOLD_MS = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "500"))
+    LOOP_SLOW_CALLBACK_MS = int(os.getenv("LOOP_SLOW_CALLBACK_MS", "100"))
+    LOOP_DEBUG = os.getenv("LOOP_DEBUG", "false").lower() in ("1", "true", "yes")
+    # Backend do histórico do chat bot: "json" ou "sqlite" (padrão no modo de pouca memória: nada fica residente)
+    CHAT_STORAGE_BACKEND = os.getenv("CHAT_STORAGE_BACKEND", "sqlite" if LOW_MEMORY_MODE else "json")
+    # Contador dos avisos do canal com câmera: "edits" (edita o embed) ou "timestamp" (<t:prazo:R>)
+    STUDY_CAM_COUNTDOWN_MODE = os.getenv("STUDY_CAM_COUNTDOWN_MODE", "edits")
+    # Chamadas simultâneas à API do Gemini e tempo máximo (segundos) de cada uma
+    GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+    GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+    # Cota da API do Gemini (requisições e tokens por minuto) e tamanho da fila de espera
+    GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+    GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+    GEMINI_QUEUE_SIZE = int(os.getenv("GEMINI_QUEUE_SIZE", "20"))
+    # Respostas do chat bot em streaming (primeiro pedaço enviado logo, resto por edições); opcional
+    GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "false").lower() in ("1", "true", "yes")
+    # Janela (ms) para juntar mensagens seguidas do mesmo usuário em uma única resposta; 0 desativa
+    CHAT_COALESCE_WINDOW_MS = int(os.getenv("CHAT_COALESCE_WINDOW_MS", "0"))
 
     class Channels:
         ID_CANAL_VOZ_FOCO = int(os.getenv("ID_CANAL_VOZ_FOCO"))
         ID_CANAL_LOG_FOCO = int(os.getenv("ID_CANAL_LOG_FOCO"))
         ID_CANAL_CHAT_BOT = int(os.getenv("ID_CANAL_CHAT_BOT"))
         ID_CANAL_VOZ_CAMERA = int(os.getenv("ID_CANAL_VOZ_CAMERA"))
+        # Canal de log técnico do bot (travamentos do event loop); 0 desativa
+        ID_CANAL_LOG_BOT = int(os.getenv("ID_CANAL_LOG_BOT", "0"))
 
     class Roles:
         ID_CARGO_RESTRICAO = int(os.getenv("ID_CARGO_RESTRICAO"))
@@ -1,29 +1,317 @@
 import os
+import time
 import asyncio
-import json
+import weakref
 import textwrap
 import discord
 import google.generativeai as genai
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager, aclosing
 from datetime import datetime, timedelta
 from constants.constants_prod import Config
+from utils.chat_storage import create_chat_storage
+from utils.ttl import TTLDict
+from utils.edit_coalescer import MessageEditCoalescer
+from utils.response_cache import ResponseCache
+from utils.metrics import Histogram
+from utils.admission import (AdmissionController, AdmissionRejected, LANE_DEDICATED, LANE_MENTION,
+                             LANE_BACKGROUND, LANE_NAMES)
+
+
+def _normalize_reply_text(text):
+    """Normaliza o texto da resposta para a chave do cache (caixa e espaços não importam)"""
+    return " ".join(text.lower().split())
+
+
+class GeminiClient:
+    """Camada de acesso ao Gemini usando a API assíncrona do SDK.
+
+    As chamadas rodam direto no event loop (sem ocupar threads do executor padrão),
+    limitadas por um semáforo de `max_concurrency` e por um timeout por requisição.
+    Antes do semáforo, cada chamada passa pelo controle de admissão global (cota de
+    RPM/TPM, faixas de prioridade e fila limitada), se houver um. Cada requisição pode ser identificada pelo id da mensagem do usuário; se a
+    mensagem for apagada, `cancel(request_id)` cancela a requisição em andamento.
+    """
+
+    def __init__(self, model, max_concurrency=4, timeout=30.0, admission=None, max_output_tokens=1000):
+        self.model = model
+        self.timeout = timeout
+        self.admission = admission
+        self.max_output_tokens = max_output_tokens
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # request_id -> task que está aguardando a resposta
+        self._requests = {}
+
+        # Métricas
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.tokens_reserved = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latency = Histogram("tribunaldo_gemini_request_seconds",
+                                 "Duração das chamadas ao Gemini (a partir da vaga no semáforo)", ["lane"])
+
+    async def send_chat(self, chat, prompt, request_id=None, lane=LANE_MENTION, context_tokens=0):
+        """Envia `prompt` na sessão de chat `chat` (que guarda o histórico da conversa).
+
+        `context_tokens`: estimativa dos tokens do histórico da sessão, para a cota de TPM.
+        """
+        async with self._slot(request_id, lane, self._estimate_tokens(prompt, context_tokens)):
+            response = await asyncio.wait_for(chat.send_message_async(prompt), self.timeout)
+            self._record_usage(response)
+            return response
+
+    async def generate(self, prompt, request_id=None, lane=LANE_MENTION):
+        """Gera uma resposta avulsa, sem histórico"""
+        async with self._slot(request_id, lane, self._estimate_tokens(prompt)):
+            response = await asyncio.wait_for(self.model.generate_content_async(prompt), self.timeout)
+            self._record_usage(response)
+            return response
+
+    async def stream_chat(self, chat, prompt, request_id=None, lane=LANE_MENTION, context_tokens=0):
+        """Como `send_chat`, mas devolve o texto em pedaços conforme o modelo gera.
+
+        O timeout vale para a espera de cada pedaço, não para a resposta inteira.
+        """
+        async with self._slot(request_id, lane, self._estimate_tokens(prompt, context_tokens)):
+            response = await asyncio.wait_for(chat.send_message_async(prompt, stream=True), self.timeout)
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    break
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Pedaço sem texto (ex.: só metadados de segurança)
+                    continue
+                if text:
+                    yield text
+            self._record_usage(response)
+
+    def _record_usage(self, response):
+        """Soma os tokens informados pela API (usage_metadata), quando vierem na resposta"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+            self.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+
+    def _estimate_tokens(self, prompt, context_tokens=0):
+        """Reserva de tokens da chamada: prompt (~4 caracteres por token), histórico e resposta máxima"""
+        return len(prompt) // 4 + 1 + context_tokens + self.max_output_tokens
+
+    @contextmanager
+    def track(self, request_id):
+        """Liga `request_id` à task atual, para que `cancel(request_id)` a interrompa"""
+        task = asyncio.current_task()
+        if request_id is not None:
+            self._requests[request_id] = task
+        try:
+            yield
+        finally:
+            if request_id is not None and self._requests.get(request_id) is task:
+                del self._requests[request_id]
+
+    @asynccontextmanager
+    async def _slot(self, request_id, lane, tokens):
+        """Passa pela admissão, ocupa uma vaga do semáforo e registra a requisição para cancelamento e métricas"""
+        with self.track(request_id):
+            self.queued += 1
+            try:
+                if self.admission:
+                    await self.admission.acquire(lane, tokens)
+                await self._semaphore.acquire()
+            finally:
+                self.queued -= 1
+
+            self.tokens_reserved += tokens
+            self.in_flight += 1
+            started_at = time.perf_counter()
+            try:
+                yield
+                self.completed += 1
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+                self.latency.observe(time.perf_counter() - started_at, lane=LANE_NAMES.get(lane, "background"))
+
+    def cancel(self, request_id):
+        """Cancela a requisição ligada a `request_id` (ex.: a mensagem do usuário foi apagada)"""
+        task = self._requests.pop(request_id, None)
+        if task and not task.done():
+            task.cancel()
+            return True
+        return False
+
+    def metrics(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "tokens_reserved": self.tokens_reserved,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+class _PooledSession:
+    __slots__ = ("chat", "tokens", "last_used")
+
+    def __init__(self, chat, tokens):
+        self.chat = chat
+        self.tokens = tokens
+        self.last_used = time.monotonic()
+
+
+class ChatSessionPool:
+    """Sessões de chat do Gemini mantidas vivas por usuário.
+
+    Usuários ativos reaproveitam a sessão (que já guarda o histórico) em vez de
+    converter o histórico salvo e recriar a sessão a cada mensagem. As sessões saem
+    do pool por LRU (`max_sessions`), por inatividade (`idle_ttl`) ou quando o
+    histórico estimado passa de `max_tokens`; a próxima mensagem recria a sessão a
+    partir do histórico persistido. Cada usuário tem um lock: uma sessão nunca
+    recebe duas mensagens ao mesmo tempo.
+    """
+
+    def __init__(self, max_sessions=200, idle_ttl=1800.0, max_tokens=2000):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_tokens = max_tokens
+        # user_id -> _PooledSession, do menos para o mais recente
+        self._sessions = OrderedDict()
+        # Locks somem sozinhos quando ninguém mais os usa (nem dono nem quem espera)
+        self._locks = weakref.WeakValueDictionary()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def lock(self, user_id):
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    def get(self, user_id):
+        """Retorna a sessão viva do usuário, ou None se precisar ser recriada"""
+        self._evict_idle()
+        pooled = self._sessions.get(user_id)
+        if pooled is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        pooled.last_used = time.monotonic()
+        self._sessions.move_to_end(user_id)
+        return pooled
+
+    def put(self, user_id, chat, tokens):
+        pooled = self._sessions[user_id] = _PooledSession(chat, tokens)
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+        return pooled
+
+    def record_turn(self, user_id, tokens):
+        """Soma os tokens da troca à sessão; acima do orçamento ela é recriada (com resumo) na próxima"""
+        pooled = self._sessions.get(user_id)
+        if pooled is None:
+            return
+        pooled.tokens += tokens
+        if pooled.tokens > self.max_tokens:
+            self.invalidate(user_id)
+
+    def invalidate(self, user_id):
+        """Descarta a sessão do usuário (histórico limpo, resumido ou sessão com erro)"""
+        self._drop(user_id)
+
+    def _drop(self, user_id):
+        self._sessions.pop(user_id, None)
+
+    def _evict_idle(self):
+        limit = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            user_id, pooled = next(iter(self._sessions.items()))
+            if pooled.last_used > limit:
+                break
+            self._drop(user_id)
+            self.evictions += 1
+
+    def metrics(self):
+        return {
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
 
 
 class TribunaldoChatBot:
-    def __init__(self, client):
+    def __init__(self, client, dispatcher):
         self.client = client
+        self.dispatcher = dispatcher
         diretorio_base = os.path.dirname(os.path.abspath(__file__)) # Diretório do script atual
         diretorio_gemini_data = os.path.join(diretorio_base, "data")
         os.makedirs(diretorio_gemini_data, exist_ok=True)  # Criar o diretório data, se não existir
         nome_arquivo_gemini_data = "gemini_chat_data.json"
         self.data_file = os.path.join(diretorio_gemini_data, nome_arquivo_gemini_data)
-        self.conversation_history = {}
-        self.user_cooldowns = {}
         self.cooldown_time = 5  # 5 segundos entre mensagens
-        self.max_history_per_user = 10  # Máximo de mensagens na história por usuário
+        # Cooldowns só em memória: cada entrada expira junto com o cooldown
+        self.user_cooldowns = TTLDict(ttl=self.cooldown_time, max_size=10000)
         self.max_tokens = 1000  # Limite de tokens por resposta
+        self.context_token_budget = 2000  # Orçamento (estimado) de tokens do histórico enviado no prompt
+        self.summary_max_chars = 1200  # Tamanho máximo do resumo das mensagens antigas
+        self._summarizing = set()  # Usuários com resumo em andamento
+        # Agrupamento de mensagens seguidas (0 desativa): janela e espera máxima em segundos
+        self.coalesce_window = Config.CHAT_COALESCE_WINDOW_MS / 1000
+        self.coalesce_max_wait = self.coalesce_window * 4
+        self._coalescing = {}  # (user_id, channel_id) -> mensagens da janela aberta
+        self.coalesced_messages = 0
+        # Sessões de chat vivas dos usuários ativos (recriadas do histórico salvo quando saem do pool)
+        self.sessions = ChatSessionPool(max_sessions=50 if Config.LOW_MEMORY_MODE else 200,
+                                        idle_ttl=600 if Config.LOW_MEMORY_MODE else 1800,
+                                        max_tokens=self.context_token_budget)
+        self.streaming = Config.GEMINI_STREAMING  # Enviar a resposta conforme ela é gerada
+        self.stream_edit_interval = 1.0  # Intervalo mínimo (segundos) entre edições da resposta em streaming
+        # Edições da resposta em streaming: só a renderização mais recente vai para a API
+        self.edits = MessageEditCoalescer(dispatcher)
+        # Respostas de opinião (menção em resposta a outra pessoa), por mensagem referenciada + texto
+        self.contextual_cache = ResponseCache(ttl=600, max_entries=256,
+                                              max_bytes=250_000 if Config.LOW_MEMORY_MODE else 1_000_000)
+
+        # Backend de armazenamento: "json" (arquivo único, write-behind) ou "sqlite" (WAL, por usuário)
+        self.storage = create_chat_storage(Config.CHAT_STORAGE_BACKEND, diretorio_gemini_data)
 
         # Configurar a API do Gemini
         self._setup_gemini()
+        # Admissão global na cota do Gemini: canal dedicado antes de menções, resumos por último
+        self.admission = AdmissionController(rpm=Config.GEMINI_RPM, tpm=Config.GEMINI_TPM,
+                                             max_queue=Config.GEMINI_QUEUE_SIZE)
+        self.gemini = GeminiClient(self.model, max_concurrency=Config.GEMINI_MAX_CONCURRENCY,
+                                   timeout=Config.GEMINI_TIMEOUT, admission=self.admission,
+                                   max_output_tokens=self.max_tokens)
 
         # Carregar dados na inicialização
         self.load_data()
@@ -99,42 +387,19 @@ class TribunaldoChatBot:
             self.model = None
 
     def load_data(self):
-        """Carrega os dados do arquivo JSON"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.conversation_history = {int(k): v for k, v in data.get("conversation_history", {}).items()}
-                    # Converter timestamps de volta para datetime objects
-                    cooldowns = data.get("user_cooldowns", {})
-                    self.user_cooldowns = {
-                        int(k): datetime.fromisoformat(v) for k, v in cooldowns.items()
-                    }
-            except Exception as e:
-                print(f"Erro ao carregar dados do Gemini Chat: {e}")
-                self.conversation_history = {}
-                self.user_cooldowns = {}
-        else:
-            self.conversation_history = {}
-            self.user_cooldowns = {}
-
-    def save_data(self):
-        """Salva os dados no arquivo JSON"""
+        """Carrega os dados do armazenamento configurado"""
         try:
-            # Converter datetime objects para strings ISO
-            cooldowns_serializable = {
-                str(k): v.isoformat() for k, v in self.user_cooldowns.items()
-            }
-
-            data = {
-                "conversation_history": {str(k): v for k, v in self.conversation_history.items()},
-                "user_cooldowns": cooldowns_serializable
-            }
-
-            with open(self.data_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            self.storage.load()
         except Exception as e:
-            print(f"Erro ao salvar dados do Gemini Chat: {e}")
+            print(f"Erro ao carregar dados do Gemini Chat: {e}")
+
+    def save_data(self):
+        """Salva imediatamente todos os dados pendentes (uso fora do event loop)"""
+        self.storage.flush_sync()
+
+    async def flush(self):
+        """Força a gravação dos dados pendentes"""
+        await self.storage.flush()
 
     def _is_user_on_cooldown(self, user_id):
         """Verifica se o usuário está em cooldown"""
@@ -142,89 +407,325 @@ class TribunaldoChatBot:
             return False
 
         now = datetime.now()
-        last_message_time = self.user_cooldowns[user_id]
+        last_message_time = self.user_cooldowns.get(user_id, now)
 
         return (now - last_message_time).total_seconds() < self.cooldown_time
 
     def _update_user_cooldown(self, user_id):
         """Atualiza o cooldown do usuário"""
         self.user_cooldowns[user_id] = datetime.now()
-        self.save_data()
 
     def _add_to_history(self, user_id, role, content):
-        """Adiciona mensagem ao histórico do usuário"""
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = []
-
-        self.conversation_history[user_id].append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+        """Adiciona mensagem ao histórico do usuário.
 
-        # Manter apenas as últimas N mensagens
-        if len(self.conversation_history[
-                   user_id]) > self.max_history_per_user * 2:  # *2 porque cada troca são 2 mensagens
-            self.conversation_history[user_id] = self.conversation_history[user_id][-self.max_history_per_user * 2:]
+        Sem corte por quantidade: o que sai do histórico é decidido pelo orçamento de
+        tokens em `_get_conversation_context`, que manda as mensagens antigas para o
+        resumo antes de removê-las.
+        """
+        self.storage.append(user_id, role, content, datetime.now().isoformat())
 
-        self.save_data()
+    def _estimate_tokens(self, text):
+        """Estimativa barata de tokens (~4 caracteres por token)"""
+        return len(text) // 4 + 1
 
     def _get_conversation_context(self, user_id):
-        """Obtém o contexto da conversa do usuário com o system_prompt inicial"""
-        if user_id not in self.conversation_history:
-            # Inicializar com o system_prompt como primeira mensagem
-            self.conversation_history[user_id] = []
-            # self.save_data()
+        """Obtém o contexto da conversa do usuário no formato do Gemini, dentro do orçamento de tokens.
+
+        As mensagens mais recentes entram até estourar `context_token_budget` (a última
+        sempre entra). As mais antigas ficam de fora do prompt e são condensadas no resumo
+        do usuário em segundo plano; o resumo atual entra no começo do contexto.
+        """
+        history = [message for message in self.storage.get_history(user_id) if message["role"] in ["user", "model"]]
+
+        window_start = len(history)
+        used_tokens = 0
+        while window_start > 0:
+            cost = self._estimate_tokens(history[window_start - 1]["content"])
+            if window_start < len(history) and used_tokens + cost > self.context_token_budget:
+                break
+            used_tokens += cost
+            window_start -= 1
+
+        # O Gemini espera que o histórico comece com uma mensagem do usuário
+        while window_start < len(history) - 1 and history[window_start]["role"] != "user":
+            window_start += 1
+
+        overflow = history[:window_start]
+        if overflow:
+            self._schedule_summary(user_id, overflow)
 
-        # Converter histórico para formato do Gemini
         context = []
-        for message in self.conversation_history.get(user_id, []):
-            if message["role"] in ["user", "model"]:
-                context.append({
-                    "role": message["role"],
-                    "parts": [message["content"]]
-                })
+        summary = self.storage.get_summary(user_id)
+        if summary:
+            context.append({"role": "user", "parts": [f"Resumo da nossa conversa até aqui: {summary}"]})
+            context.append({"role": "model", "parts": ["Beleza, lembrei de tudo! Vamos continuar. 🐺"]})
+
+        for message in history[window_start:]:
+            context.append({
+                "role": message["role"],
+                "parts": [message["content"]]
+            })
         return context
 
-    async def generate_response(self, user_message, user_id, username):
-        """Gera resposta usando a API do Gemini"""
-        if not self.model:
-            return "❌ Desculpe, estou com problemas técnicos no momento. AUUUUU! 🐺"
+    def _schedule_summary(self, user_id, overflow):
+        """Agenda o resumo das mensagens antigas fora do caminho da resposta (uma vez por usuário)"""
+        if user_id in self._summarizing:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._summarizing.add(user_id)
+        loop.create_task(self._summarize_overflow(user_id, list(overflow)))
+
+    async def _summarize_overflow(self, user_id, overflow):
+        """Incorpora as mensagens antigas ao resumo do usuário e as remove do histórico.
 
+        Se não for possível resumir (modelo indisponível, erro ou timeout), as mensagens
+        antigas são apenas descartadas, como no corte simples do histórico.
+        """
         try:
-            # Adicionar mensagem do usuário ao histórico ANTES de processar
-            self._add_to_history(user_id, "user", user_message)
-            history_for_chat = self._get_conversation_context(user_id)
+            if self.model:
+                previous_summary = self.storage.get_summary(user_id)
+                transcript = "\n".join(
+                    f"{'Usuário' if message['role'] == 'user' else 'Tribunaldo'}: {message['content']}"
+                    for message in overflow
+                )
+                prompt = textwrap.dedent(f"""
+                    Atualize o resumo de uma conversa entre um usuário e o Tribunaldo.
+                    Resumo anterior: {previous_summary or "(nenhum)"}
 
-            # Construir um prompt mais inteligente que informa o nome de usuário
-            prompt_para_ia = f"O usuário '{username}' disse: '{user_message}'"
+                    Novas mensagens:
+                    {transcript}
 
-            # Adicionar uma instrução específica baseada no estado da conversa
+                    Escreva um único resumo em português, com no máximo {self.summary_max_chars // 6} palavras,
+                    guardando nomes, objetivos de estudo, preferências e fatos importantes. Não use emojis.
+                    """)
+                try:
+                    response = await self.gemini.generate(prompt, lane=LANE_BACKGROUND)
+                    summary = response.text.strip()[:self.summary_max_chars]
+                    # O histórico pode ter sido limpo enquanto o resumo era gerado
+                    last_timestamp = overflow[-1]["timestamp"]
+                    still_present = any(message["timestamp"] == last_timestamp
+                                        for message in self.storage.get_history(user_id))
+                    if summary and still_present:
+                        self.storage.set_summary(user_id, summary)
+                except Exception as e:
+                    print(f"Erro ao resumir histórico do usuário {user_id}: {e}. Cortando mensagens antigas.")
+
+            self.storage.drop_oldest(user_id, overflow[-1]["timestamp"])
+            # A próxima mensagem recria a sessão já com o resumo novo
+            self.sessions.invalidate(user_id)
+        finally:
+            self._summarizing.discard(user_id)
+
+    def cancel_request(self, message_id):
+        """Cancela a resposta em andamento para a mensagem (chamado quando ela é apagada)"""
+        if self.gemini.cancel(message_id):
+            print(f"Resposta do Gemini cancelada: mensagem {message_id} foi apagada")
+
+    def _prepare_chat(self, user_message, user_id, username):
+        """Registra a mensagem do usuário no histórico e devolve (sessão do pool, prompt) para o Gemini.
+
+        Deve ser chamado com o lock do usuário em `self.sessions`.
+        """
+        # Adicionar mensagem do usuário ao histórico ANTES de processar
+        self._add_to_history(user_id, "user", user_message)
+
+        pooled = self.sessions.get(user_id)
+        if pooled is not None:
+            first_message = not pooled.chat.history
+        else:
+            history_for_chat = self._get_conversation_context(user_id)
             # Se for a primeira mensagem (histórico só tem a mensagem atual do usuário)
-            if len(history_for_chat) <= 1:
-                instrucao_especifica = f"Esta é a primeira mensagem de '{username}'. Cumprimente-o pelo nome de forma animada e pergunte como pode ajudar, seguindo sua personalidade de Tribunaldo."
-            else:
-                # Se a conversa já começou, instruir o bot a continuar naturalmente
-                instrucao_especifica = f"Continue a conversa de forma natural, identificando e falando o nome do '{username}' e respondendo diretamente ao que esse usuário disse. Não precisa usar uma nova saudação como 'Olá' ou 'E aí'."
+            first_message = len(history_for_chat) <= 1
+            # A sessão recebe o histórico sem a última mensagem, que vai no prompt final
+            chat_session_history = history_for_chat[:-1]
+            tokens = sum(self._estimate_tokens(part) for message in chat_session_history for part in message["parts"])
+            pooled = self.sessions.put(user_id, self.model.start_chat(history=chat_session_history), tokens)
+
+        # Construir um prompt mais inteligente que informa o nome de usuário
+        prompt_para_ia = f"O usuário '{username}' disse: '{user_message}'"
+
+        # Adicionar uma instrução específica baseada no estado da conversa
+        if first_message:
+            instrucao_especifica = f"Esta é a primeira mensagem de '{username}'. Cumprimente-o pelo nome de forma animada e pergunte como pode ajudar, seguindo sua personalidade de Tribunaldo."
+        else:
+            # Se a conversa já começou, instruir o bot a continuar naturalmente
+            instrucao_especifica = f"Continue a conversa de forma natural, identificando e falando o nome do '{username}' e respondendo diretamente ao que esse usuário disse. Não precisa usar uma nova saudação como 'Olá' ou 'E aí'."
+
+        # Combinar a instrução com o prompt do usuário
+        prompt_final = f"{instrucao_especifica}\n\n{prompt_para_ia}"
 
-            # Combinar a instrução com o prompt do usuário
-            prompt_final = f"{instrucao_especifica}\n\n{prompt_para_ia}"
+        # O histórico já está na sessão, então envia só o prompt final
+        return pooled, prompt_final
 
-            # O histórico já está sendo gerenciado pelo `start_chat`, então envia o prompt final
-            chat_session_history = history_for_chat[:-1]  # Histórico sem a última mensagem
-            chat = self.model.start_chat(history=chat_session_history)
-            response = await asyncio.to_thread(chat.send_message, prompt_final)
+    def _record_turn(self, user_id, pooled, user_message, ai_response):
+        """Deixa a última troca da sessão igual à do histórico salvo e soma os tokens dela.
 
-            ai_response = response.text.strip()
+        A sessão recebeu o prompt com as instruções, mas uma sessão recriada do
+        histórico só tem a mensagem original: sem a troca, o modelo veria históricos
+        diferentes dependendo de a sessão estar ou não no pool.
+        """
+        try:
+            history = list(pooled.chat.history)
+            if len(history) < 2 or history[-2].role != "user" or history[-1].role != "model":
+                raise ValueError("última troca da sessão fora do formato esperado")
+            history[-2:] = [{"role": "user", "parts": [user_message]},
+                            {"role": "model", "parts": [ai_response]}]
+            pooled.chat.history = history
+        except Exception as e:
+            print(f"Erro ao atualizar a sessão do usuário {user_id}: {e}. Recriando do histórico salvo.")
+            self.sessions.invalidate(user_id)
+            return
+        self.sessions.record_turn(user_id, self._estimate_tokens(user_message) + self._estimate_tokens(ai_response))
+
+    async def generate_response(self, user_message, user_id, username, request_id=None, lane=LANE_MENTION):
+        """Gera resposta usando a API do Gemini"""
+        if not self.model:
+            return "❌ Desculpe, estou com problemas técnicos no momento. AUUUUU! 🐺"
 
-            # Adicionar resposta da IA ao histórico
-            self._add_to_history(user_id, "model", ai_response)
+        try:
+            async with self.sessions.lock(user_id):
+                pooled, prompt_final = self._prepare_chat(user_message, user_id, username)
+                try:
+                    response = await self.gemini.send_chat(pooled.chat, prompt_final, request_id=request_id,
+                                                           lane=lane, context_tokens=pooled.tokens)
+                    ai_response = response.text.strip()
+                except BaseException:
+                    # A sessão pode ter ficado inconsistente: recriar do histórico salvo
+                    self.sessions.invalidate(user_id)
+                    raise
+
+                # Adicionar resposta da IA ao histórico
+                self._add_to_history(user_id, "model", ai_response)
+                self._record_turn(user_id, pooled, user_message, ai_response)
             return ai_response
 
+        except AdmissionRejected as e:
+            print(f"Chamada ao Gemini recusada para {username}: {e}")
+            return "🚦 Fila cheia! Muita gente falando comigo agora, tenta de novo em alguns segundos. AUUUUU! 🐺"
+        except asyncio.TimeoutError:
+            print(f"Timeout ao gerar resposta do Gemini para {username}")
+            return "⏳ Eita, demorei demais pra pensar! Tenta de novo daqui a pouquinho. AUUUUU! 🐺"
         except Exception as e:
             print(f"Erro ao gerar resposta do Gemini: {e}")
             return "❌ Ops! Algo deu errado ao processar sua mensagem. Tente novamente em alguns segundos! AUUUUU! 🐺"
 
+    async def stream_response(self, message, user_message, lane=LANE_MENTION):
+        """Gera a resposta em streaming: envia o primeiro pedaço assim que chega e edita o resto.
+
+        As edições são espaçadas por `stream_edit_interval` e passam pelo agrupador de
+        edições (só a mais recente vai para a API). Ao passar de 2000 caracteres a
+        mensagem atual é fechada e o texto continua em uma nova resposta. O texto
+        completo entra no histórico no final, como na resposta sem streaming.
+        """
+        if not self.model:
+            await self.dispatcher.reply(message, "❌ Desculpe, estou com problemas técnicos no momento. AUUUUU! 🐺")
+            return
+
+        user_id = message.author.id
+        username = message.author.display_name
+        loop = asyncio.get_running_loop()
+        full_text = []
+        current_text = ""
+        current_message = None
+        last_edit = 0.0
+
+        lock = self.sessions.lock(user_id)
+        await lock.acquire()
+        turn_completed = False
+        try:
+            pooled, prompt_final = self._prepare_chat(user_message, user_id, username)
+            # aclosing: se algo falhar no meio (envio/edição no Discord, cancelamento), o gerador é
+            # fechado na hora e libera a vaga da admissão/semáforo sem esperar o GC
+            async with aclosing(self.gemini.stream_chat(pooled.chat, prompt_final, request_id=message.id,
+                                                        lane=lane, context_tokens=pooled.tokens)) as chunks:
+                async for piece in chunks:
+                    full_text.append(piece)
+                    current_text += piece
+
+                    # Fechar a mensagem atual no limite do Discord e continuar em uma nova
+                    while len(current_text) > 2000:
+                        head, current_text = current_text[:2000], current_text[2000:]
+                        if current_message is None:
+                            await self.dispatcher.reply(message, head)
+                        else:
+                            await self.edits.finalize(current_message, content=head)
+                        current_message = None
+
+                    if not current_text.strip():
+                        continue
+                    if current_message is None:
+                        current_message = await self.dispatcher.reply(message, current_text)
+                        last_edit = loop.time()
+                    elif loop.time() - last_edit >= self.stream_edit_interval:
+                        self.edits.submit(current_message, content=current_text)
+                        last_edit = loop.time()
+
+            if current_message is not None:
+                await self.edits.finalize(current_message, content=current_text)
+            elif current_text.strip():
+                await self.dispatcher.reply(message, current_text)
+
+            # Ainda com o lock: a troca da sessão não pode se misturar com a próxima mensagem
+            ai_response = "".join(full_text).strip()
+            if ai_response:
+                # Adicionar resposta completa da IA ao histórico
+                self._add_to_history(user_id, "model", ai_response)
+                self._record_turn(user_id, pooled, user_message, ai_response)
+                turn_completed = True
+            # Sem texto, a sessão é recriada do histórico salvo (que não tem a resposta)
+
+        except AdmissionRejected as e:
+            print(f"Chamada ao Gemini recusada para {username}: {e}")
+            await self.dispatcher.reply(message, "🚦 Fila cheia! Muita gente falando comigo agora, tenta de novo em alguns segundos. AUUUUU! 🐺")
+            return
+        except asyncio.TimeoutError:
+            print(f"Timeout no streaming do Gemini para {username}")
+            if not full_text:
+                await self.dispatcher.reply(
+                    message, "⏳ Eita, demorei demais pra pensar! Tenta de novo daqui a pouquinho. AUUUUU! 🐺")
+            return
+        except Exception as e:
+            print(f"Erro no streaming do Gemini: {e}")
+            if not full_text:
+                await self.dispatcher.reply(
+                    message, "❌ Ops! Algo deu errado ao processar sua mensagem. Tente novamente em alguns segundos! AUUUUU! 🐺")
+            return
+        finally:
+            if not turn_completed:
+                # Stream interrompido: a sessão pode ter ficado inconsistente, recriar do histórico salvo
+                self.sessions.invalidate(user_id)
+            lock.release()
+
+    async def _coalesce(self, message):
+        """Abre (ou reaproveita) a janela de agrupamento do usuário no canal.
+
+        Retorna None se a mensagem entrou em uma janela já aberta. Caso contrário espera
+        até passar `coalesce_window` sem mensagens novas (no máximo `coalesce_max_wait`)
+        e retorna todas as mensagens da janela, na ordem em que chegaram.
+        """
+        key = (message.author.id, message.channel.id)
+        batch = self._coalescing.get(key)
+        if batch is not None:
+            batch.append(message)
+            self.coalesced_messages += 1
+            return None
+
+        batch = self._coalescing[key] = [message]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.coalesce_max_wait
+        try:
+            size = 0
+            # Cada mensagem nova reinicia a janela, até o limite de espera
+            while size != len(batch) and loop.time() < deadline:
+                size = len(batch)
+                await asyncio.sleep(min(self.coalesce_window, deadline - loop.time()))
+        finally:
+            del self._coalescing[key]
+        return batch
+
     async def handle_message(self, message):
         """Processa mensagens no canal dedicado ou com menções em outros canais"""
         # Ignorar mensagens do próprio bot
@@ -241,30 +742,42 @@ class TribunaldoChatBot:
         if not is_dedicated_channel and not is_mentioned:
             return
 
+        # Juntar mensagens seguidas do mesmo usuário no mesmo canal em um único prompt
+        content = message.content
+        if self.coalesce_window > 0:
+            batch = await self._coalesce(message)
+            if batch is None:
+                # Mensagem incorporada a uma janela já aberta: quem abriu a janela responde
+                return
+            message = batch[-1]
+            content = "\n".join(item.content for item in batch)
+            is_mentioned = any(self.client.user in item.mentions for item in batch)
+
         # Verificar cooldown
         if self._is_user_on_cooldown(message.author.id):
             remaining_time = self.cooldown_time - (
-                    datetime.now() - self.user_cooldowns[message.author.id]).total_seconds()
+                    datetime.now() - self.user_cooldowns.get(message.author.id, datetime.now())).total_seconds()
 
             if is_dedicated_channel:
-                await message.reply(
-                    f"🕐 Calma aí, {message.author.mention}! Aguarde mais {remaining_time:.1f} segundos. 🐺")
+                await self.dispatcher.reply(
+                    message, f"🕐 Calma aí, {message.author.mention}! Aguarde mais {remaining_time:.1f} segundos. 🐺")
             else:
-                await message.reply(
-                    f"🕐 Calma aí, {message.author.mention}! Aguarde mais {remaining_time:.1f} segundos antes de me chamar novamente. 🐺")
+                await self.dispatcher.reply(
+                    message, f"🕐 Calma aí, {message.author.mention}! Aguarde mais {remaining_time:.1f} segundos antes de me chamar novamente. 🐺")
             return
 
         # Atualizar cooldown
         self._update_user_cooldown(message.author.id)
 
         # Extrair a mensagem limpa
-        clean_message = message.content
+        clean_message = content
         contextual_prompt = ""
+        contextual_cache_key = None
 
         # Verificar se a mensagem é uma resposta
         if is_mentioned and message.reference and message.reference.message_id:
             try:
-                replied_to_message = await message.channel.fetch_message(message.reference.message_id)
+                replied_to_message = await self.dispatcher.fetch_message(message.channel, message.reference.message_id)
 
                 # Verificar se o autor da mesagem original é o próprio bot
                 # Se for, não é uma opinião contextual, mas uma continuação da conversa
@@ -306,6 +819,9 @@ class TribunaldoChatBot:
                     """)
 
                     clean_message = contextual_prompt
+                    # O prompt cita quem respondeu pelo nome: a chave inclui o autor
+                    contextual_cache_key = (replied_to_message.id, message.author.id,
+                                            _normalize_reply_text(user_reply_content))
 
             except discord.NotFound:
                 print("Não foi possível encontrar a mensagem respondida.")
@@ -323,17 +839,29 @@ class TribunaldoChatBot:
         if not clean_message:
             clean_message = "Opaaa, iae? Tudo belezura?"
 
+        # Conversa normal em streaming: a latência percebida passa a ser a do primeiro pedaço
+        # Canal dedicado tem prioridade sobre menções em outros canais na fila do Gemini
+        lane = LANE_DEDICATED if is_dedicated_channel else LANE_MENTION
+
+        if self.streaming and not contextual_prompt:
+            async with message.channel.typing():
+                await self.stream_response(message, clean_message, lane=lane)
+            return
+
         # Mostrar que está digitando
         async with message.channel.typing():
             # Se for um prompt contextual, gere uma resposta sem usar o histórico
             if contextual_prompt:
-                response = await self.generate_contextual_response(clean_message)
+                response = await self.generate_contextual_response(clean_message, request_id=message.id,
+                                                                   cache_key=contextual_cache_key)
             else:
                 # Caso contrário, use o fluxo normal com histórico.
                 response = await self.generate_response(
                     clean_message,
                     message.author.id,
-                    message.author.display_name
+                    message.author.display_name,
+                    request_id=message.id,
+                    lane=lane
                 )
 
         # Enviar resposta
@@ -342,47 +870,50 @@ class TribunaldoChatBot:
             if len(response) > 2000:
                 chunks = [response[i:i + 2000] for i in range(0, len(response), 2000)]
                 for chunk in chunks:
-                    await message.reply(chunk)
+                    await self.dispatcher.reply(message, chunk)
             else:
-                await message.reply(response)
+                await self.dispatcher.reply(message, response)
         except Exception as e:
             print(f"Erro ao enviar resposta: {e}")
-            await message.reply("❌ Erro ao enviar resposta. Tente novamente! AUUUUU! 🐺")
+            await self.dispatcher.reply(message, "❌ Erro ao enviar resposta. Tente novamente! AUUUUU! 🐺")
 
     async def clear_user_history(self, user_id):
         """Limpa o histórico de conversa de um usuário específico"""
-        if user_id in self.conversation_history:
-            del self.conversation_history[user_id]
-            self.save_data()
-            return True
-        return False
+        self.sessions.invalidate(user_id)
+        return self.storage.clear(user_id)
 
     async def get_user_stats(self, user_id):
         """Retorna estatísticas do usuário"""
-        if user_id not in self.conversation_history:
-            return None
+        return self.storage.stats(user_id)
 
-        history = self.conversation_history[user_id]
-        user_messages = len([msg for msg in history if msg["role"] == "user"])
-        bot_messages = len([msg for msg in history if msg["role"] == "model"])
+    async def generate_contextual_response(self, prompt, request_id=None, cache_key=None):
+        """Gera uma resposta contextual sem usar ou salvar no histórico de conversa do usuário.
 
-        return {
-            "user_messages": user_messages,
-            "bot_responses": bot_messages,
-            "total_interactions": len(history) // 2,
-            "last_interaction": history[-1]["timestamp"] if history else None
-        }
-
-    async def generate_contextual_response(self, prompt):
-        """Gera uma resposta contextual sem usar ou salvar no histórico de conversa do usuário."""
+        Com `cache_key`, respostas recentes para a mesma chave são reaproveitadas e pedidos
+        simultâneos iguais compartilham uma única chamada ao Gemini.
+        """
         if not self.model:
             return "❌ Desculpe, estou com problemas técnicos no momento. AUUUUU! 🐺"
         try:
             # Gera a resposta diretamente do prompt contextual, sem usar o histórico de chat
-            response = await asyncio.to_thread(self.model.generate_content, prompt)
-            ai_response = response.text.strip()
-            return ai_response
-
+            if cache_key is None:
+                response = await self.gemini.generate(prompt, request_id=request_id)
+                return response.text.strip()
+
+            async def generate():
+                response = await self.gemini.generate(prompt)
+                return response.text.strip()
+
+            # A geração compartilhada não é cancelada se só este pedido desistir
+            with self.gemini.track(request_id):
+                return await self.contextual_cache.get_or_create(cache_key, generate)
+
+        except AdmissionRejected as e:
+            print(f"Chamada contextual ao Gemini recusada: {e}")
+            return "🚦 Fila cheia! Muita gente falando comigo agora, tenta de novo em alguns segundos. AUUUUU! 🐺"
+        except asyncio.TimeoutError:
+            print("Timeout ao gerar resposta contextual do Chat Bot")
+            return "⏳ Eita, demorei demais pra pensar! Tenta de novo daqui a pouquinho. AUUUUU! 🐺"
         except Exception as e:
             print(f"Erro ao gerar resposta contextual do Chat Bot: {e}")
-            return "❌ Ops! Algo deu errado ao processar sua mensagem. Tente novamente em alguns segundos! AUUUUU! 🐺"
\ No newline at end of file
+            return "❌ Ops! Algo deu errado ao processar sua mensagem. Tente novamente em alguns segundos! AUUUUU! 🐺"
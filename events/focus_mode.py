@@ -1,14 +1,21 @@
 import os
 import json
 import time
-import asyncio
 import discord
 from constants.constants_prod import Config
+from utils.job_queue import PersistentJobQueue
+from utils.ttl import TTLDict
+from utils.startup import resolve_member
+from utils.dispatcher import PRIORITY_ROLES, PRIORITY_REPLIES
 
 class FocusMode:
-    def __init__(self, client):
+    def __init__(self, client, dispatcher):
         self.client = client
+        self.dispatcher = dispatcher
         self.restriction_time = 10
+        self.focus_channel_id = Config.Channels.ID_CANAL_VOZ_FOCO
+        # Canais de voz observados (usado pelo roteador de eventos de voz para pré-filtrar)
+        self.watched_channel_ids = {self.focus_channel_id}
         self.restriction_role_id = Config.Roles.ID_CARGO_RESTRICAO
         self.focus_mode_role_id = Config.Roles.ID_CARGO_LOBINHO_FOCADO
         self.gym_role_id = Config.Roles.ID_GYM_ROLE
@@ -22,9 +29,14 @@ class FocusMode:
         data_dir = os.path.join(base_dir, "data")  # Diretório data no mesmo nível do projeto
         os.makedirs(data_dir, exist_ok=True)  # Criar o diretório data, se não existir
         self.data_file = os.path.join(data_dir, "time_data.json")
-        self.last_exit_times = {}
+        # Horário de saída do canal de foco; a entrada expira sozinha bem depois do fim da restrição
+        self.last_exit_times = TTLDict(ttl=self.restriction_time + 300, max_size=10000)
         self.removed_roles = {}
 
+        # Fila durável para remover o cargo de restrição, mesmo que o bot reinicie no meio do prazo
+        self.jobs = PersistentJobQueue(os.path.join(data_dir, "focus_jobs.json"), max_concurrency=5)
+        self.jobs.register("remove_restriction", self._expire_restriction)
+
         # Carregar dados na inicialização
         self.load_data()
 
@@ -33,7 +45,15 @@ class FocusMode:
         if os.path.exists(self.data_file):
             with open(self.data_file, "r") as f:
                 data = json.load(f)
-                self.last_exit_times = {int(k): v for k, v in data.get("last_exit_times", {}).items()}
+                self.last_exit_times.clear()
+                for member_id, exit_time in data.get("last_exit_times", {}).items():
+                    member_id = int(member_id)
+                    # Garantir a remoção agendada antes do TTL: saídas antigas (bot fora do ar por
+                    # mais que o TTL) expiram da memória, mas o cargo de restrição ainda precisa sair
+                    if not self.jobs.has_job(member_id, "remove_restriction"):
+                        self.jobs.add(exit_time + self.restriction_time, member_id, "remove_restriction")
+                    self.last_exit_times.set(member_id, exit_time,
+                                             expires_at=exit_time + self.last_exit_times.ttl)
                 self.removed_roles = {int(k): v for k, v in data.get("removed_roles", {}).items()}
         else:
             self.last_exit_times.clear()
@@ -43,12 +63,16 @@ class FocusMode:
     def save_data(self):
         """Salva os dados no arquivo JSON"""
         data = {
-            "last_exit_times": self.last_exit_times,
+            "last_exit_times": dict(self.last_exit_times.items()),
             "removed_roles": self.removed_roles
         }
         with open(self.data_file, "w") as f:
             json.dump(data, f, indent=4)
 
+    def tracked_member_ids(self):
+        """Membros que o modo foco precisa no cache para retomar as restrições"""
+        return set(self.last_exit_times.keys()) | set(self.removed_roles) | self.jobs.member_ids()
+
     async def initialize_restrictions(self):
         """Inicializa as restrições para usuários que saíram do canal"""
         guild = self.client.get_guild(Config.ID_DO_SERVIDOR)
@@ -65,7 +89,7 @@ class FocusMode:
         current_time = time.time()
         for member_id, exit_time in list(self.last_exit_times.items()):
             time_since_exit = current_time - exit_time
-            usuario = guild.get_member(member_id)
+            usuario = await resolve_member(guild, member_id)
             if not usuario:
                 print(f"Usuário {member_id} não encontrado no servidor. Removendo do last_exit_times.")
                 del self.last_exit_times[member_id]
@@ -76,15 +100,20 @@ class FocusMode:
                 if restriction_role not in usuario.roles:
                     print(
                         f"Adicionando cargo de restrição a {usuario} (tempo restante: {self.restriction_time - time_since_exit} segundos).")
-                    await usuario.add_roles(restriction_role)
+                    await self.dispatcher.add_roles(usuario, restriction_role, priority=PRIORITY_ROLES)
             else:
-                print(f"Período de restrição expirado para {usuario}. Removendo do last_exit_times.")
-                del self.last_exit_times[member_id]
-                self.save_data()
+                print(f"Período de restrição expirado para {usuario}. Agendando remoção imediata.")
+
+            # Garantir que a remoção esteja agendada (dados antigos podem não ter a tarefa na fila)
+            if not self.jobs.has_job(member_id, "remove_restriction"):
+                self.jobs.add(exit_time + self.restriction_time, member_id, "remove_restriction")
+
+        # Processar em lote as remoções vencidas e agendar as demais
+        await self.jobs.start()
 
     async def handle_voice_state_update(self, member, before, after):
         """Gerencia as mudanças de estado de voz dos membros"""
-        FOCUS_CHANNEL_NAME = Config.Channels.ID_CANAL_VOZ_FOCO
+        FOCUS_CHANNEL_NAME = self.focus_channel_id
         guild = self.client.get_guild(Config.ID_DO_SERVIDOR)
         FOCUS_LOG_CHANNEL = self.client.get_channel(Config.Channels.ID_CANAL_LOG_FOCO)
 
@@ -134,63 +163,97 @@ class FocusMode:
             value="https://discord.com/channels/1013854219058544720/1359594696061485126/1377073863053279273",
             inline=False)
 
-        await log_channel.send(member.mention, embed=embed_focus_log)
+        await self.dispatcher.send(log_channel, member.mention, embed=embed_focus_log, priority=PRIORITY_REPLIES)
 
-        # Adicionar cargo de modo foco e remover outros cargos
+        # Adicionar cargo de modo foco e remover os cargos de distração em uma única chamada
         focus_mode_role = guild.get_role(self.focus_mode_role_id)
         if focus_mode_role and focus_mode_role not in member.roles:
-            await member.add_roles(focus_mode_role)
-            await self._remove_distraction_roles(member, guild)
-
-    async def _remove_distraction_roles(self, member, guild):
-        """Remove cargos que podem causar distração durante o modo foco"""
-        gym_role = guild.get_role(self.gym_role_id)
-        confessions_role = guild.get_role(self.confessions_role_id)
-        cartola_role = guild.get_role(self.cartola_role_id)
-        pokemon_role = guild.get_role(self.pokemon_role_id)
-        gartic_role = guild.get_role(self.gartic_role_id)
-        xadrez_role = guild.get_role(self.xadrez_role_id)
-
-        removed_roles_list = []
-
-        if gym_role and gym_role in member.roles:
-            await member.remove_roles(gym_role)
-            removed_roles_list.append(Config.Roles.ID_GYM_ROLE)
-
-        if confessions_role and confessions_role in member.roles:
-            await member.remove_roles(confessions_role)
-            removed_roles_list.append(Config.Roles.ID_CONFESSIONS_ROLE)
-
-        if cartola_role and cartola_role in member.roles:
-            await member.remove_roles(cartola_role)
-            removed_roles_list.append(Config.Roles.ID_CARTOLA_ROLE)
-
-        if pokemon_role and pokemon_role in member.roles:
-            await member.remove_roles(pokemon_role)
-            removed_roles_list.append(Config.Roles.ID_POKEMON_ROLE)
-
-        if gartic_role and gartic_role in member.roles:
-            await member.remove_roles(gartic_role)
-            removed_roles_list.append(Config.Roles.ID_GARTIC_ROLE)
-
-        if xadrez_role and xadrez_role in member.roles:
-            await member.remove_roles(xadrez_role)
-            removed_roles_list.append(Config.Roles.ID_XADREZ_ROLE)
-
-        if removed_roles_list:
-            print(f"Salvando cargos removidos para {member}: {removed_roles_list}")
-            self.removed_roles[member.id] = removed_roles_list
-            self.save_data()
+            distraction_roles = self._get_distraction_roles(member, guild)
+            _, removed = await self._apply_role_diff(
+                member, add=[focus_mode_role], remove=distraction_roles, reason="Modo Foco ativado")
+
+            # Registrar apenas os cargos que realmente foram removidos
+            if removed:
+                removed_roles_list = [role.id for role in removed]
+                print(f"Salvando cargos removidos para {member}: {removed_roles_list}")
+                self.removed_roles[member.id] = removed_roles_list
+                self.save_data()
+
+    def _get_distraction_roles(self, member, guild):
+        """Retorna os cargos que podem causar distração durante o modo foco e que o membro possui"""
+        distraction_role_ids = [
+            self.gym_role_id,
+            self.confessions_role_id,
+            self.cartola_role_id,
+            self.pokemon_role_id,
+            self.gartic_role_id,
+            self.xadrez_role_id
+        ]
+        roles = [guild.get_role(role_id) for role_id in distraction_role_ids]
+        return [role for role in roles if role and role in member.roles]
+
+    async def _apply_role_diff(self, member, add=(), remove=(), reason=None):
+        """Calcula o conjunto final de cargos e aplica tudo com um único member.edit(roles=...)
+
+        Se faltar permissão para a edição em lote, cai para chamadas individuais.
+        Retorna as listas (adicionados, removidos) que foram de fato aplicadas.
+        """
+        to_add = [role for role in add if role and role not in member.roles]
+        to_remove = [role for role in remove if role and role in member.roles]
+        if not to_add and not to_remove:
+            return [], []
+
+        final_roles = [role for role in member.roles if not role.is_default() and role not in to_remove]
+        final_roles.extend(to_add)
+
+        try:
+            await self.dispatcher.edit_member(member, roles=final_roles, reason=reason, priority=PRIORITY_ROLES)
+            return to_add, to_remove
+        except discord.Forbidden as e:
+            print(f"Sem permissão para editar os cargos de {member} em lote ({e}). Tentando individualmente...")
+
+        added, removed = [], []
+        for role in to_add:
+            try:
+                await self.dispatcher.add_roles(member, role, reason=reason, priority=PRIORITY_ROLES)
+                added.append(role)
+            except discord.Forbidden:
+                print(f"Sem permissão para adicionar o cargo {role.name} a {member}.")
+        for role in to_remove:
+            try:
+                await self.dispatcher.remove_roles(member, role, reason=reason, priority=PRIORITY_ROLES)
+                removed.append(role)
+            except discord.Forbidden:
+                print(f"Sem permissão para remover o cargo {role.name} de {member}.")
+        return added, removed
 
     async def _handle_focus_exit(self, member, before, log_channel, guild):
         """Gerencia a saída do canal de foco"""
-        self.last_exit_times[member.id] = time.time()
+        exit_time = time.time()
+        self.last_exit_times[member.id] = exit_time
         self.save_data()
 
-        # Adicionar cargo de restrição
+        # Agendar a remoção da restrição na fila durável (sem segurar o handler)
+        self.jobs.add(exit_time + self.restriction_time, member.id, "remove_restriction")
+
+        # Adicionar restrição, remover cargo de modo foco e restaurar cargos removidos em uma única chamada
+        user = guild.get_member(member.id) or member
         restriction_role = guild.get_role(self.restriction_role_id)
-        if restriction_role:
-            await member.add_roles(restriction_role)
+        focus_mode_role = guild.get_role(self.focus_mode_role_id)
+        roles_to_restore = self._get_roles_to_restore(user, guild)
+
+        added, _ = await self._apply_role_diff(
+            user, add=[restriction_role] + roles_to_restore, remove=[focus_mode_role],
+            reason="Modo Foco desativado")
+
+        # Manter registrados apenas os cargos que não puderam ser restaurados
+        if user.id in self.removed_roles:
+            not_restored = [role.id for role in roles_to_restore if role not in added]
+            if not_restored:
+                self.removed_roles[user.id] = not_restored
+            else:
+                del self.removed_roles[user.id]
+            self.save_data()
 
         print(f"{member} saiu do canal de voz {before.channel.name}")
 
@@ -215,51 +278,35 @@ class FocusMode:
             value="https://discord.com/channels/1013854219058544720/1359594696061485126/1377073863053279273",
             inline=False)
 
-        await log_channel.send(member.mention, embed=embed_focus_log)
+        await self.dispatcher.send(log_channel, member.mention, embed=embed_focus_log, priority=PRIORITY_REPLIES)
 
-        # Remover cargo de modo foco e restaurar cargos removidos
-        focus_mode_role = guild.get_role(self.focus_mode_role_id)
-        await member.remove_roles(focus_mode_role)
-
-        user = guild.get_member(member.id)
-        await self._restore_removed_roles(user, guild)
-
-        # Aguardar tempo de restrição e depois remover a restrição
-        await asyncio.sleep(self.restriction_time)
+    async def _expire_restriction(self, member_id):
+        """Remove o cargo de restrição quando o prazo da fila vence"""
+        guild = self.client.get_guild(Config.ID_DO_SERVIDOR)
+        if not guild:
+            print("Servidor não encontrado. Verifique o ID.")
+            return
 
-        if restriction_role and user:
-            await user.remove_roles(restriction_role)
+        restriction_role = guild.get_role(self.restriction_role_id)
+        user = await resolve_member(guild, member_id)
 
-        if user and user.id in self.last_exit_times:
-            del self.last_exit_times[user.id]
-        self.save_data()
+        if restriction_role and user and restriction_role in user.roles:
+            await self.dispatcher.remove_roles(user, restriction_role, priority=PRIORITY_ROLES)
 
-    async def _restore_removed_roles(self, user, guild):
-        """Restaura os cargos que foram removidos durante o modo foco"""
-        print(f"Após guild.get_member: user = {user}")
-        print(
-            f"Verificando cargos removidos para member.id {user.id if user else 'None'}. Estado atual de removed_roles: {self.removed_roles}")
-
-        if user and user.id in self.removed_roles:
-            print(f"Entrou no if: user.id {user.id} encontrado em removed_roles")
-            list_of_removed_role_ids = self.removed_roles[user.id]
-            print(f"Lista de cargos a restaurar: {list_of_removed_role_ids}")
-
-            for each_role_id in list_of_removed_role_ids:
-                role_object = guild.get_role(each_role_id)
-                if not role_object:
-                    print(f"Cargo com ID {each_role_id} não encontrado no servidor.")
-                    continue
-                if role_object in user.roles:
-                    print(f"Membro {user} já possui o cargo {role_object.name}.")
-                    continue
-                print(f"Restaurando cargo {role_object.name} para {user}.")
-                await user.add_roles(role_object)
-
-            del self.removed_roles[user.id]
+        if self.last_exit_times.pop(member_id) is not None:
             self.save_data()
-        else:
-            if not user:
-                print(f"Não entrou no if: user é None (membro não encontrado no servidor)")
-            else:
-                print(f"Não entrou no if: user.id {user.id} não encontrado em removed_roles")
\ No newline at end of file
+
+    def _get_roles_to_restore(self, user, guild):
+        """Retorna os cargos removidos durante o modo foco que ainda existem e o membro não possui"""
+        roles = []
+        for each_role_id in self.removed_roles.get(user.id, []):
+            role_object = guild.get_role(each_role_id)
+            if not role_object:
+                print(f"Cargo com ID {each_role_id} não encontrado no servidor.")
+                continue
+            if role_object in user.roles:
+                continue
+            roles.append(role_object)
+        if roles:
+            print(f"Restaurando cargos {[role.name for role in roles]} para {user}.")
+        return roles
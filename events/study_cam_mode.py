@@ -1,17 +1,29 @@
 import os
 import json
 import time
-import asyncio
 import discord
+from functools import partial
 from constants.constants_prod import Config
+from utils.scheduler import DeadlineScheduler
+from utils.dispatcher import PRIORITY_MODERATION, PRIORITY_REPLIES, PRIORITY_COSMETIC
+from utils.edit_coalescer import MessageEditCoalescer
+from utils.deletion_scheduler import BulkDeletionScheduler
+from utils.persistence import WriteBehindWriter
+from utils.ttl import TTLSet
+from utils.countdown import countdown_intervals_for_mode, next_countdown_step, relative_timestamp
 
 
 class StudyCamMode:
-    def __init__(self, client):
+    def __init__(self, client, dispatcher):
         self.client = client
+        self.dispatcher = dispatcher
+        # Edições de contador: só a mais recente de cada mensagem vai para a API
+        self.edits = MessageEditCoalescer(dispatcher)
         self.warning_time = 60  # 60 segundos para ligar câmera/transmissão
         self.study_cam_channel_id = Config.Channels.ID_CANAL_VOZ_CAMERA
         self.warning_channel_id = Config.Channels.ID_CANAL_LOG_FOCO
+        # Canais de voz observados (usado pelo roteador de eventos de voz para pré-filtrar)
+        self.watched_channel_ids = {self.study_cam_channel_id}
 
         # Dicionário para armazenar membros que estão sendo monitorados (entrada)
         self.monitoring_members = {}
@@ -19,36 +31,100 @@ class StudyCamMode:
         # NOVO: Dicionário para monitoramento contínuo de membros no canal
         self.continuous_monitoring = {}
 
-        # NOVO: Dicionário para rastrear expulsões do bot
-        self.bot_kicked_members = set()
+        # NOVO: Expulsões feitas pelo bot; cada marca expira sozinha (a saída chega logo depois da expulsão)
+        self.bot_kicked_members = TTLSet(ttl=60, max_size=1000)
 
-        # Arquivo para persistir dados se necessário
+        # Agendador único para todos os contadores regressivos e expulsões
+        self.scheduler = DeadlineScheduler()
+        # "edits": edita o embed nos marcos do contador; "timestamp": mostra <t:prazo:R> e só edita o estado final
+        self.countdown_mode = Config.STUDY_CAM_COUNTDOWN_MODE
+        self.countdown_intervals = countdown_intervals_for_mode(self.countdown_mode)
+
+        # Contadores gerais (persistidos junto com o estado)
+        self.total_warnings = 0
+        self.total_kicks = 0
+        self.total_compliances = 0
+
+        # Estado lido do disco, aplicado na reconciliação do on_ready
+        self._restored_state = None
+
+        # Arquivo com o estado dos monitoramentos, gravado em lote (write-behind)
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         data_dir = os.path.join(base_dir, "data")
         os.makedirs(data_dir, exist_ok=True)
         self.data_file = os.path.join(data_dir, "study_cam_data.json")
+        self.writer = WriteBehindWriter(self.data_file, self._snapshot, flush_interval=5.0, max_pending=20, indent=4)
+
+        # Mensagens temporárias (boas-vindas, aprovação, saída, expulsão) são apagadas em lote por canal
+        self.deletions = BulkDeletionScheduler(client, dispatcher, os.path.join(data_dir, "study_cam_deletions.json"))
 
         self.load_data()
 
     def load_data(self):
-        """Carrega os dados do arquivo JSON"""
-        if os.path.exists(self.data_file):
-            with open(self.data_file, "r") as f:
-                data = json.load(f)
-        else:
+        """Carrega os contadores e o estado dos monitoramentos do arquivo JSON"""
+        if not os.path.exists(self.data_file):
             self.save_data()
+            return
+
+        try:
+            with open(self.data_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Erro ao carregar estado do study cam: {e}")
+            return
+
+        self.total_warnings = data.get("total_warnings", 0)
+        self.total_kicks = data.get("total_kicks", 0)
+        self.total_compliances = data.get("total_compliances", 0)
+        self._restored_state = {
+            "monitoring_members": data.get("monitoring_members", {}),
+            "continuous_monitoring": data.get("continuous_monitoring", {}),
+            "bot_kicked_members": data.get("bot_kicked_members", []),
+        }
 
     def save_data(self):
-        """Salva os dados no arquivo JSON"""
-        data = {
+        """Marca o estado como alterado; a gravação acontece em lote fora do event loop"""
+        self.writer.mark_dirty("state")
+
+    def _snapshot(self, _dirty):
+        """Documento gravado em disco: ids das mensagens e prazos em epoch, para retomar após reinício"""
+        monitoring = {}
+        for member_id, info in self.monitoring_members.items():
+            message = info['message']
+            monitoring[str(member_id)] = {
+                "entry_time": info['entry_time'],
+                "deadline": info['entry_time'] + self.warning_time,
+                "channel_id": message.channel.id,
+                "message_id": message.id,
+            }
+
+        continuous = {}
+        for member_id, info in self.continuous_monitoring.items():
+            message = info.get('warning_message')
+            warning_start_time = info.get('warning_start_time') if message else None
+            continuous[str(member_id)] = {
+                "start_time": info['start_time'],
+                "warning_active": bool(info.get('warning_active') and message),
+                "warning_start_time": warning_start_time,
+                "deadline": warning_start_time + self.warning_time if warning_start_time else None,
+                "channel_id": message.channel.id if message else None,
+                "message_id": message.id if message else None,
+            }
+
+        return {
             "last_updated": time.time(),
-            "total_warnings": getattr(self, 'total_warnings', 0),
-            "total_kicks": getattr(self, 'total_kicks', 0),
-            "total_compliances": getattr(self, 'total_compliances', 0)
+            "total_warnings": self.total_warnings,
+            "total_kicks": self.total_kicks,
+            "total_compliances": self.total_compliances,
+            "monitoring_members": monitoring,
+            "continuous_monitoring": continuous,
+            "bot_kicked_members": self.bot_kicked_members.snapshot(),
         }
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, "w") as f:
-            json.dump(data, f, indent=4)
+
+    async def flush(self):
+        """Grava o estado e as deleções pendentes (antes de reiniciar ou encerrar)"""
+        await self.writer.close()
+        await self.deletions.flush()
 
     async def handle_voice_state_update(self, member, before, after):
         """Gerencia as mudanças de estado de voz dos membros no canal de estudo com câmera"""
@@ -59,6 +135,10 @@ class StudyCamMode:
             await self._handle_study_cam_exit(member)
         elif self._updated_in_study_cam_channel(before, after):
             await self._handle_study_cam_update(member, after)
+        else:
+            return
+
+        self.save_data()
 
     def _entered_study_cam_channel(self, before, after):
         """Verifica se o membro entrou no canal de estudo com câmera"""
@@ -91,13 +171,63 @@ class StudyCamMode:
         else:
             return f"{seconds} segundos 🚨"
 
+    def _format_countdown_value(self, start_time, remaining):
+        """Valor do campo de tempo restante conforme o modo do contador"""
+        if not self.countdown_intervals:
+            return f"{relative_timestamp(start_time + self.warning_time)} ⏰"
+        return self._format_time_remaining(remaining)
+
+    def _build_warning_embed(self, kind, member, start_time, remaining):
+        """Monta o embed de aviso (entrada ou contínuo) com o tempo restante informado"""
+        if kind == "entrada":
+            embed = discord.Embed(
+                title="⚠️ Aviso - Canal de Estudo com Câmera",
+                description=f"""Olá {member.mention}! 
+
+                Você entrou no canal [https://discord.com/channels/1013854219058544720/1380897477108039740] que é destinado para estudos com câmera/transmissão de tela ligada.
+
+                **📹 ATENÇÃO:** Você tem **{self.warning_time} segundos** para ligar sua **câmera** ou **transmissão de tela**.
+
+                Se não ligar uma das duas opções dentro deste prazo, será automaticamente expulso do canal.""",
+                color=0xFF6B35 if remaining <= 10 else 0xFFD700  # Dourado para aviso, laranja no fim
+            )
+            footer = "Tribunaldo Bot | Tribunas Study"
+        else:
+            embed = discord.Embed(
+                title="⚠️ Câmera/Transmissão Desligada!",
+                description=f"""Atenção {member.mention}! 
+
+                Você **desligou** sua câmera/transmissão de tela no canal [https://discord.com/channels/1013854219058544720/1380897477108039740].
+
+                **📹 ATENÇÃO:** Você tem **{self.warning_time} segundos** para **religar** sua **câmera** ou **transmissão de tela**.
+
+                Se não ligar uma das duas opções dentro deste prazo, será automaticamente expulso do canal.""",
+                color=0xFF0000 if remaining <= 10 else 0xFF6B35  # Laranja para re-aviso, vermelho no fim
+            )
+            embed.add_field(
+                name="🔄 Ação necessária",
+                value="Ligue sua câmera 📷 ou transmissão de tela 🖥️ **AGORA!**",
+                inline=False
+            )
+            footer = "⚠️ Reaviso - Tribunaldo Bot | Tribunas Study"
+
+        embed.add_field(
+            name="⏰ Tempo restante",
+            value=self._format_countdown_value(start_time, remaining),
+            inline=False
+        )
+
+        embed.set_thumbnail(
+            url="https://i.postimg.cc/52m91bny/Leonardo-Phoenix-10-A-cute-cartoon-style-wolf-who-is-studying-2-removebg-preview-3.png")
+        embed.set_footer(text=footer)
+        return embed
+
     async def _handle_study_cam_enter(self, member, after):
         """Gerencia a entrada no canal de estudo com câmera"""
         print(f"{member} entrou no canal de estudo com câmera {after.channel.name}")
 
         # NOVO: Remover da lista de expulsos quando entrar novamente
-        if member.id in self.bot_kicked_members:
-            self.bot_kicked_members.remove(member.id)
+        self.bot_kicked_members.discard(member.id)
 
         # Se já tem câmera ou transmissão ligada, enviar mensagem de boas-vindas
         if self._has_camera_or_screen_share(after):
@@ -119,46 +249,28 @@ class StudyCamMode:
                 embed.set_footer(text="Tribunaldo Bot | Tribunas Study")
 
                 # Enviar mensagem que será deletada automaticamente em 30 segundos
-                message = await warning_channel.send(embed=embed)
+                message = await self.dispatcher.send(warning_channel, embed=embed, priority=PRIORITY_REPLIES)
                 # Agendar deleção da mensagem após 30 segundos (sem bloquear)
-                asyncio.create_task(self._delete_message_after_delay(message, 30))
+                self.deletions.schedule(message, 30)
             return
 
         # Criar aviso para membros sem câmera/transmissão
         warning_channel = self.client.get_channel(self.warning_channel_id)
         if warning_channel:
-            embed = discord.Embed(
-                title="⚠️ Aviso - Canal de Estudo com Câmera",
-                description=f"""Olá {member.mention}! 
-
-                Você entrou no canal [https://discord.com/channels/1013854219058544720/1380897477108039740] que é destinado para estudos com câmera/transmissão de tela ligada.
-
-                **📹 ATENÇÃO:** Você tem **{self.warning_time} segundos** para ligar sua **câmera** ou **transmissão de tela**.
+            entry_time = time.time()
+            embed = self._build_warning_embed("entrada", member, entry_time, self.warning_time)
 
-                Se não ligar uma das duas opções dentro deste prazo, será automaticamente expulso do canal.""",
-                color=0xFFD700  # Cor dourada para aviso
-            )
-
-            embed.add_field(
-                name="⏰ Tempo restante",
-                value=self._format_time_remaining(self.warning_time),
-                inline=False
-            )
-
-            embed.set_thumbnail(
-                url="https://i.postimg.cc/52m91bny/Leonardo-Phoenix-10-A-cute-cartoon-style-wolf-who-is-studying-2-removebg-preview-3.png")
-            embed.set_footer(text="Tribunaldo Bot | Tribunas Study")
-
-            warning_message = await warning_channel.send(member.mention, embed=embed)
-
-            # Iniciar monitoramento com contador regressivo
-            monitor_task = asyncio.create_task(self._monitor_member_with_countdown(member, warning_message))
+            warning_message = await self.dispatcher.send(warning_channel, member.mention, embed=embed,
+                                                         priority=PRIORITY_REPLIES)
 
             self.monitoring_members[member.id] = {
-                'task': monitor_task,
-                'entry_time': time.time(),
+                'entry_time': entry_time,
                 'message': warning_message
             }
+            self.total_warnings += 1
+
+            # Iniciar monitoramento com contador regressivo
+            self._schedule_countdown("entrada", member, warning_message, entry_time)
 
     async def _handle_study_cam_exit(self, member):
         """Gerencia a saída do canal de estudo com câmera"""
@@ -171,19 +283,20 @@ class StudyCamMode:
         # NOVO: Verificar se foi expulso pelo bot
         if member.id in self.bot_kicked_members:
             print(f"{member} foi expulso pelo bot - não processando como saída voluntária")
-            # Limpar da lista após um tempo para permitir nova entrada
-            asyncio.create_task(self._clear_kicked_member_after_delay(member.id, 5))
+            # Manter a marca só por mais alguns segundos (eventos repetidos da mesma saída)
+            self.bot_kicked_members.add(member.id, ttl=5)
             return
 
         if member.id in self.monitoring_members:
             monitor_info = self.monitoring_members[member.id]
 
-            if not monitor_info['task'].done():
-                monitor_info['task'].cancel()
-                print(f"Task de monitoramento cancelada para {member}")
+            if self.scheduler.cancel(("entrada", member.id)):
+                print(f"Contador de monitoramento cancelado para {member}")
 
             try:
-                current_embed = monitor_info['message'].embeds[0] if monitor_info['message'].embeds else None
+                # Mensagens retomadas após um reinício são parciais e não trazem os embeds
+                embeds = getattr(monitor_info['message'], 'embeds', None)
+                current_embed = embeds[0] if embeds else None
                 if current_embed and current_embed.title == "❌ Expulso do Canal":
                     print(f"Mensagem já editada para expulsão - não alterando para {member}")
                 else:
@@ -207,10 +320,11 @@ class StudyCamMode:
                     )
                     embed.set_footer(text="Volte sempre que quiser estudar!")
 
-                    await monitor_info['message'].edit(embed=embed, content="")
+                    await self.edits.finalize(monitor_info['message'], embed=embed, content="",
+                                              priority=PRIORITY_REPLIES)
 
                     # Agendar deleção da mensagem após 20 segundos (sem bloquear)
-                    asyncio.create_task(self._delete_message_after_delay(monitor_info['message'], 30))
+                    self.deletions.schedule(monitor_info['message'], 30)
 
             except discord.NotFound:
                 print(f"Mensagem de aviso não encontrada para {member}")
@@ -227,8 +341,7 @@ class StudyCamMode:
 
             monitor_info = self.monitoring_members[member.id]
 
-            if not monitor_info['task'].done():
-                monitor_info['task'].cancel()
+            self.scheduler.cancel(("entrada", member.id))
 
             try:
                 # Calcular tempo que levou para ligar
@@ -264,10 +377,11 @@ class StudyCamMode:
                 )
                 embed.set_footer(text="Bons estudos! 📖✨")
 
-                await monitor_info['message'].edit(embed=embed, content="")
+                await self.edits.finalize(monitor_info['message'], embed=embed, content="",
+                                          priority=PRIORITY_REPLIES)
 
                 # Deletar mensagem após 30 segundos
-                asyncio.create_task(self._delete_message_after_delay(monitor_info['message'], 30))
+                self.deletions.schedule(monitor_info['message'], 30)
 
             except discord.NotFound:
                 pass
@@ -275,6 +389,7 @@ class StudyCamMode:
                 print(f"Erro ao editar mensagem de sucesso: {e}")
 
             del self.monitoring_members[member.id]
+            self.total_compliances += 1
 
             # NOVO: Iniciar monitoramento contínuo
             await self._start_continuous_monitoring(member)
@@ -289,106 +404,61 @@ class StudyCamMode:
                 print(f"{member} desligou câmera/transmissão - iniciando aviso contínuo")
                 await self._start_continuous_warning(member)
 
-    async def _monitor_member_with_countdown(self, member, warning_message):
-        """Monitora um membro com contador regressivo visual"""
-        try:
-            start_time = time.time()
-            last_update = self.warning_time + 1  # Inicializar com valor maior para forçar primeira atualização
+    def _schedule_countdown(self, kind, member, warning_message, start_time, last_step=None):
+        """Agenda o próximo passo do contador regressivo (edição ou expulsão) no agendador compartilhado"""
+        remaining = self.warning_time - (time.time() - start_time)
+        step = next_countdown_step(remaining, self.countdown_intervals, last_step)
 
-            while True:
-                # Calcular tempo decorrido e restante
-                elapsed = time.time() - start_time
-                remaining = max(0, int(self.warning_time - elapsed))
+        if step is not None:
+            callback = partial(self._countdown_tick, kind, member, warning_message, start_time, step)
+            delay = remaining - step
+        else:
+            callback = partial(self._countdown_expired, kind, member, warning_message)
+            delay = remaining
 
-                print(f"[DEBUG] {member.display_name}: Elapsed={elapsed:.1f}s, Remaining={remaining}s")
+        self.scheduler.schedule((kind, member.id), delay, callback)
 
-                # Se o tempo acabou, expulsar IMEDIATAMENTE
-                if elapsed >= self.warning_time:
-                    print(f"[DEBUG] Tempo esgotado para {member.display_name}! Expulsando...")
-                    await self._kick_member_from_channel(member, warning_message)
-                    return
+    def _member_still_without_camera(self, member):
+        """Retorna o membro atualizado se ele ainda estiver no canal sem câmera/transmissão"""
+        guild = self.client.get_guild(Config.ID_DO_SERVIDOR)
+        if not guild:
+            print("Servidor não encontrado")
+            return None
 
-                # Verificar se ainda precisa monitorar - MELHORADO
-                try:
-                    guild = self.client.get_guild(Config.ID_DO_SERVIDOR)
-                    if not guild:
-                        print(f"[DEBUG] Servidor não encontrado")
-                        return
-
-                    current_member = guild.get_member(member.id)
-                    if not current_member:
-                        print(f"[DEBUG] {member.display_name} não encontrado no servidor")
-                        return
-
-                    # Verificar se ainda está no canal
-                    if not current_member.voice or not current_member.voice.channel:
-                        print(f"[DEBUG] {member.display_name} não está em nenhum canal de voz")
-                        return
-
-                    if current_member.voice.channel.id != self.study_cam_channel_id:
-                        print(f"[DEBUG] {member.display_name} saiu do canal de estudo")
-                        return
-
-                    # Verificar se ligou câmera/transmissão
-                    if self._has_camera_or_screen_share(current_member.voice):
-                        print(f"[DEBUG] {member.display_name} ligou câmera/transmissão!")
-                        return
+        current_member = guild.get_member(member.id)
+        if not current_member or not current_member.voice or not current_member.voice.channel:
+            return None
 
-                except Exception as e:
-                    print(f"[DEBUG] Erro ao verificar estado do membro: {e}")
-                    return
+        if current_member.voice.channel.id != self.study_cam_channel_id:
+            return None
 
-                # Determinar se deve atualizar a mensagem - CORRIGIDO
-                should_update = False
-                update_intervals = [30, 20, 15, 10, 5, 3, 2, 1]
+        if self._has_camera_or_screen_share(current_member.voice):
+            return None
 
-                for interval in update_intervals:
-                    if remaining <= interval and last_update > interval:
-                        should_update = True
-                        last_update = interval
-                        break
+        return current_member
 
-                # Atualizar mensagem se necessário
-                if should_update:
-                    try:
-                        original_embed = warning_message.embeds[0]
-
-                        # Criar novo embed baseado no original
-                        embed = discord.Embed(
-                            title=original_embed.title,
-                            description=original_embed.description,
-                            color=0xFF6B35 if remaining <= 10 else 0xFFD700
-                        )
-
-                        # Manter os campos originais exceto o tempo restante
-                        for field in original_embed.fields:
-                            if field.name != "⏰ Tempo restante":
-                                embed.add_field(name=field.name, value=field.value, inline=field.inline)
-
-                        # Atualizar campo de tempo restante
-                        embed.add_field(
-                            name="⏰ Tempo restante",
-                            value=self._format_time_remaining(remaining),
-                            inline=False
-                        )
-
-                        embed.set_thumbnail(url=original_embed.thumbnail.url if original_embed.thumbnail else None)
-                        embed.set_footer(text=original_embed.footer.text if original_embed.footer else None)
-
-                        await warning_message.edit(embed=embed)
-                        print(f"[DEBUG] Mensagem atualizada para {member.display_name}: {remaining}s restantes")
-                    except Exception as e:
-                        print(f"Erro ao atualizar countdown: {e}")
-
-                # Aguardar 1 segundo para próxima verificação
-                await asyncio.sleep(1.0)
-
-        except asyncio.CancelledError:
-            print(f"Monitoramento de {member} foi cancelado")
+    async def _countdown_tick(self, kind, member, warning_message, start_time, remaining):
+        """Atualiza o contador da mensagem de aviso e agenda o próximo passo"""
+        if not self._member_still_without_camera(member):
+            return
+
+        # Agendar o próximo passo antes de editar, para que uma edição lenta não atrase a expulsão
+        self._schedule_countdown(kind, member, warning_message, start_time, last_step=remaining)
+
+        try:
+            embed = self._build_warning_embed(kind, member, start_time, remaining)
+            self.edits.submit(warning_message, embed=embed, priority=PRIORITY_COSMETIC)
         except Exception as e:
-            print(f"Erro durante monitoramento de {member}: {e}")
-            if member.id in self.monitoring_members:
-                del self.monitoring_members[member.id]
+            print(f"Erro ao atualizar countdown ({kind}): {e}")
+
+    async def _countdown_expired(self, kind, member, warning_message):
+        """Prazo esgotado: expulsa o membro conforme o tipo de monitoramento"""
+        print(f"Tempo esgotado para {member.display_name} ({kind})! Expulsando...")
+        if kind == "entrada":
+            await self._kick_member_from_channel(member, warning_message)
+        else:
+            await self._kick_member_continuous(member, warning_message)
+        self.save_data()
 
     async def _kick_member_from_channel(self, member, warning_message):
         """Expulsa o membro do canal e atualiza a mensagem - MELHORADO"""
@@ -422,7 +492,31 @@ class StudyCamMode:
             # NOVO: Marcar como expulso ANTES de fazer a expulsão
             self.bot_kicked_members.add(member.id)
 
-            # Atualizar mensagem ANTES de expulsar
+            # Expulsar membro - MÉTODOS MÚLTIPLOS PARA GARANTIR FUNCIONAMENTO
+            try:
+                # Método 1: move_to(None)
+                await self.dispatcher.move_to(current_member, None, priority=PRIORITY_MODERATION)
+                print(f"{current_member} foi desconectado do canal com move_to(None)")
+            except Exception as e1:
+                print(f"Erro com move_to(None): {e1}")
+
+                try:
+                    # Método 2: edit com channel=None
+                    await self.dispatcher.edit_member(current_member, voice_channel=None, priority=PRIORITY_MODERATION)
+                    print(f"{current_member} foi desconectado do canal com edit(voice_channel=None)")
+                except Exception as e2:
+                    print(f"Erro com edit(voice_channel=None): {e2}")
+
+                    try:
+                        # Método 3: disconnect direto
+                        await current_member.voice.channel.connect().disconnect()
+                        print(f"Tentativa de desconexão alternativa para {current_member}")
+                    except Exception as e3:
+                        print(f"Todos os métodos de expulsão falharam para {current_member}: {e1}, {e2}, {e3}")
+
+            self.total_kicks += 1
+
+            # Atualizar mensagem depois de expulsar: a expulsão tem prioridade na fila de saída
             try:
                 embed = discord.Embed(
                     title="❌ Expulso do Canal",
@@ -446,70 +540,35 @@ class StudyCamMode:
                 )
                 embed.set_footer(text="As regras do canal devem ser respeitadas 📋")
 
-                await warning_message.edit(embed=embed, content="")
+                await self.edits.finalize(warning_message, embed=embed, content="",
+                                          priority=PRIORITY_REPLIES)
                 print("Mensagem de expulsão atualizada com sucesso")
 
             except Exception as e:
                 print(f"Erro ao editar mensagem de expulsão: {e}")
 
-            # Expulsar membro - MÉTODOS MÚLTIPLOS PARA GARANTIR FUNCIONAMENTO
-            try:
-                # Método 1: move_to(None)
-                await current_member.move_to(None)
-                print(f"{current_member} foi desconectado do canal com move_to(None)")
-            except Exception as e1:
-                print(f"Erro com move_to(None): {e1}")
-
-                try:
-                    # Método 2: edit com channel=None
-                    await current_member.edit(voice_channel=None)
-                    print(f"{current_member} foi desconectado do canal com edit(voice_channel=None)")
-                except Exception as e2:
-                    print(f"Erro com edit(voice_channel=None): {e2}")
-
-                    try:
-                        # Método 3: disconnect direto
-                        await current_member.voice.channel.connect().disconnect()
-                        print(f"Tentativa de desconexão alternativa para {current_member}")
-                    except Exception as e3:
-                        print(f"Todos os métodos de expulsão falharam para {current_member}: {e1}, {e2}, {e3}")
-
             # Limpar do monitoramento
             if member.id in self.monitoring_members:
                 del self.monitoring_members[member.id]
 
             # Agendar deleção da mensagem após 60 segundos
-            asyncio.create_task(self._delete_message_after_delay(warning_message, 60))
+            self.deletions.schedule(warning_message, 60)
 
         except Exception as e:
             print(f"Erro geral na expulsão de {member}: {e}")
 
-    async def _clear_kicked_member_after_delay(self, member_id, delay_seconds):
-        """Remove um membro da lista de expulsos após um delay"""
-        try:
-            await asyncio.sleep(delay_seconds)
-            if member_id in self.bot_kicked_members:
-                self.bot_kicked_members.remove(member_id)
-                print(f"Membro {member_id} removido da lista de expulsos após {delay_seconds}s")
-        except Exception as e:
-            print(f"Erro ao limpar membro expulso: {e}")
-
-    async def _monitor_member(self, member, warning_message):
-        """Versão simplificada do monitor (mantida para compatibilidade)"""
-        return await self._monitor_member_with_countdown(member, warning_message)
-
     async def cleanup_monitoring(self):
         """Limpa todos os monitoramentos ativos"""
         # Limpar monitoramento inicial
-        for member_id, monitor_info in list(self.monitoring_members.items()):
-            if not monitor_info['task'].done():
-                monitor_info['task'].cancel()
+        for member_id in list(self.monitoring_members.keys()):
+            self.scheduler.cancel(("entrada", member_id))
             del self.monitoring_members[member_id]
 
         # NOVO: Limpar monitoramento contínuo
         for member_id in list(self.continuous_monitoring.keys()):
             await self._stop_continuous_monitoring(member_id)
 
+        self.save_data()
         print("Todos os monitoramentos foram limpos")
 
     # NOVAS FUNÇÕES PARA MONITORAMENTO CONTÍNUO
@@ -522,7 +581,6 @@ class StudyCamMode:
                 'member': member,
                 'start_time': time.time(),
                 'warning_active': False,
-                'warning_task': None,
                 'warning_message': None
             }
         except Exception as e:
@@ -534,14 +592,14 @@ class StudyCamMode:
             if member_id in self.continuous_monitoring:
                 monitor_info = self.continuous_monitoring[member_id]
 
-                # Cancelar task de aviso se estiver ativa
-                if monitor_info.get('warning_task') and not monitor_info['warning_task'].done():
-                    monitor_info['warning_task'].cancel()
+                # Cancelar contador de aviso se estiver ativo
+                self.scheduler.cancel(("continuo", member_id))
 
                 # Deletar mensagem de aviso se existir
                 if monitor_info.get('warning_message'):
                     try:
-                        await monitor_info['warning_message'].delete()
+                        self.edits.discard(monitor_info['warning_message'])
+                        await self.dispatcher.delete_message(monitor_info['warning_message'], priority=PRIORITY_COSMETIC)
                     except:
                         pass
 
@@ -560,48 +618,22 @@ class StudyCamMode:
             if not warning_channel:
                 return
 
-            embed = discord.Embed(
-                title="⚠️ Câmera/Transmissão Desligada!",
-                description=f"""Atenção {member.mention}! 
-
-                Você **desligou** sua câmera/transmissão de tela no canal [https://discord.com/channels/1013854219058544720/1380897477108039740].
-
-                **📹 ATENÇÃO:** Você tem **{self.warning_time} segundos** para **religar** sua **câmera** ou **transmissão de tela**.
-
-                Se não ligar uma das duas opções dentro deste prazo, será automaticamente expulso do canal.""",
-                color=0xFF6B35  # Laranja para re-aviso
-            )
+            warning_start_time = time.time()
+            embed = self._build_warning_embed("continuo", member, warning_start_time, self.warning_time)
 
-            embed.add_field(
-                name="🔄 Ação necessária",
-                value="Ligue sua câmera 📷 ou transmissão de tela 🖥️ **AGORA!**",
-                inline=False
-            )
-
-            embed.add_field(
-                name="⏰ Tempo restante",
-                value=self._format_time_remaining(self.warning_time),
-                inline=False
-            )
-
-            embed.set_thumbnail(
-                url="https://i.postimg.cc/52m91bny/Leonardo-Phoenix-10-A-cute-cartoon-style-wolf-who-is-studying-2-removebg-preview-3.png")
-            embed.set_footer(text="⚠️ Reaviso - Tribunaldo Bot | Tribunas Study")
-
-            warning_message = await warning_channel.send(member.mention, embed=embed)
-
-            # Iniciar task de monitoramento com countdown
-            warning_task = asyncio.create_task(
-                self._continuous_warning_countdown(member, warning_message)
-            )
+            warning_message = await self.dispatcher.send(warning_channel, member.mention, embed=embed,
+                                                         priority=PRIORITY_REPLIES)
 
             # Atualizar informações de monitoramento
             self.continuous_monitoring[member.id].update({
                 'warning_active': True,
-                'warning_task': warning_task,
                 'warning_message': warning_message,
-                'warning_start_time': time.time()
+                'warning_start_time': warning_start_time
             })
+            self.total_warnings += 1
+
+            # Iniciar contador regressivo no agendador compartilhado
+            self._schedule_countdown("continuo", member, warning_message, warning_start_time)
 
         except Exception as e:
             print(f"Erro ao iniciar aviso contínuo: {e}")
@@ -617,9 +649,8 @@ class StudyCamMode:
             if not monitor_info.get('warning_active', False):
                 return
 
-            # Cancelar task de aviso
-            if monitor_info.get('warning_task') and not monitor_info['warning_task'].done():
-                monitor_info['warning_task'].cancel()
+            # Cancelar contador de aviso
+            self.scheduler.cancel(("continuo", member_id))
 
             # Atualizar mensagem para sucesso
             if monitor_info.get('warning_message'):
@@ -644,108 +675,25 @@ class StudyCamMode:
                     )
                     embed.set_footer(text="Mantenha sempre ligada! 📖✨")
 
-                    await monitor_info['warning_message'].edit(embed=embed, content="")
+                    await self.edits.finalize(monitor_info['warning_message'], embed=embed, content="",
+                                              priority=PRIORITY_REPLIES)
 
                     # Deletar mensagem após 20 segundos
-                    asyncio.create_task(
-                        self._delete_message_after_delay(monitor_info['warning_message'], 30)
-                    )
+                    self.deletions.schedule(monitor_info['warning_message'], 30)
                 except Exception as e:
                     print(f"Erro ao atualizar mensagem de sucesso contínuo: {e}")
 
+            self.total_compliances += 1
+
             # Resetar estado de aviso
             self.continuous_monitoring[member_id].update({
                 'warning_active': False,
-                'warning_task': None,
                 'warning_message': None
             })
 
         except Exception as e:
             print(f"Erro ao cancelar aviso contínuo: {e}")
 
-    async def _continuous_warning_countdown(self, member, warning_message):
-        """Countdown para aviso contínuo com expulsão automática"""
-        try:
-            start_time = time.time()
-            last_update = self.warning_time + 1
-
-            while True:
-                elapsed = time.time() - start_time
-                remaining = max(0, int(self.warning_time - elapsed))
-
-                print(f"[CONTINUOUS] {member.display_name}: Elapsed={elapsed:.1f}s, Remaining={remaining}s")
-
-                # Tempo esgotado - expulsar
-                if elapsed >= self.warning_time:
-                    print(f"[CONTINUOUS] Tempo esgotado para {member.display_name}! Expulsando...")
-                    await self._kick_member_continuous(member, warning_message)
-                    return
-
-                # Verificar se ainda está no canal e sem câmera/transmissão
-                try:
-                    guild = self.client.get_guild(Config.ID_DO_SERVIDOR)
-                    if not guild:
-                        return
-
-                    current_member = guild.get_member(member.id)
-                    if not current_member or not current_member.voice:
-                        return
-
-                    if current_member.voice.channel.id != self.study_cam_channel_id:
-                        return
-
-                    # Se ligou câmera/transmissão, vai ser tratado em _handle_study_cam_update
-                    if self._has_camera_or_screen_share(current_member.voice):
-                        return
-
-                except Exception as e:
-                    print(f"[CONTINUOUS] Erro ao verificar estado: {e}")
-                    return
-
-                # Atualizar countdown na mensagem
-                should_update = False
-                update_intervals = [30, 20, 15, 10, 5, 3, 2, 1]
-
-                for interval in update_intervals:
-                    if remaining <= interval and last_update > interval:
-                        should_update = True
-                        last_update = interval
-                        break
-
-                if should_update:
-                    try:
-                        original_embed = warning_message.embeds[0]
-                        embed = discord.Embed(
-                            title=original_embed.title,
-                            description=original_embed.description,
-                            color=0xFF0000 if remaining <= 10 else 0xFF6B35
-                        )
-
-                        # Recriar campos exceto tempo restante
-                        for field in original_embed.fields:
-                            if field.name != "⏰ Tempo restante":
-                                embed.add_field(name=field.name, value=field.value, inline=field.inline)
-
-                        embed.add_field(
-                            name="⏰ Tempo restante",
-                            value=self._format_time_remaining(remaining),
-                            inline=False
-                        )
-
-                        embed.set_thumbnail(url=original_embed.thumbnail.url if original_embed.thumbnail else None)
-                        embed.set_footer(text=original_embed.footer.text if original_embed.footer else None)
-
-                        await warning_message.edit(embed=embed)
-                    except Exception as e:
-                        print(f"Erro ao atualizar countdown contínuo: {e}")
-
-                await asyncio.sleep(1.0)
-
-        except asyncio.CancelledError:
-            print(f"Aviso contínuo cancelado para {member}")
-        except Exception as e:
-            print(f"Erro no countdown contínuo: {e}")
-
     async def _kick_member_continuous(self, member, warning_message):
         """Expulsa membro por desligar câmera/transmissão durante o uso"""
         try:
@@ -768,7 +716,11 @@ class StudyCamMode:
             # Marcar como expulso
             self.bot_kicked_members.add(member.id)
 
-            # Atualizar mensagem
+            # Expulsar
+            await self.dispatcher.move_to(current_member, None, priority=PRIORITY_MODERATION)
+            self.total_kicks += 1
+
+            # Atualizar mensagem depois de expulsar
             try:
                 embed = discord.Embed(
                     title="❌ Expulso - Câmera Desligada",
@@ -787,30 +739,147 @@ class StudyCamMode:
                 )
                 embed.set_footer(text="⚠️ Mantenha sempre ligada no canal de estudo!")
 
-                await warning_message.edit(embed=embed, content="")
+                await self.edits.finalize(warning_message, embed=embed, content="",
+                                          priority=PRIORITY_REPLIES)
             except Exception as e:
                 print(f"Erro ao atualizar mensagem de expulsão contínua: {e}")
 
-            # Expulsar
-            await current_member.move_to(None)
-
             # Limpar monitoramento
             if member.id in self.continuous_monitoring:
                 del self.continuous_monitoring[member.id]
 
             # Deletar mensagem após 60 segundos
-            asyncio.create_task(self._delete_message_after_delay(warning_message, 60))
+            self.deletions.schedule(warning_message, 60)
 
         except Exception as e:
             print(f"Erro na expulsão contínua: {e}")
 
-    async def _delete_message_after_delay(self, message, delay_seconds):
-        """Deleta uma mensagem após um delay específico"""
-        try:
-            await asyncio.sleep(delay_seconds)
-            await message.delete()
-        except Exception as e:
-            print(f"Erro ao deletar mensagem após {delay_seconds}s: {e}")
+    def tracked_member_ids(self):
+        """Membros com monitoramento salvo (quem ainda está no canal já vem no cache de voz)"""
+        state = self._restored_state if self._restored_state is not None else self._snapshot(None)
+        return {int(member_id) for member_id in state["monitoring_members"]} | \
+            {int(member_id) for member_id in state["continuous_monitoring"]}
+
+    async def initialize(self):
+        """Inicializa as tarefas de fundo do modo study cam (chamado no on_ready)"""
+        await self.deletions.start()
+        await self.reconcile()
+
+    def _partial_message(self, info):
+        """Recria a referência à mensagem de aviso salva (sem buscar na API)"""
+        if not info.get("message_id"):
+            return None
+        channel = self.client.get_channel(info["channel_id"])
+        if not channel:
+            return None
+        return channel.get_partial_message(info["message_id"])
+
+    async def reconcile(self):
+        """Confronta o estado salvo com quem está no canal agora, em uma única passada.
+
+        - sem câmera e com aviso salvo: o contador é retomado com o tempo que restava;
+        - sem câmera e sem aviso: recebe o aviso de entrada (ou o reaviso, se já era monitorado);
+        - com câmera: entra no monitoramento contínuo;
+        - avisos de quem saiu ou ligou a câmera enquanto o bot estava fora são apagados em lote.
+
+        Em uma reconexão completa (novo on_ready) o estado em memória é usado como base.
+        """
+        guild = self.client.get_guild(Config.ID_DO_SERVIDOR)
+        channel = guild.get_channel(self.study_cam_channel_id) if guild else None
+        if not channel:
+            print("Canal de estudo com câmera não encontrado - reconciliação ignorada")
+            return
+
+        state = self._restored_state if self._restored_state is not None else self._snapshot(None)
+        self._restored_state = None
+
+        for member_id in self.monitoring_members:
+            self.scheduler.cancel(("entrada", member_id))
+        for member_id in self.continuous_monitoring:
+            self.scheduler.cancel(("continuo", member_id))
+        self.monitoring_members = {}
+        self.continuous_monitoring = {}
+
+        live_members = {member.id: member for member in channel.members}
+        orphaned = {}  # channel_id -> ids das mensagens de aviso que não valem mais
+        resumed = 0
+
+        def orphan(info):
+            if info.get("message_id") and info.get("channel_id"):
+                orphaned.setdefault(info["channel_id"], []).append(info["message_id"])
+
+        for member_id, info in state["monitoring_members"].items():
+            member = live_members.get(int(member_id))
+            message = self._partial_message(info)
+            if member and message and not self._has_camera_or_screen_share(member.voice):
+                entry_time = info["deadline"] - self.warning_time
+                self.monitoring_members[member.id] = {'entry_time': entry_time, 'message': message}
+                self._schedule_countdown("entrada", member, message, entry_time)
+                resumed += 1
+            else:
+                orphan(info)
+
+        rewarn = []
+        for member_id, info in state["continuous_monitoring"].items():
+            member = live_members.get(int(member_id))
+            if not member:
+                orphan(info)
+                continue
+
+            self.continuous_monitoring[member.id] = {
+                'member': member,
+                'start_time': info["start_time"],
+                'warning_active': False,
+                'warning_message': None
+            }
+            has_camera = self._has_camera_or_screen_share(member.voice)
+            message = self._partial_message(info) if info.get("warning_active") else None
+            if message and not has_camera:
+                warning_start_time = info["deadline"] - self.warning_time
+                self.continuous_monitoring[member.id].update({
+                    'warning_active': True,
+                    'warning_message': message,
+                    'warning_start_time': warning_start_time
+                })
+                self._schedule_countdown("continuo", member, message, warning_start_time)
+                resumed += 1
+                continue
+
+            orphan(info)
+            if not has_camera:
+                rewarn.append(member)
+
+        # Quem entrou enquanto o bot estava fora
+        untracked = [member for member_id, member in live_members.items()
+                     if member_id not in self.monitoring_members and member_id not in self.continuous_monitoring]
+        with_camera = [member for member in untracked if self._has_camera_or_screen_share(member.voice)]
+        without_camera = [member for member in untracked if member not in with_camera]
+        for member in with_camera:
+            await self._start_continuous_monitoring(member)
+
+        # Expulsos antes do reinício: a saída deles já aconteceu (ou chega logo em seguida)
+        kicked = state["bot_kicked_members"]
+        if isinstance(kicked, list):
+            # Formato antigo (lista de ids, sem prazo)
+            kicked = {member_id: time.time() + 5 for member_id in kicked}
+        self.bot_kicked_members.clear()
+        self.bot_kicked_members.restore(kicked, key_type=int)
+        for member_id in live_members:
+            self.bot_kicked_members.discard(member_id)
+
+        for channel_id, message_ids in orphaned.items():
+            self.deletions.schedule_ids(channel_id, message_ids, 0)
+
+        # Avisos novos por último, depois que o estado já foi reconstruído
+        for member in rewarn:
+            await self._start_continuous_warning(member)
+        for member in without_camera:
+            await self._handle_study_cam_enter(member, member.voice)
+
+        self.save_data()
+        print(f"Study cam reconciliado: {resumed} contadores retomados, {len(rewarn) + len(without_camera)} avisos "
+              f"novos, {len(with_camera)} membros com câmera em monitoramento contínuo, "
+              f"{sum(len(ids) for ids in orphaned.values())} avisos órfãos apagados")
 
     async def get_stats(self):
         """Retorna estatísticas do sistema"""
@@ -818,5 +887,8 @@ class StudyCamMode:
             "active_monitoring": len(self.monitoring_members),
             "continuous_monitoring": len(self.continuous_monitoring),
             "warning_time": self.warning_time,
-            "kicked_members_count": len(self.bot_kicked_members)
+            "kicked_members_count": len(self.bot_kicked_members),
+            "total_warnings": self.total_warnings,
+            "total_kicks": self.total_kicks,
+            "total_compliances": self.total_compliances
         }
\ No newline at end of file
@@ -0,0 +1,55 @@
+import discord
+from discord import app_commands
+from constants.constants_prod import Config
+
+
+def build_stall_embed(report):
+    """Embed de um travamento do event loop (usado no canal de log e no /diagnostico)"""
+    embed = discord.Embed(
+        title="🐢 Event loop travado",
+        description=f"Travado por **{report['duration']:.3f}s**\nProvável causa: `{report['culprit']}`",
+        color=0xE67E22
+    )
+    if report["stack"]:
+        stack = "\n".join(report["stack"])
+        embed.add_field(name="Pilha amostrada", value=f"```\n{stack[-1000:]}\n```", inline=False)
+    embed.add_field(name="Amostras", value=f"{report['culprit_samples']}/{report['samples']}", inline=True)
+    if report.get("suppressed"):
+        embed.add_field(name="Outros travamentos desde o último aviso", value=str(report["suppressed"]), inline=True)
+    embed.timestamp = discord.utils.utcnow()
+    return embed
+
+
+def setup_admin_commands(tree, watchdog):
+    """Configura os comandos slash de administração"""
+
+    @tree.command(name="diagnostico", description="Mostra o atraso do event loop e os últimos travamentos",
+                  guild=discord.Object(id=Config.ID_DO_SERVIDOR))
+    @app_commands.default_permissions(administrator=True)
+    async def diagnostico(interaction: discord.Interaction):
+        print(f"Comando /diagnostico chamado por {interaction.user}")
+        stats = watchdog.metrics()
+
+        embed = discord.Embed(
+            title="🩺 Diagnóstico do event loop",
+            description=(f"Atraso atual: **{stats['last_lag'] * 1000:.1f} ms** | "
+                         f"máximo: **{stats['max_lag'] * 1000:.1f} ms**\n"
+                         f"Travamentos: **{stats['stalls']}** | "
+                         f"callbacks lentos: **{stats['slow_callbacks']}**"
+                         f"{'' if stats['debug'] else ' (modo debug do asyncio desligado)'}"),
+            color=9055202
+        )
+
+        stalls = list(watchdog.stalls)[-5:]
+        if stalls:
+            lines = [f"<t:{int(report['at'])}:R> {report['duration']:.2f}s - `{report['culprit']}`"
+                     for report in reversed(stalls)]
+            embed.add_field(name="Últimos travamentos", value="\n".join(lines)[:1024], inline=False)
+
+        slow = list(watchdog.slow_callbacks)[-5:]
+        if slow:
+            lines = [f"<t:{int(item['at'])}:R> {item['duration']:.2f}s - `{item['callback'][:120]}`"
+                     for item in reversed(slow)]
+            embed.add_field(name="Últimos callbacks lentos", value="\n".join(lines)[:1024], inline=False)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
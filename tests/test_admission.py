@@ -0,0 +1,67 @@
+import time
+import asyncio
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected, LANE_DEDICATED, LANE_MENTION
+
+
+async def _exhaust(admission, calls):
+    for _ in range(calls):
+        await admission.acquire(LANE_MENTION, 10)
+
+
+def test_overflow_is_rejected_immediately():
+    async def run():
+        # 60 RPM: uma vaga por segundo depois que o balde esvazia
+        admission = AdmissionController(rpm=60, max_queue=2, max_wait=30.0)
+        await _exhaust(admission, 60)
+        waiting = [asyncio.create_task(admission.acquire(LANE_MENTION, 10)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        start = time.monotonic()
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(LANE_MENTION, 10)
+        assert time.monotonic() - start < 0.05
+        assert admission.metrics()["rejected"]["mention"] == 1
+
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_projected_wait_over_max_wait_is_rejected_at_enqueue():
+    async def run():
+        # 15 RPM e 30 s de espera: só 7 pedidos da fila conseguem ser admitidos a tempo
+        admission = AdmissionController(rpm=15, max_queue=20, max_wait=30.0)
+        await _exhaust(admission, 15)
+        waiting = [asyncio.create_task(admission.acquire(LANE_MENTION, 10)) for _ in range(10)]
+        await asyncio.sleep(0)
+
+        rejected = [task for task in waiting if task.done()]
+        assert len(rejected) == 3
+        assert all(isinstance(task.exception(), AdmissionRejected) for task in rejected)
+
+        # Um pedido mais prioritário fura a fila e o último que perdeu o prazo é recusado na hora
+        dedicated = asyncio.create_task(admission.acquire(LANE_DEDICATED, 10))
+        await asyncio.sleep(0.01)
+        assert not dedicated.done()
+        assert waiting[6].done() and isinstance(waiting[6].exception(), AdmissionRejected)
+        assert admission.metrics()["queue_depth"] == {"dedicated": 1, "mention": 6, "background": 0}
+
+        for task in waiting + [dedicated]:
+            task.cancel()
+        await asyncio.gather(*waiting, dedicated, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_queued_call_is_admitted_when_quota_refills():
+    async def run():
+        admission = AdmissionController(rpm=600, max_queue=5, max_wait=1.0)
+        await _exhaust(admission, 600)
+        await asyncio.wait_for(admission.acquire(LANE_MENTION, 10), 0.5)
+        assert admission.metrics()["admitted"]["mention"] == 601
+
+    asyncio.run(run())
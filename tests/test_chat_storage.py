@@ -0,0 +1,74 @@
+import json
+import asyncio
+import pytest
+
+from utils.chat_storage import JsonChatStorage, SqliteChatStorage
+
+
+def _history(*contents):
+    return [{"role": "user" if index % 2 == 0 else "model", "content": content,
+             "timestamp": f"2025-01-01T00:00:{index:02d}"}
+            for index, content in enumerate(contents)]
+
+
+def test_migration_from_json_keeps_history_and_summaries(tmp_path):
+    json_file = tmp_path / "gemini_chat_data.json"
+    with open(json_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "conversation_history": {"1": _history("oi", "olá!", "me ajuda?"), "2": _history("e aí")},
+            # Usuário 3 só tem resumo: as mensagens dele já saíram do histórico
+            "summaries": {"1": "Estuda cálculo.", "3": "Quer passar em medicina."},
+            "user_cooldowns": {"1": "2025-01-01T00:00:00"},
+        }, f)
+
+    storage = SqliteChatStorage(str(tmp_path / "gemini_chat_data.db"))
+    assert storage.migrate_from_json(str(json_file)) == 4
+    assert [message["content"] for message in storage.get_history(1)] == ["oi", "olá!", "me ajuda?"]
+    assert storage.get_history(2)[0]["role"] == "user"
+    assert storage.get_summary(1) == "Estuda cálculo."
+    assert storage.get_summary(3) == "Quer passar em medicina."
+
+    # Migração única: rodar de novo não duplica nada
+    assert storage.migrate_from_json(str(json_file)) == 0
+    assert storage.size() == {"users": 2, "messages": 4}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_history_is_only_trimmed_by_drop_oldest(tmp_path, backend):
+    if backend == "json":
+        storage = JsonChatStorage(str(tmp_path / "chat.json"))
+    else:
+        storage = SqliteChatStorage(str(tmp_path / "chat.db"))
+
+    for message in _history(*(f"mensagem {index}" for index in range(30))):
+        storage.append(7, message["role"], message["content"], message["timestamp"])
+    assert len(storage.get_history(7)) == 30
+
+    storage.drop_oldest(7, "2025-01-01T00:00:19")
+    assert [message["content"] for message in storage.get_history(7)][0] == "mensagem 20"
+    assert storage.stats(7)["total_interactions"] == 5
+
+    storage.set_summary(7, "Resumo.")
+    assert storage.clear(7)
+    assert storage.get_history(7) == [] and storage.get_summary(7) is None
+    assert not storage.clear(7)
+
+
+def test_json_write_behind_round_trip(tmp_path):
+    data_file = str(tmp_path / "chat.json")
+
+    async def run():
+        storage = JsonChatStorage(data_file, flush_interval=60.0)
+        storage.load()
+        for message in _history("oi", "olá!"):
+            storage.append(5, message["role"], message["content"], message["timestamp"])
+        storage.set_summary(5, "Primeira conversa.")
+        # Nada gravado ainda: a gravação espera o lote
+        assert storage.writer.pending_changes == 3
+        await storage.flush()
+
+    asyncio.run(run())
+    reloaded = JsonChatStorage(data_file)
+    reloaded.load()
+    assert [message["content"] for message in reloaded.get_history(5)] == ["oi", "olá!"]
+    assert reloaded.get_summary(5) == "Primeira conversa."
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import pytest
+
+pytest.importorskip("discord")
+
+from utils.deletion_scheduler import BulkDeletionScheduler, DISCORD_EPOCH_MS
+
+
+def _recent_id(sequence):
+    """Snowflake de uma mensagem criada agora"""
+    return (int(time.time() * 1000 - DISCORD_EPOCH_MS) << 22) + sequence
+
+
+class _Message:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def delete(self):
+        if self.id in self.channel.failing:
+            raise RuntimeError("500 Internal Server Error")
+        self.channel.deleted.append(self.id)
+
+
+class _Channel:
+    id = 10
+
+    def __init__(self, bulk_allowed=True, failing=()):
+        self.bulk_allowed = bulk_allowed
+        self.failing = set(failing)
+        self.deleted = []
+        self.bulk_calls = []
+
+    def get_partial_message(self, message_id):
+        return _Message(self, message_id)
+
+    async def delete_messages(self, messages):
+        if not self.bulk_allowed:
+            raise RuntimeError("sem permissão para apagar em lote")
+        self.bulk_calls.append([message.id for message in messages])
+        self.deleted.extend(message.id for message in messages)
+
+
+class _Client:
+    def __init__(self, channel):
+        self.channel = channel
+
+    def get_channel(self, channel_id):
+        return self.channel if channel_id == self.channel.id else None
+
+
+class _Dispatcher:
+    async def submit(self, priority, route, factory):
+        return await factory()
+
+    async def delete_message(self, message, priority=None):
+        return await message.delete()
+
+
+def _scheduler(tmp_path, channel, **kwargs):
+    return BulkDeletionScheduler(_Client(channel), _Dispatcher(), str(tmp_path / "deletions.json"),
+                                 batch_window=0.5, **kwargs)
+
+
+def test_due_messages_are_deleted_in_one_bulk_call(tmp_path):
+    channel = _Channel()
+    message_ids = [_recent_id(sequence) for sequence in range(3)]
+
+    async def run():
+        deletions = _scheduler(tmp_path, channel)
+        await deletions.start()
+        deletions.schedule_ids(channel.id, message_ids, 0)
+        await asyncio.sleep(0.05)
+        await deletions.flush()
+        return deletions
+
+    deletions = asyncio.run(run())
+    assert channel.bulk_calls == [message_ids]
+    assert len(deletions) == 0
+
+
+def test_failed_bulk_falls_back_and_keeps_failures_queued(tmp_path):
+    message_ids = [_recent_id(sequence) for sequence in range(3)]
+    channel = _Channel(bulk_allowed=False, failing={message_ids[2]})
+
+    async def run():
+        deletions = _scheduler(tmp_path, channel, retry_delay=0.05, max_attempts=2)
+        await deletions.start()
+        deletions.schedule_ids(channel.id, message_ids, 0)
+        await asyncio.sleep(0.03)
+        # A mensagem que falhou continua na fila esperando a nova tentativa
+        assert len(deletions) == 1
+        await asyncio.sleep(0.15)
+        await deletions.flush()
+        return deletions
+
+    deletions = asyncio.run(run())
+    assert sorted(channel.deleted) == message_ids[:2]
+    assert len(deletions) == 0
+    assert deletions.metrics()["failed"] == 1
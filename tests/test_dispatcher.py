@@ -0,0 +1,117 @@
+import time
+import asyncio
+import pytest
+
+from utils.dispatcher import (OutboundDispatcher, PRIORITY_MODERATION, PRIORITY_ROLES, PRIORITY_REPLIES,
+                              PRIORITY_COSMETIC)
+
+
+class _RateLimited(Exception):
+    """Imita o discord.HTTPException de um 429 (tem `status` e `retry_after`)"""
+
+    status = 429
+
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.retry_after = retry_after
+
+
+def test_higher_priority_runs_first():
+    async def run():
+        dispatcher = OutboundDispatcher(concurrency=1)
+        order = []
+
+        def call(name):
+            async def factory():
+                order.append(name)
+            return factory
+
+        await asyncio.gather(
+            dispatcher.submit(PRIORITY_COSMETIC, "channel:edit:1", call("cosmetic")),
+            dispatcher.submit(PRIORITY_REPLIES, "channel:send:1", call("replies")),
+            dispatcher.submit(PRIORITY_ROLES, "member:roles:1", call("roles")),
+            dispatcher.submit(PRIORITY_MODERATION, "member:edit:1", call("moderation")),
+        )
+        assert order == ["moderation", "roles", "replies", "cosmetic"]
+
+    asyncio.run(run())
+
+
+def test_route_is_throttled_without_delaying_other_routes():
+    async def run():
+        dispatcher = OutboundDispatcher(route_limits={"channel": (2, 0.2)})
+        started = {}
+        begin = time.monotonic()
+
+        def call(name):
+            async def factory():
+                started[name] = time.monotonic() - begin
+            return factory
+
+        await asyncio.gather(
+            *(dispatcher.submit(PRIORITY_COSMETIC, "channel:edit:1", call(f"edit{i}")) for i in range(4)),
+            dispatcher.submit(PRIORITY_COSMETIC, "channel:edit:2", call("other_channel")),
+            dispatcher.submit(PRIORITY_COSMETIC, "channel:send:1", call("other_method")),
+        )
+        # 2 na hora e depois 1 a cada 0,1 s na mesma rota
+        assert started["edit1"] < 0.05
+        assert started["edit2"] >= 0.08
+        assert started["edit3"] >= 0.18
+        assert started["other_channel"] < 0.05
+        assert started["other_method"] < 0.05
+        assert dispatcher.calls_by_route == {"channel:edit": 5, "channel:send": 1}
+
+    asyncio.run(run())
+
+
+def test_rate_limited_call_is_retried_once():
+    async def run():
+        dispatcher = OutboundDispatcher()
+        attempts = []
+
+        async def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise _RateLimited(0.05)
+            return "ok"
+
+        assert await dispatcher.submit(PRIORITY_REPLIES, "channel:send:1", flaky) == "ok"
+        assert len(attempts) == 2
+        # A rota ficou bloqueada pelo tempo pedido no 429
+        assert attempts[1] - attempts[0] >= 0.04
+        assert dispatcher.rate_limited == 1
+
+        calls = []
+
+        async def always_limited():
+            calls.append(1)
+            raise _RateLimited(0.01)
+
+        with pytest.raises(_RateLimited):
+            await dispatcher.submit(PRIORITY_REPLIES, "channel:send:2", always_limited)
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_slow_cosmetic_calls_do_not_block_moderation():
+    async def run():
+        dispatcher = OutboundDispatcher(concurrency=4)
+        finished = asyncio.Event()
+
+        async def slow():
+            await finished.wait()
+
+        cosmetic = [asyncio.create_task(dispatcher.submit(PRIORITY_COSMETIC, f"channel:edit:{i}", slow))
+                    for i in range(6)]
+        await asyncio.sleep(0.01)
+
+        async def kick():
+            return "kicked"
+
+        # Todas as chamadas cosméticas seguem presas, mas a vaga reservada atende a expulsão
+        assert await asyncio.wait_for(dispatcher.submit(PRIORITY_MODERATION, "member:edit:1", kick), 1.0) == "kicked"
+        finished.set()
+        await asyncio.gather(*cosmetic)
+
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+import asyncio
+
+from utils.dispatcher import OutboundDispatcher
+from utils.edit_coalescer import MessageEditCoalescer
+
+
+class _Channel:
+    id = 1
+
+
+class _Message:
+    def __init__(self, message_id, delay=0.0):
+        self.id = message_id
+        self.channel = _Channel()
+        self.delay = delay
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.edits.append(kwargs["content"])
+
+
+def test_only_the_latest_render_is_sent():
+    message = _Message(1)
+
+    async def run():
+        edits = MessageEditCoalescer(OutboundDispatcher())
+        for second in range(5, 0, -1):
+            edits.submit(message, content=f"{second}s")
+        await asyncio.sleep(0.05)
+        return edits
+
+    edits = asyncio.run(run())
+    assert message.edits == ["1s"]
+    assert edits.metrics()["superseded"] == 4
+
+
+def test_final_state_is_never_overwritten_by_a_late_countdown():
+    # A edição de contador demora: o estado final espera por ela e chega por último
+    message = _Message(1, delay=0.05)
+
+    async def run():
+        edits = MessageEditCoalescer(OutboundDispatcher())
+        edits.submit(message, content="10s")
+        await asyncio.sleep(0.01)
+        edits.submit(message, content="9s")
+        await edits.finalize(message, content="aprovado")
+        # Contadores que chegam depois do estado final são ignorados
+        edits.submit(message, content="8s")
+        await asyncio.sleep(0.1)
+        return edits
+
+    edits = asyncio.run(run())
+    assert message.edits == ["10s", "aprovado"]
+    assert edits.metrics()["cancelled"] == 2
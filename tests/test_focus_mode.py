@@ -0,0 +1,55 @@
+import os
+import json
+import time
+import asyncio
+import pytest
+
+pytest.importorskip("discord")
+
+# Config lê os IDs do ambiente na importação
+for variable in ("ID_DO_SERVIDOR", "ID_CANAL_VOZ_FOCO", "ID_CANAL_LOG_FOCO", "ID_CANAL_CHAT_BOT",
+                 "ID_CANAL_VOZ_CAMERA", "ID_CARGO_RESTRICAO", "ID_CARGO_LOBINHO_FOCADO", "ID_GYM_ROLE",
+                 "ID_CONFESSIONS_ROLE", "ID_CARTOLA_ROLE", "ID_POKEMON_ROLE", "ID_GARTIC_ROLE",
+                 "ID_XADREZ_ROLE"):
+    os.environ.setdefault(variable, "1")
+
+from events.focus_mode import FocusMode
+from utils.job_queue import PersistentJobQueue
+from utils.ttl import TTLDict
+
+
+def _focus_mode(data_dir):
+    """FocusMode com os arquivos em `data_dir`, sem tocar nos dados reais do bot"""
+    focus = FocusMode.__new__(FocusMode)
+    focus.restriction_time = 10
+    focus.data_file = os.path.join(data_dir, "time_data.json")
+    focus.last_exit_times = TTLDict(ttl=focus.restriction_time + 300)
+    focus.removed_roles = {}
+    focus.jobs = PersistentJobQueue(os.path.join(data_dir, "focus_jobs.json"))
+    return focus
+
+
+def test_old_exit_still_gets_restriction_removed(tmp_path):
+    old_exit = time.time() - 3600  # bem mais antigo que o TTL de 310 s
+    with open(tmp_path / "time_data.json", "w") as f:
+        json.dump({"last_exit_times": {"42": old_exit}, "removed_roles": {}}, f)
+
+    focus = _focus_mode(str(tmp_path))
+    focus.load_data()
+
+    assert 42 not in focus.last_exit_times
+    assert focus.jobs.has_job(42, "remove_restriction")
+
+    expired = []
+
+    async def record(member_id):
+        expired.append(member_id)
+
+    async def run():
+        focus.jobs.register("remove_restriction", record)
+        await focus.jobs.start()
+        await focus.jobs.flush()
+
+    asyncio.run(run())
+    assert expired == [42]
+    assert not focus.jobs.has_job(42, "remove_restriction")
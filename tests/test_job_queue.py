@@ -0,0 +1,56 @@
+import time
+import asyncio
+
+from utils.job_queue import PersistentJobQueue
+
+
+def test_overdue_jobs_run_after_reload(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    # Fora do event loop cada alteração já vai para o disco
+    jobs = PersistentJobQueue(path)
+    jobs.add(time.time() - 60, 1, "remove_restriction")
+    jobs.add(time.time() - 30, 2, "remove_restriction")
+    jobs.add(time.time() + 3600, 3, "remove_restriction")
+    jobs.add(time.time() - 10, 4, "remove_restriction")
+    assert jobs.cancel(4, "remove_restriction")
+
+    reloaded = PersistentJobQueue(path)
+    assert reloaded.member_ids() == {1, 2, 3}
+    executed = []
+
+    async def remove_restriction(member_id):
+        executed.append(member_id)
+
+    async def run():
+        reloaded.register("remove_restriction", remove_restriction)
+        await reloaded.start()
+        await reloaded.flush()
+        reloaded.scheduler.close()
+
+    asyncio.run(run())
+    assert sorted(executed) == [1, 2]
+    assert reloaded.member_ids() == {3}
+    assert PersistentJobQueue(path).member_ids() == {3}
+
+
+def test_job_runs_at_its_deadline_and_failures_leave_the_queue(tmp_path):
+    jobs = PersistentJobQueue(str(tmp_path / "jobs.json"))
+    executed = []
+
+    async def remove_restriction(member_id):
+        executed.append(member_id)
+        if member_id == 2:
+            raise RuntimeError("membro saiu do servidor")
+
+    async def run():
+        jobs.register("remove_restriction", remove_restriction)
+        await jobs.start()
+        jobs.add(time.time() + 0.02, 1, "remove_restriction")
+        jobs.add(time.time() + 0.02, 2, "remove_restriction")
+        assert executed == []
+        await asyncio.sleep(0.1)
+        await jobs.flush()
+
+    asyncio.run(run())
+    assert sorted(executed) == [1, 2]
+    assert len(jobs) == 0
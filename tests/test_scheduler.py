@@ -0,0 +1,70 @@
+import random
+import asyncio
+
+from utils.scheduler import DeadlineScheduler
+
+
+def _assert_heap_consistent(scheduler):
+    heap = scheduler._heap
+    for index, entry in enumerate(heap):
+        assert scheduler._positions[entry[2]] == index
+        if index:
+            assert heap[(index - 1) // 2][:2] <= entry[:2]
+    assert len(scheduler._positions) == len(heap)
+
+
+def test_cancel_and_reschedule_keep_heap_ordered():
+    async def noop():
+        pass
+
+    async def run():
+        scheduler = DeadlineScheduler()
+        rng = random.Random(1)
+        keys = list(range(200))
+        for key in keys:
+            scheduler.schedule(key, rng.uniform(10, 100), noop)
+        _assert_heap_consistent(scheduler)
+
+        for key in rng.sample(keys, 100):
+            # Reagendar para antes e para depois do prazo atual
+            scheduler.schedule(key, rng.uniform(1, 200), noop)
+            _assert_heap_consistent(scheduler)
+
+        cancelled = rng.sample(keys, 70)
+        for key in cancelled:
+            assert scheduler.cancel(key)
+            _assert_heap_consistent(scheduler)
+        assert not scheduler.cancel(cancelled[0])
+
+        assert len(scheduler) == 130
+        assert all(key not in scheduler for key in cancelled)
+        remaining = {key: scheduler.remaining(key) for key in keys if key in scheduler}
+        assert scheduler._heap[0][2] == min(remaining, key=remaining.get)
+        scheduler.close()
+
+    asyncio.run(run())
+
+
+def test_callbacks_fire_in_deadline_order():
+    async def run():
+        scheduler = DeadlineScheduler()
+        fired = []
+
+        def record(key):
+            async def callback():
+                fired.append(key)
+            return callback
+
+        scheduler.schedule("a", 0.03, record("a"))
+        scheduler.schedule("b", 0.01, record("b"))
+        scheduler.schedule("c", 0.05, record("c"))
+        scheduler.schedule("d", 0.02, record("d"))
+        # "c" passa para a frente; "d" é cancelado e nunca dispara
+        scheduler.schedule("c", 0.0, record("c"))
+        scheduler.cancel("d")
+
+        await asyncio.sleep(0.1)
+        assert fired == ["c", "b", "a"]
+        assert len(scheduler) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+import json
+import time
+
+from utils.ttl import TTLDict, TTLSet
+
+
+def test_keys_expire_lazily_and_on_sweep():
+    cache = TTLDict(ttl=60)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+
+    assert "short" not in cache
+    assert cache.get("short", "default") == "default"
+    assert cache["long"] == 2
+    assert cache.expired == 1
+
+    cache.set("short", 1, expires_at=time.time() - 1)
+    assert cache.sweep() == 1
+    assert cache.keys() == ["long"]
+
+
+def test_max_size_evicts_the_oldest_write():
+    cache = TTLDict(ttl=60, max_size=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    # Regravar renova a posição de "a"
+    cache["a"] = 3
+    cache["c"] = 4
+
+    assert sorted(cache.keys()) == ["a", "c"]
+    assert cache.evicted == 1
+
+
+def test_snapshot_and_restore_keep_deadlines():
+    cache = TTLDict(ttl=60)
+    cache.set(1, "válido")
+    cache.set(2, "vencido", ttl=0.01)
+    expires_at = cache.expires_at(1)
+    time.sleep(0.02)
+
+    # Como no disco: chaves viram texto no JSON
+    snapshot = json.loads(json.dumps(cache.snapshot()))
+    assert list(snapshot) == ["1"]
+
+    restored = TTLDict(ttl=60)
+    restored.restore(snapshot, key_type=int)
+    assert restored[1] == "válido"
+    assert restored.expires_at(1) == expires_at
+
+    # Prazos que vencem antes de recarregar não voltam
+    snapshot["3"] = ["antigo", time.time() - 1]
+    other = TTLDict(ttl=60)
+    other.restore(snapshot, key_type=int)
+    assert other.keys() == [1]
+
+
+def test_ttl_set_snapshot_and_restore():
+    members = TTLSet(ttl=60)
+    members.add(10)
+    members.add(20, ttl=0.01)
+    time.sleep(0.02)
+
+    assert 10 in members and 20 not in members
+    restored = TTLSet(ttl=60)
+    restored.restore(json.loads(json.dumps(members.snapshot())), key_type=int)
+    assert list(restored) == [10]
+
+    restored.discard(10)
+    assert len(restored) == 0
@@ -0,0 +1,185 @@
+import time
+import bisect
+import asyncio
+import itertools
+
+# Faixas de prioridade das chamadas ao Gemini (menor número = atendida primeiro)
+LANE_DEDICATED = 0   # mensagens no canal dedicado do chat bot
+LANE_MENTION = 1     # menções em outros canais (inclui respostas de opinião)
+LANE_BACKGROUND = 2  # trabalho de fundo (ex.: resumo do histórico)
+
+LANE_NAMES = {
+    LANE_DEDICATED: "dedicated",
+    LANE_MENTION: "mention",
+    LANE_BACKGROUND: "background",
+}
+
+
+class AdmissionRejected(Exception):
+    """A fila de espera está cheia (ou a espera passou do limite): a chamada não foi feita"""
+
+
+class _QuotaBucket:
+    """Balde de tokens que reabastece continuamente `capacity` unidades por minuto"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now, amount):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def time_until(self, now, amount):
+        """Segundos até acumular `amount` unidades (sem limitar à capacidade; para projeções)"""
+        self._refill(now)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, now, amount):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    """Controle de admissão global das chamadas ao Gemini.
+
+    Cada chamada precisa de 1 requisição do balde de RPM e da sua estimativa de tokens
+    do balde de TPM, dimensionados pela cota da API. Quem não pode ser atendido na hora
+    espera em uma fila limitada, ordenada por faixa de prioridade. Com a fila cheia, um
+    pedido novo de faixa mais prioritária desloca o último da fila; se não houver quem
+    deslocar, o pedido é recusado na hora com `AdmissionRejected` em vez de esperar
+    até dar timeout.
+
+    A fila também é limitada pelo tempo: pela posição e pelo RPM dá para estimar quando
+    cada pedido seria admitido, e quem passaria de `max_wait` é recusado na hora (o
+    pedido novo ou, quando ele fura a fila, os últimos que ficaram sem tempo).
+    """
+
+    def __init__(self, rpm=15, tpm=1_000_000, max_queue=20, max_wait=30.0):
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._requests = _QuotaBucket(rpm)
+        self._tokens = _QuotaBucket(tpm)
+        # Lista ordenada de (faixa, seq, tokens, future)
+        self._waiting = []
+        self._seq = itertools.count()
+        self._timer = None
+
+        # Métricas
+        self.admitted = {name: 0 for name in LANE_NAMES.values()}
+        self.rejected = {name: 0 for name in LANE_NAMES.values()}
+        self.max_queue_depth = 0
+
+    async def acquire(self, lane, tokens):
+        """Aguarda a vez da chamada na cota; levanta AdmissionRejected se não houver espaço"""
+        lane_name = LANE_NAMES.get(lane, "background")
+        if not self._waiting and self._try_admit(tokens):
+            self.admitted[lane_name] += 1
+            return
+
+        # Quem está na frente: mesma faixa ou mais prioritária (a mesma faixa é atendida por ordem)
+        position = sum(1 for waiting_lane, _, _, _ in self._waiting if waiting_lane <= lane)
+        if self._projected_wait(position, tokens) > self.max_wait:
+            self.rejected[lane_name] += 1
+            raise AdmissionRejected("espera estimada na fila do Gemini acima do limite")
+
+        if len(self._waiting) >= self.max_queue:
+            last_lane, _, _, last_future = self._waiting[-1]
+            if last_lane <= lane:
+                self.rejected[lane_name] += 1
+                raise AdmissionRejected("fila do Gemini cheia")
+            # Deslocar o pedido menos prioritário para dar lugar a este
+            self._waiting.pop()
+            self.rejected[LANE_NAMES.get(last_lane, "background")] += 1
+            last_future.set_exception(AdmissionRejected("deslocado por um pedido mais prioritário"))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (lane, next(self._seq), tokens, future)
+        bisect.insort(self._waiting, entry)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+        self._reject_late()
+        self._pump()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+            self.rejected[lane_name] += 1
+            raise AdmissionRejected("tempo de espera na fila do Gemini esgotado")
+        except asyncio.CancelledError:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+                self._pump()
+            raise
+        self.admitted[lane_name] += 1
+
+    def _projected_wait(self, position, tokens):
+        """Espera estimada de um pedido com `position` pedidos na frente"""
+        now = time.monotonic()
+        return max(self._requests.time_until(now, position + 1), self._tokens.wait_time(now, tokens))
+
+    def _reject_late(self):
+        """Recusa já os últimos da fila que, empurrados para trás, não seriam admitidos a tempo"""
+        while len(self._waiting) > 1:
+            last_lane, _, last_tokens, last_future = self._waiting[-1]
+            if last_future.done():
+                self._waiting.pop()
+                continue
+            if self._projected_wait(len(self._waiting) - 1, last_tokens) <= self.max_wait:
+                break
+            self._waiting.pop()
+            self.rejected[LANE_NAMES.get(last_lane, "background")] += 1
+            last_future.set_exception(AdmissionRejected("deslocado por um pedido mais prioritário"))
+
+    def _try_admit(self, tokens):
+        now = time.monotonic()
+        if self._requests.wait_time(now, 1) > 0 or self._tokens.wait_time(now, tokens) > 0:
+            return False
+        self._requests.consume(now, 1)
+        self._tokens.consume(now, tokens)
+        return True
+
+    def _pump(self):
+        """Libera os primeiros da fila enquanto houver cota e agenda o próximo despertar"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiting:
+            _, _, tokens, future = self._waiting[0]
+            if future.done():
+                self._waiting.pop(0)
+                continue
+            if not self._try_admit(tokens):
+                break
+            self._waiting.pop(0)
+            future.set_result(None)
+
+        if self._waiting:
+            now = time.monotonic()
+            tokens = self._waiting[0][2]
+            wait = max(self._requests.wait_time(now, 1), self._tokens.wait_time(now, tokens))
+            self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+
+    def metrics(self):
+        depth = {name: 0 for name in LANE_NAMES.values()}
+        for lane, _, _, _ in self._waiting:
+            depth[LANE_NAMES.get(lane, "background")] += 1
+        return {
+            "queue_depth": depth,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+            "rpm_available": int(self._requests.tokens),
+            "tpm_available": int(self._tokens.tokens),
+        }
@@ -0,0 +1,330 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+from utils.persistence import WriteBehindWriter
+
+
+# Acima disso, cada gravação do JSON inteiro já trava o event loop de forma perceptível
+JSON_LARGE_STORE_MESSAGES = 20_000
+
+
+class JsonChatStorage:
+    """Armazena o histórico do chat bot em um único arquivo JSON (write-behind).
+
+    Cada gravação reserializa o arquivo inteiro segurando a GIL (ver WriteBehindWriter):
+    bom para servidores pequenos. Com muitos usuários, usar CHAT_STORAGE_BACKEND=sqlite.
+    """
+
+    def __init__(self, data_file, flush_interval=5.0, max_pending=20):
+        self.data_file = data_file
+        self.conversation_history = {}
+        # Resumo acumulado das mensagens antigas que saíram do histórico
+        self.summaries = {}
+        # Documento já serializável mantido em memória; só os usuários alterados são recopiados
+        self._persisted = {"conversation_history": {}, "summaries": {}}
+        # Gravação em lote: a cada `flush_interval` segundos ou `max_pending` alterações, fora do event loop
+        self.writer = WriteBehindWriter(self.data_file, self._snapshot_dirty_users,
+                                        flush_interval=flush_interval, max_pending=max_pending)
+
+    def load(self):
+        """Carrega os dados do arquivo JSON"""
+        self.conversation_history = {}
+        self.summaries = {}
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                    # Cooldowns antigos ("user_cooldowns") são ignorados e somem na próxima gravação
+                    self.conversation_history = {int(k): v for k, v in data.get("conversation_history", {}).items()}
+                    self.summaries = {int(k): v for k, v in data.get("summaries", {}).items()}
+            except Exception as e:
+                print(f"Erro ao carregar dados do Gemini Chat: {e}")
+                self.conversation_history = {}
+                self.summaries = {}
+
+        self._persisted = {"conversation_history": {}, "summaries": {}}
+        self._snapshot_dirty_users(set(self.conversation_history) | set(self.summaries))
+
+        messages = self.size()["messages"]
+        if messages > JSON_LARGE_STORE_MESSAGES:
+            print(f"Histórico do chat bot com {messages} mensagens em JSON: cada gravação trava o event loop. "
+                  f"Considere CHAT_STORAGE_BACKEND=sqlite")
+
+    def _snapshot_dirty_users(self, dirty_user_ids):
+        """Atualiza no documento persistido apenas os usuários alterados e o devolve para gravação"""
+        history_doc = self._persisted["conversation_history"]
+        summaries_doc = self._persisted["summaries"]
+
+        for user_id in dirty_user_ids:
+            key = str(user_id)
+            if user_id in self.conversation_history:
+                # Cópia rasa: a escrita roda em outra thread enquanto o histórico continua mudando
+                history_doc[key] = list(self.conversation_history[user_id])
+            else:
+                history_doc.pop(key, None)
+
+            if user_id in self.summaries:
+                summaries_doc[key] = self.summaries[user_id]
+            else:
+                summaries_doc.pop(key, None)
+
+        return {
+            "conversation_history": dict(history_doc),
+            "summaries": dict(summaries_doc)
+        }
+
+    def get_history(self, user_id):
+        return self.conversation_history.get(user_id, [])
+
+    def append(self, user_id, role, content, timestamp, keep_last=None):
+        """Adiciona uma mensagem ao histórico e, com `keep_last`, mantém apenas as últimas `keep_last`"""
+        history = self.conversation_history.setdefault(user_id, [])
+        history.append({
+            "role": role,
+            "content": content,
+            "timestamp": timestamp
+        })
+        if keep_last is not None and len(history) > keep_last:
+            del history[:-keep_last]
+        self.writer.mark_dirty(user_id)
+
+    def drop_oldest(self, user_id, up_to_timestamp):
+        """Remove do histórico as mensagens até `up_to_timestamp` (inclusive), já resumidas"""
+        history = self.conversation_history.get(user_id)
+        if not history:
+            return
+        history[:] = [message for message in history if message["timestamp"] > up_to_timestamp]
+        self.writer.mark_dirty(user_id)
+
+    def get_summary(self, user_id):
+        return self.summaries.get(user_id)
+
+    def set_summary(self, user_id, summary):
+        self.summaries[user_id] = summary
+        self.writer.mark_dirty(user_id)
+
+    def clear(self, user_id):
+        had_summary = self.summaries.pop(user_id, None) is not None
+        if user_id not in self.conversation_history:
+            if had_summary:
+                self.writer.mark_dirty(user_id)
+            return had_summary
+        del self.conversation_history[user_id]
+        self.writer.mark_dirty(user_id)
+        return True
+
+    def stats(self, user_id):
+        history = self.conversation_history.get(user_id)
+        if history is None:
+            return None
+
+        user_messages = len([msg for msg in history if msg["role"] == "user"])
+        bot_messages = len([msg for msg in history if msg["role"] == "model"])
+
+        return {
+            "user_messages": user_messages,
+            "bot_responses": bot_messages,
+            "total_interactions": len(history) // 2,
+            "last_interaction": history[-1]["timestamp"] if history else None
+        }
+
+    def size(self):
+        """Quantidade de usuários com histórico e de mensagens guardadas"""
+        return {
+            "users": len(self.conversation_history),
+            "messages": sum(len(history) for history in self.conversation_history.values()),
+        }
+
+    def flush_sync(self):
+        """Grava imediatamente todos os dados no arquivo JSON (uso fora do event loop)"""
+        for user_id in set(self.conversation_history) | set(self.summaries):
+            self.writer.mark_dirty(user_id)
+        self.writer.flush_sync()
+
+    async def flush(self):
+        """Força a gravação das alterações pendentes"""
+        await self.writer.close()
+
+    async def close(self):
+        await self.flush()
+
+
+class SqliteChatStorage:
+    """Armazena o histórico do chat bot em SQLite (WAL), uma linha por mensagem.
+
+    Leituras são indexadas por (user_id, timestamp), a inclusão de uma mensagem é
+    um único INSERT e o corte do histórico acontece no próprio SQL.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        # isolation_level=None: controlamos as transações explicitamente
+        self.conn = sqlite3.connect(db_file, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, NORMAL só faz fsync no checkpoint: commits não esperam o disco
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_user_timestamp ON messages (user_id, timestamp);
+            -- Cooldowns ficam só em memória no chat bot; a tabela antiga não é mais usada
+            DROP TABLE IF EXISTS user_cooldowns;
+            CREATE TABLE IF NOT EXISTS summaries (
+                user_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def load(self):
+        """Nada a carregar: as leituras são feitas sob demanda por usuário"""
+
+    def get_history(self, user_id):
+        rows = self.conn.execute(
+            "SELECT role, content, timestamp FROM messages WHERE user_id = ? ORDER BY timestamp, id",
+            (user_id,)
+        ).fetchall()
+        return [{"role": role, "content": content, "timestamp": timestamp} for role, content, timestamp in rows]
+
+    def append(self, user_id, role, content, timestamp, keep_last=None):
+        """Adiciona uma mensagem ao histórico e, com `keep_last`, mantém apenas as últimas `keep_last`"""
+        if keep_last is None:
+            self.conn.execute(
+                "INSERT INTO messages (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                (user_id, role, content, timestamp)
+            )
+            return
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT INTO messages (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                (user_id, role, content, timestamp)
+            )
+            self.conn.execute(
+                """DELETE FROM messages WHERE user_id = ? AND id IN (
+                       SELECT id FROM messages WHERE user_id = ?
+                       ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET ?
+                   )""",
+                (user_id, user_id, keep_last)
+            )
+
+    def drop_oldest(self, user_id, up_to_timestamp):
+        """Remove do histórico as mensagens até `up_to_timestamp` (inclusive), já resumidas"""
+        self.conn.execute("DELETE FROM messages WHERE user_id = ? AND timestamp <= ?", (user_id, up_to_timestamp))
+
+    def get_summary(self, user_id):
+        row = self.conn.execute("SELECT summary FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_summary(self, user_id, summary):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO summaries (user_id, summary, updated_at) VALUES (?, ?, ?)",
+            (user_id, summary, datetime.now().isoformat())
+        )
+
+    def clear(self, user_id):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            messages = self.conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,)).rowcount
+            summaries = self.conn.execute("DELETE FROM summaries WHERE user_id = ?", (user_id,)).rowcount
+        return messages + summaries > 0
+
+    def stats(self, user_id):
+        user_messages, bot_messages, total, last_interaction = self.conn.execute(
+            """SELECT COALESCE(SUM(role = 'user'), 0), COALESCE(SUM(role = 'model'), 0),
+                      COUNT(*), MAX(timestamp)
+               FROM messages WHERE user_id = ?""",
+            (user_id,)
+        ).fetchone()
+        if total == 0:
+            return None
+
+        return {
+            "user_messages": user_messages,
+            "bot_responses": bot_messages,
+            "total_interactions": total // 2,
+            "last_interaction": last_interaction
+        }
+
+    def size(self):
+        """Quantidade de usuários com histórico e de mensagens guardadas"""
+        users, messages = self.conn.execute(
+            "SELECT COUNT(DISTINCT user_id), COUNT(*) FROM messages"
+        ).fetchone()
+        return {"users": users, "messages": messages}
+
+    def migrate_from_json(self, json_file):
+        """Migração única do arquivo JSON antigo para o SQLite. Retorna o número de mensagens importadas"""
+        already_migrated = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+        if already_migrated or not os.path.exists(json_file):
+            return 0
+
+        with open(json_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        rows = [
+            (int(user_id), message["role"], message["content"], message["timestamp"])
+            for user_id, history in data.get("conversation_history", {}).items()
+            for message in history
+        ]
+        # Os resumos guardam o que já saiu do histórico: sem eles, essas mensagens se perdem
+        migrated_at = datetime.now().isoformat()
+        summaries = [(int(user_id), summary, migrated_at)
+                     for user_id, summary in data.get("summaries", {}).items() if summary]
+
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO messages (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)", rows)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO summaries (user_id, summary, updated_at) VALUES (?, ?, ?)", summaries)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (migrated_at,)
+            )
+
+        print(f"Migração do JSON concluída: {len(rows)} mensagens de {len(data.get('conversation_history', {}))} usuários "
+              f"e {len(summaries)} resumos")
+        return len(rows)
+
+    def flush_sync(self):
+        """Nada pendente: cada operação já é confirmada no SQLite"""
+
+    async def flush(self):
+        """Nada pendente: cada operação já é confirmada no SQLite"""
+
+    async def close(self):
+        self.conn.close()
+
+
+def create_chat_storage(backend, data_dir):
+    """Cria o backend de armazenamento do chat bot ("json" ou "sqlite")"""
+    json_file = os.path.join(data_dir, "gemini_chat_data.json")
+    if backend == "sqlite":
+        storage = SqliteChatStorage(os.path.join(data_dir, "gemini_chat_data.db"))
+        storage.migrate_from_json(json_file)
+        return storage
+    return JsonChatStorage(json_file)
+
+
+if __name__ == "__main__":
+    # Uso: python -m utils.chat_storage <arquivo.json> <arquivo.db>
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Uso: python -m utils.chat_storage <arquivo.json> <arquivo.db>")
+        sys.exit(1)
+
+    SqliteChatStorage(sys.argv[2]).migrate_from_json(sys.argv[1])
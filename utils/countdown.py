@@ -0,0 +1,27 @@
+# Modos de renderização do contador regressivo dos avisos
+COUNTDOWN_MODE_EDITS = "edits"          # edita o embed nos marcos abaixo
+COUNTDOWN_MODE_TIMESTAMP = "timestamp"  # mostra <t:prazo:R> e o próprio Discord faz a contagem
+
+# Marcos (segundos restantes) em que o embed é editado no modo "edits"
+COUNTDOWN_INTERVALS = (30, 20, 15, 10, 5, 3, 2, 1)
+
+
+def countdown_intervals_for_mode(mode):
+    """Retorna os marcos de edição do modo; o modo timestamp não faz nenhuma edição intermediária"""
+    if mode == COUNTDOWN_MODE_TIMESTAMP:
+        return ()
+    return COUNTDOWN_INTERVALS
+
+
+def next_countdown_step(remaining, intervals, last_step=None):
+    """Retorna o próximo marco a editar, ou None se o próximo passo for o prazo final"""
+    limit = remaining if last_step is None else min(remaining, last_step)
+    for interval in intervals:
+        if interval < limit:
+            return interval
+    return None
+
+
+def relative_timestamp(deadline):
+    """Formata o prazo (epoch) como timestamp relativo do Discord, que conta sozinho no cliente"""
+    return f"<t:{int(deadline)}:R>"
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import discord
+from functools import partial
+from utils.dispatcher import PRIORITY_COSMETIC
+from utils.persistence import WriteBehindWriter
+from utils.scheduler import DeadlineScheduler
+
+DISCORD_EPOCH_MS = 1420070400000
+# O Discord só aceita apagar em lote mensagens com menos de 14 dias
+BULK_DELETE_MAX_AGE = 14 * 24 * 60 * 60 - 60
+BULK_DELETE_MAX_MESSAGES = 100
+
+
+def _message_created_at(message_id):
+    """Extrai o horário de criação (epoch) do snowflake da mensagem"""
+    return ((message_id >> 22) + DISCORD_EPOCH_MS) / 1000
+
+
+class BulkDeletionScheduler:
+    """Agenda a deleção de mensagens temporárias e as apaga em lote por canal.
+
+    Cada canal tem um único prazo no agendador compartilhado; quando ele vence, todas
+    as mensagens do canal que vencem dentro da janela `batch_window` são apagadas com
+    `channel.delete_messages` (até 100 por chamada). As deleções pendentes ficam
+    gravadas em disco e são retomadas depois de um reinício.
+
+    Uma mensagem só sai da fila depois de apagada (ou se já não existir). Se o lote
+    falhar (ex.: sem a permissão Gerenciar Mensagens), cada mensagem é apagada
+    individualmente; as que ainda falharem voltam para a fila com espera crescente,
+    até `max_attempts` tentativas.
+    """
+
+    def __init__(self, client, dispatcher, path, batch_window=5.0, retry_delay=60.0, max_attempts=3):
+        self.client = client
+        self.dispatcher = dispatcher
+        self.path = path
+        self.batch_window = batch_window
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        # message_id -> (channel_id, due_time epoch)
+        self._pending = {}
+        # Mensagens sendo apagadas agora (não entram em outro lote)
+        self._inflight = set()
+        # message_id -> tentativas que falharam
+        self._attempts = {}
+        # Canais onde o bot não pode apagar em lote (Forbidden): só deleção individual
+        self._bulk_denied = set()
+        self._started = False
+        self.scheduler = DeadlineScheduler()
+        self.writer = WriteBehindWriter(path, self._snapshot, flush_interval=5.0, max_pending=20)
+
+        # Métricas
+        self.bulk_calls = 0
+        self.single_calls = 0
+        self.deleted = 0
+        self.failed = 0
+
+        self.load()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def load(self):
+        """Carrega as deleções pendentes do disco"""
+        self._pending = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for message_id, channel_id, due_time in json.load(f).get("pending", []):
+                    self._pending[int(message_id)] = (int(channel_id), due_time)
+        except Exception as e:
+            print(f"Erro ao carregar deleções pendentes: {e}")
+
+    def _snapshot(self, _dirty):
+        return {
+            "pending": [[message_id, channel_id, due_time]
+                        for message_id, (channel_id, due_time) in self._pending.items()]
+        }
+
+    def schedule(self, message, delay_seconds):
+        """Agenda a deleção da mensagem para daqui a `delay_seconds` segundos"""
+        self.schedule_ids(message.channel.id, [message.id], delay_seconds)
+
+    def schedule_ids(self, channel_id, message_ids, delay_seconds):
+        """Agenda a deleção de mensagens pelos ids (ex.: mensagens órfãs após um reinício)"""
+        due_time = time.time() + delay_seconds
+        for message_id in message_ids:
+            self._pending[message_id] = (channel_id, due_time)
+            self.writer.mark_dirty(message_id)
+        if self._started:
+            self._arm_channel(channel_id)
+
+    def cancel(self, message_id):
+        """Remove a mensagem da fila de deleção (ex.: já foi apagada de outra forma)"""
+        self._attempts.pop(message_id, None)
+        if self._pending.pop(message_id, None) is not None:
+            self.writer.mark_dirty(message_id)
+
+    async def start(self):
+        """Retoma as deleções pendentes. Pode ser chamado mais de uma vez"""
+        if self._started:
+            return
+        self._started = True
+        for channel_id in {channel_id for channel_id, _ in self._pending.values()}:
+            self._arm_channel(channel_id)
+
+    def _arm_channel(self, channel_id):
+        """Agenda o lote do canal para a deleção pendente mais próxima"""
+        due_times = [due for message_id, (cid, due) in self._pending.items()
+                     if cid == channel_id and message_id not in self._inflight]
+        if not due_times:
+            self.scheduler.cancel(channel_id)
+            return
+        delay = min(due_times) - time.time()
+        current = self.scheduler.remaining(channel_id)
+        if current is None or delay < current:
+            self.scheduler.schedule(channel_id, delay, partial(self._flush_channel, channel_id))
+
+    async def _flush_channel(self, channel_id):
+        """Apaga em lote todas as mensagens do canal que vencem dentro da janela"""
+        limit = time.time() + self.batch_window
+        due_ids = [message_id for message_id, (cid, due) in self._pending.items()
+                   if cid == channel_id and due <= limit and message_id not in self._inflight]
+        if not due_ids:
+            self._arm_channel(channel_id)
+            return
+
+        self._inflight.update(due_ids)
+        try:
+            channel = self.client.get_channel(channel_id)
+            if not channel:
+                print(f"Canal {channel_id} não encontrado: {len(due_ids)} deleção(ões) descartada(s)")
+                self._finish(due_ids)
+                return
+
+            now = time.time()
+            recent = [message_id for message_id in due_ids
+                      if now - _message_created_at(message_id) < BULK_DELETE_MAX_AGE]
+            singles = [message_id for message_id in due_ids
+                       if now - _message_created_at(message_id) >= BULK_DELETE_MAX_AGE]
+            done = []
+
+            for start in range(0, len(recent), BULK_DELETE_MAX_MESSAGES):
+                chunk = recent[start:start + BULK_DELETE_MAX_MESSAGES]
+                if len(chunk) == 1 or channel_id in self._bulk_denied:
+                    singles.extend(chunk)
+                    continue
+                messages = [channel.get_partial_message(message_id) for message_id in chunk]
+                try:
+                    await self.dispatcher.submit(PRIORITY_COSMETIC, f"channel:bulk_delete:{channel_id}",
+                                                 partial(channel.delete_messages, messages))
+                    self.bulk_calls += 1
+                    self.deleted += len(chunk)
+                    done.extend(chunk)
+                except Exception as e:
+                    # Sem permissão para o lote (ou erro da API): apagar uma a uma
+                    if isinstance(e, discord.Forbidden):
+                        self._bulk_denied.add(channel_id)
+                    print(f"Erro ao apagar {len(chunk)} mensagens em lote, apagando individualmente: {e}")
+                    singles.extend(chunk)
+
+            for message_id in singles:
+                if await self._delete_single(channel.get_partial_message(message_id)):
+                    done.append(message_id)
+
+            self._finish(done)
+            done = set(done)
+            self._retry([message_id for message_id in due_ids if message_id not in done])
+        finally:
+            self._inflight.difference_update(due_ids)
+            # Reagendar o próximo lote do canal, se houver
+            self._arm_channel(channel_id)
+
+    async def _delete_single(self, message):
+        """Apaga uma mensagem. Retorna True se ela não existe mais (apagada agora ou antes)"""
+        try:
+            await self.dispatcher.delete_message(message, priority=PRIORITY_COSMETIC)
+            self.single_calls += 1
+            self.deleted += 1
+            return True
+        except discord.NotFound:
+            return True
+        except Exception as e:
+            print(f"Erro ao deletar mensagem {message.id}: {e}")
+            return False
+
+    def _finish(self, message_ids):
+        """Tira da fila (e do disco) as mensagens já resolvidas"""
+        for message_id in message_ids:
+            self._attempts.pop(message_id, None)
+            if self._pending.pop(message_id, None) is not None:
+                self.writer.mark_dirty(message_id)
+
+    def _retry(self, message_ids):
+        """Devolve para a fila as mensagens que falharam, com espera crescente"""
+        for message_id in message_ids:
+            if message_id not in self._pending:
+                continue
+            attempts = self._attempts.get(message_id, 0) + 1
+            if attempts >= self.max_attempts:
+                print(f"Desistindo de apagar a mensagem {message_id} após {attempts} tentativas")
+                self.failed += 1
+                self._finish([message_id])
+                continue
+            self._attempts[message_id] = attempts
+            channel_id, _ = self._pending[message_id]
+            self._pending[message_id] = (channel_id, time.time() + self.retry_delay * attempts)
+            self.writer.mark_dirty(message_id)
+
+    async def flush(self):
+        await self.writer.close()
+
+    def metrics(self):
+        return {
+            "pending": len(self._pending),
+            "bulk_calls": self.bulk_calls,
+            "single_calls": self.single_calls,
+            "deleted": self.deleted,
+            "failed": self.failed,
+        }
@@ -0,0 +1,293 @@
+import time
+import bisect
+import asyncio
+import itertools
+from functools import partial
+from utils.ttl import TTLDict
+
+# Classes de prioridade (menor número = sai primeiro)
+PRIORITY_MODERATION = 0  # expulsões do canal de câmera
+PRIORITY_ROLES = 1       # mudanças de cargos do modo foco
+PRIORITY_REPLIES = 2     # mensagens e respostas para os usuários
+PRIORITY_COSMETIC = 3    # edições de contador e deleções de mensagens
+
+PRIORITY_NAMES = {
+    PRIORITY_MODERATION: "moderation",
+    PRIORITY_ROLES: "roles",
+    PRIORITY_REPLIES: "replies",
+    PRIORITY_COSMETIC: "cosmetic",
+}
+
+# Orçamento por tipo de rota: (requisições, período em segundos). Valores um pouco abaixo
+# dos limites do Discord para o bot se frear antes de receber um 429. O Discord limita
+# cada método separadamente (enviar, editar e apagar no mesmo canal não dividem o
+# limite), então "tipo:método" tem precedência sobre o tipo.
+DEFAULT_ROUTE_LIMITS = {
+    "channel": (5, 5.0),
+    "channel:delete": (5, 1.0),
+    "member": (5, 5.0),
+    "default": (10, 1.0),
+}
+DEFAULT_GLOBAL_LIMIT = (45, 1.0)
+# Baldes sem uso por esse tempo são descartados (um balde novo começa cheio, como estaria)
+DEFAULT_BUCKET_TTL = 300.0
+
+
+class _TokenBucket:
+    """Balde de tokens de uma rota; também respeita bloqueios vindos de um 429"""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_time(self, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until):
+        # O retry_after do Discord vai até o balde dele reiniciar: no fim do bloqueio
+        # já cabe uma chamada, e o reabastecimento recomeça a partir dali
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 1.0
+        self.updated = self.blocked_until
+
+
+class _Job:
+    __slots__ = ("priority", "route", "factory", "future", "enqueued_at", "attempts")
+
+    def __init__(self, priority, route, factory, future):
+        self.priority = priority
+        self.route = route
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class OutboundDispatcher:
+    """Despachante central das chamadas REST para o Discord.
+
+    Todos os módulos enviam suas chamadas para cá com uma classe de prioridade e uma
+    rota "tipo:método:id", com o id do parâmetro principal que o Discord usa para
+    limitar a rota: o canal em "channel:send:<channel_id>" e o servidor (não o membro)
+    em "member:roles:<guild_id>". Cada rota tem o seu balde de tokens e existe um balde
+    global; a próxima chamada executada é sempre a de maior prioridade cuja rota tem
+    orçamento disponível, então uma fila de edições de contador nunca atrasa uma
+    expulsão ou uma troca de cargos.
+
+    Das `concurrency` chamadas simultâneas, `reserved_slots` ficam reservadas para
+    moderação e cargos: respostas e cosméticos lentos (ou esperando o retry de um 429)
+    não conseguem ocupar todas as vagas enquanto uma expulsão espera.
+    """
+
+    def __init__(self, concurrency=4, route_limits=None, global_limit=DEFAULT_GLOBAL_LIMIT,
+                 bucket_ttl=DEFAULT_BUCKET_TTL, reserved_slots=1):
+        self.concurrency = concurrency
+        # Vagas que chamadas menos urgentes que PRIORITY_ROLES podem ocupar ao mesmo tempo
+        self.shared_slots = max(1, concurrency - reserved_slots)
+        self._shared_running = 0
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS)
+        if route_limits:
+            self.route_limits.update(route_limits)
+        self._global_bucket = _TokenBucket(*global_limit)
+        self.bucket_ttl = bucket_ttl
+        # Um balde por rota; os ociosos expiram para o dicionário não crescer a cada canal/servidor
+        self._buckets = TTLDict(ttl=bucket_ttl)
+        # Lista ordenada de (prioridade, seq, job)
+        self._pending = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._slots = None
+        self._runner = None
+
+        # Métricas
+        self.calls_by_route = {}
+        self.rate_limited = 0
+        self.wait_stats = {
+            name: {"count": 0, "total": 0.0, "max": 0.0} for name in PRIORITY_NAMES.values()
+        }
+
+    def _ensure_running(self):
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    def _limit(self, route):
+        kind, _, rest = route.partition(":")
+        method = rest.split(":", 1)[0]
+        limit = self.route_limits.get(f"{kind}:{method}") or self.route_limits.get(kind)
+        return limit or self.route_limits["default"]
+
+    def _bucket(self, route, ttl=None):
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            bucket = _TokenBucket(*self._limit(route))
+        # Cada uso renova a validade do balde
+        self._buckets.set(route, bucket, ttl=ttl)
+        return bucket
+
+    async def submit(self, priority, route, factory):
+        """Enfileira `factory` (função que devolve a corrotina da chamada) e aguarda o resultado"""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(_Job(priority, route, factory, future))
+        return await future
+
+    def _enqueue(self, job):
+        bisect.insort(self._pending, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def _next_ready(self):
+        """Retorna (job, None) se houver uma chamada pronta, ou (None, espera) caso contrário"""
+        now = time.monotonic()
+        global_wait = self._global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        # Quem pediu desistiu (task cancelada): descartar
+        if any(job.future.done() for _, _, job in self._pending):
+            self._pending = [entry for entry in self._pending if not entry[2].future.done()]
+
+        min_wait = None
+        shared_full = self._shared_running >= self.shared_slots
+        for index, (priority, _, job) in enumerate(self._pending):
+            if shared_full and priority > PRIORITY_ROLES:
+                # Sem vaga compartilhada: só moderação e cargos. O fim de uma chamada acorda o loop
+                break
+            bucket = self._bucket(job.route)
+            wait = bucket.wait_time(now)
+            if wait == 0:
+                del self._pending[index]
+                bucket.consume(now)
+                self._global_bucket.consume(now)
+                return job, None
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            job = None
+            while job is None:
+                job, wait = self._next_ready()
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+
+            shared = job.priority > PRIORITY_ROLES
+            if shared:
+                self._shared_running += 1
+            task = asyncio.get_running_loop().create_task(self._execute(job))
+            task.add_done_callback(partial(self._release, shared))
+
+    def _release(self, shared, _task):
+        self._slots.release()
+        if shared:
+            self._shared_running -= 1
+            # Pode haver chamadas esperando justamente por essa vaga compartilhada
+            self._wakeup.set()
+
+    async def _execute(self, job):
+        stats = self.wait_stats[PRIORITY_NAMES.get(job.priority, "cosmetic")]
+        waited = time.monotonic() - job.enqueued_at
+        stats["count"] += 1
+        stats["total"] += waited
+        stats["max"] = max(stats["max"], waited)
+
+        # Rota sem o id (ex.: "channel:send")
+        kind = job.route.rsplit(":", 1)[0]
+        self.calls_by_route[kind] = self.calls_by_route.get(kind, 0) + 1
+
+        job.attempts += 1
+        try:
+            result = await job.factory()
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is None and getattr(e, "status", None) == 429:
+                retry_after = 5.0
+            if retry_after is not None:
+                # 429: bloquear a rota pelo tempo pedido e tentar de novo uma vez
+                self.rate_limited += 1
+                # O balde bloqueado não pode expirar antes do fim do bloqueio
+                bucket = self._bucket(job.route, ttl=self.bucket_ttl + float(retry_after))
+                bucket.block(time.monotonic() + float(retry_after))
+                print(f"Rate limit na rota {job.route}: aguardando {float(retry_after):.1f}s")
+                if job.attempts < 2 and not job.future.done():
+                    job.enqueued_at = time.monotonic()
+                    self._enqueue(job)
+                    return
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def metrics(self):
+        """Profundidade da fila e tempo de espera por classe de prioridade"""
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _ in self._pending:
+            depth[PRIORITY_NAMES.get(priority, "cosmetic")] += 1
+
+        wait_time = {}
+        for name, stats in self.wait_stats.items():
+            wait_time[name] = {
+                "count": stats["count"],
+                "avg": stats["total"] / stats["count"] if stats["count"] else 0.0,
+                "max": stats["max"],
+            }
+
+        return {
+            "queue_depth": depth,
+            "wait_time": wait_time,
+            "calls_by_route": dict(self.calls_by_route),
+            "rate_limited": self.rate_limited,
+        }
+
+    # Atalhos para as chamadas usadas pelos módulos
+
+    async def send(self, channel, *args, priority=PRIORITY_REPLIES, **kwargs):
+        return await self.submit(priority, f"channel:send:{channel.id}", lambda: channel.send(*args, **kwargs))
+
+    async def reply(self, message, *args, priority=PRIORITY_REPLIES, **kwargs):
+        return await self.submit(priority, f"channel:send:{message.channel.id}", lambda: message.reply(*args, **kwargs))
+
+    async def fetch_message(self, channel, message_id, priority=PRIORITY_REPLIES):
+        return await self.submit(priority, f"channel:fetch:{channel.id}", lambda: channel.fetch_message(message_id))
+
+    async def edit_message(self, message, priority=PRIORITY_COSMETIC, **kwargs):
+        return await self.submit(priority, f"channel:edit:{message.channel.id}", lambda: message.edit(**kwargs))
+
+    async def delete_message(self, message, priority=PRIORITY_COSMETIC):
+        return await self.submit(priority, f"channel:delete:{message.channel.id}", lambda: message.delete())
+
+    async def edit_member(self, member, priority=PRIORITY_ROLES, **kwargs):
+        return await self.submit(priority, f"member:edit:{member.guild.id}", lambda: member.edit(**kwargs))
+
+    async def add_roles(self, member, *roles, priority=PRIORITY_ROLES, reason=None):
+        return await self.submit(priority, f"member:roles:{member.guild.id}", lambda: member.add_roles(*roles, reason=reason))
+
+    async def remove_roles(self, member, *roles, priority=PRIORITY_ROLES, reason=None):
+        return await self.submit(priority, f"member:roles:{member.guild.id}", lambda: member.remove_roles(*roles, reason=reason))
+
+    async def move_to(self, member, channel, priority=PRIORITY_MODERATION):
+        return await self.submit(priority, f"member:edit:{member.guild.id}", lambda: member.move_to(channel))
@@ -0,0 +1,112 @@
+import asyncio
+from collections import OrderedDict
+from utils.dispatcher import PRIORITY_COSMETIC, PRIORITY_REPLIES
+
+
+class MessageEditCoalescer:
+    """Agrupa edições de uma mesma mensagem: só a renderização mais recente é enviada.
+
+    Edições de contador (`submit`) substituem a edição pendente anterior da mesma
+    mensagem, que é descartada sem ir para a API. Uma edição de estado final
+    (`finalize`: aprovado, expulso, saiu) cancela todas as edições de contador ainda
+    pendentes daquela mensagem e espera a que já está em andamento terminar, para
+    que um contador atrasado nunca sobrescreva o estado final.
+    """
+
+    def __init__(self, dispatcher, max_finalized=500):
+        self.dispatcher = dispatcher
+        self.max_finalized = max_finalized
+        # message_id -> (kwargs, priority) da renderização mais recente ainda não enviada
+        self._pending = {}
+        # message_id -> task que envia as edições pendentes da mensagem, uma de cada vez
+        self._drains = {}
+        # message_id -> (started, finished) da edição que está na fila de saída
+        self._inflight = {}
+        # Mensagens que já receberam o estado final (limitado para não crescer sem fim)
+        self._finalized = OrderedDict()
+
+        # Métricas
+        self.sent = 0
+        self.superseded = 0
+        self.cancelled = 0
+
+    def submit(self, message, priority=PRIORITY_COSMETIC, **kwargs):
+        """Agenda uma edição de contador; substitui a edição pendente anterior da mesma mensagem"""
+        message_id = message.id
+        if message_id in self._finalized:
+            self.cancelled += 1
+            return
+
+        if message_id in self._pending:
+            self.superseded += 1
+        self._pending[message_id] = (kwargs, priority)
+
+        if message_id not in self._drains:
+            self._drains[message_id] = asyncio.get_running_loop().create_task(self._drain(message))
+
+    async def _drain(self, message):
+        message_id = message.id
+        try:
+            while message_id in self._pending:
+                kwargs, priority = self._pending.pop(message_id)
+                inflight = (asyncio.Event(), asyncio.Event())
+                self._inflight[message_id] = inflight
+
+                async def run(kwargs=kwargs, inflight=inflight):
+                    started, finished = inflight
+                    started.set()
+                    try:
+                        return await message.edit(**kwargs)
+                    finally:
+                        finished.set()
+
+                try:
+                    await self.dispatcher.submit(priority, f"channel:edit:{message.channel.id}", run)
+                    self.sent += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Erro ao editar mensagem {message_id}: {e}")
+                finally:
+                    if self._inflight.get(message_id) is inflight:
+                        del self._inflight[message_id]
+        finally:
+            if self._drains.get(message_id) is asyncio.current_task():
+                del self._drains[message_id]
+
+    def discard(self, message):
+        """Descarta as edições de contador pendentes da mensagem (ex.: antes de apagá-la)"""
+        message_id = message.id
+        self._mark_finalized(message_id)
+        if self._pending.pop(message_id, None) is not None:
+            self.cancelled += 1
+        drain = self._drains.pop(message_id, None)
+        if drain:
+            drain.cancel()
+        return self._inflight.get(message_id)
+
+    async def finalize(self, message, priority=PRIORITY_REPLIES, **kwargs):
+        """Envia a edição de estado final, cancelando os contadores pendentes da mensagem"""
+        inflight = self.discard(message)
+
+        # Uma edição de contador que já saiu para a API precisa terminar antes do estado final
+        if inflight:
+            started, finished = inflight
+            if started.is_set():
+                await finished.wait()
+
+        return await self.dispatcher.edit_message(message, priority=priority, **kwargs)
+
+    def _mark_finalized(self, message_id):
+        self._finalized[message_id] = True
+        self._finalized.move_to_end(message_id)
+        while len(self._finalized) > self.max_finalized:
+            self._finalized.popitem(last=False)
+
+    def metrics(self):
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "superseded": self.superseded,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,118 @@
+import asyncio
+from collections import deque
+from utils.metrics import Histogram
+
+
+class VoiceEventRouter:
+    """Distribui os eventos de voz para os módulos registrados.
+
+    Cada módulo processa os eventos em paralelo com os outros, então um handler lento
+    de um módulo não atrasa o outro. Dentro de um mesmo módulo, os eventos de um mesmo
+    membro ficam em uma fila própria e são processados um de cada vez, na ordem em que
+    chegaram; membros diferentes não esperam uns pelos outros. A fila (e a task que a
+    esvazia) só existe enquanto houver eventos pendentes daquele membro.
+
+    Cada módulo declara os canais de voz que observa. Um índice canal -> módulos
+    descarta em O(1), antes de qualquer handler ou busca de cache, os eventos em que
+    nem o canal de antes nem o de depois interessam a alguém (a maioria: mute/deafen
+    em outros canais do servidor).
+    """
+
+    def __init__(self):
+        # Lista de (nome, handler) na ordem de registro
+        self._handlers = []
+        # channel_id -> [(nome, handler)] dos módulos que observam o canal
+        self._channel_index = {}
+        # Módulos registrados sem lista de canais recebem todos os eventos
+        self._wildcard = []
+        # (nome, member_id) -> deque de (member, before, after) ainda não processados
+        self._queues = {}
+        # (nome, member_id) -> task que esvazia a fila
+        self._workers = {}
+
+        # Métricas
+        self.processed = {}
+        self.errors = {}
+        self.max_queue_depth = 0
+        self.routed = 0
+        self.dropped = 0
+        self.latency = Histogram("tribunaldo_voice_handler_seconds",
+                                 "Duração de cada handler de on_voice_state_update", ["subsystem"])
+
+    def register(self, name, handler, channel_ids=None):
+        """Registra o handler assíncrono `handler(member, before, after)` de um módulo.
+
+        `channel_ids`: canais de voz observados pelo módulo; None recebe todos os eventos.
+        """
+        entry = (name, handler)
+        self._handlers.append(entry)
+        if channel_ids is None:
+            self._wildcard.append(entry)
+        else:
+            for channel_id in channel_ids:
+                self._channel_index.setdefault(channel_id, []).append(entry)
+        self.processed[name] = 0
+        self.errors[name] = 0
+
+    def _interested(self, before, after):
+        """Módulos que observam o canal de antes ou o de depois, sem repetir"""
+        before_id = before.channel.id if before.channel else None
+        after_id = after.channel.id if after.channel else None
+        entries = self._channel_index.get(before_id, [])
+        if after_id != before_id:
+            entries = entries + [entry for entry in self._channel_index.get(after_id, []) if entry not in entries]
+        return self._wildcard + entries if self._wildcard else entries
+
+    def dispatch(self, member, before, after):
+        """Enfileira o evento para os módulos interessados sem esperar nenhum handler terminar"""
+        interested = self._interested(before, after)
+        if not interested:
+            self.dropped += 1
+            return
+        self.routed += 1
+
+        loop = asyncio.get_running_loop()
+        for name, handler in interested:
+            key = (name, member.id)
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+            queue.append((member, before, after))
+            self.max_queue_depth = max(self.max_queue_depth, len(queue))
+
+            if key not in self._workers:
+                self._workers[key] = loop.create_task(self._drain(key, handler))
+
+    async def _drain(self, key, handler):
+        name = key[0]
+        queue = self._queues[key]
+        try:
+            while queue:
+                member, before, after = queue.popleft()
+                try:
+                    with self.latency.time(subsystem=name):
+                        await handler(member, before, after)
+                    self.processed[name] += 1
+                except Exception as e:
+                    self.errors[name] += 1
+                    print(f"Erro no handler de voz '{name}' para {member}: {e}")
+        finally:
+            del self._workers[key]
+            if not queue:
+                del self._queues[key]
+
+    async def join(self):
+        """Aguarda todos os eventos já enfileirados serem processados (ex.: antes de encerrar)"""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    def metrics(self):
+        return {
+            "routed": self.routed,
+            "dropped": self.dropped,
+            "active_queues": len(self._queues),
+            "pending_events": sum(len(queue) for queue in self._queues.values()),
+            "max_queue_depth": self.max_queue_depth,
+            "processed": dict(self.processed),
+            "errors": dict(self.errors),
+        }
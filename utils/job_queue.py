@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import heapq
+import asyncio
+from functools import partial
+from utils.persistence import WriteBehindWriter
+from utils.scheduler import DeadlineScheduler
+
+
+class PersistentJobQueue:
+    """Fila durável de tarefas atrasadas no formato (due_time, member_id, action).
+
+    As tarefas ficam gravadas em disco como um heap ordenado pelo prazo, para
+    sobreviverem a reinícios do bot. Depois de `start()`, cada tarefa é executada
+    pelo agendador compartilhado no seu prazo; as que venceram enquanto o bot
+    estava fora são processadas em um único lote com concorrência limitada.
+    """
+
+    def __init__(self, path, max_concurrency=5):
+        self.path = path
+        self.max_concurrency = max_concurrency
+        # (action, member_id) -> due_time (epoch)
+        self._jobs = {}
+        self._handlers = {}
+        self._started = False
+        self.scheduler = DeadlineScheduler()
+        # max_pending=1: toda alteração é gravada logo, mas sempre fora do event loop
+        self.writer = WriteBehindWriter(path, self._snapshot, flush_interval=1.0, max_pending=1)
+        self.load()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def register(self, action, handler):
+        """Registra a função assíncrona `handler(member_id)` que executa a ação"""
+        self._handlers[action] = handler
+
+    def load(self):
+        """Carrega as tarefas pendentes do disco"""
+        self._jobs = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for due_time, member_id, action in json.load(f).get("jobs", []):
+                    self._jobs[(action, int(member_id))] = due_time
+        except Exception as e:
+            print(f"Erro ao carregar fila de tarefas {os.path.basename(self.path)}: {e}")
+
+    def _snapshot(self, _dirty):
+        jobs = [[due_time, member_id, action] for (action, member_id), due_time in self._jobs.items()]
+        heapq.heapify(jobs)
+        return {"jobs": jobs}
+
+    def add(self, due_time, member_id, action):
+        """Agenda (ou reagenda) a ação para o membro no horário `due_time` (epoch)"""
+        key = (action, member_id)
+        self._jobs[key] = due_time
+        self.writer.mark_dirty(key)
+        if self._started:
+            self._schedule(key, due_time)
+
+    def cancel(self, member_id, action):
+        """Remove a tarefa pendente. Retorna True se ela existia"""
+        key = (action, member_id)
+        if key not in self._jobs:
+            return False
+        del self._jobs[key]
+        self.scheduler.cancel(key)
+        self.writer.mark_dirty(key)
+        return True
+
+    def has_job(self, member_id, action):
+        return (action, member_id) in self._jobs
+
+    def member_ids(self):
+        """Ids dos membros com alguma tarefa pendente"""
+        return {member_id for _, member_id in self._jobs}
+
+    async def start(self):
+        """Processa as tarefas vencidas em lote e agenda as demais. Pode ser chamado mais de uma vez"""
+        if self._started:
+            return
+        self._started = True
+
+        now = time.time()
+        overdue = []
+        for key, due_time in list(self._jobs.items()):
+            if due_time <= now:
+                overdue.append(key)
+            else:
+                self._schedule(key, due_time)
+
+        if overdue:
+            print(f"Processando {len(overdue)} tarefa(s) vencida(s) de {os.path.basename(self.path)}...")
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def run_limited(key):
+                async with semaphore:
+                    await self._run(key)
+
+            await asyncio.gather(*(run_limited(key) for key in overdue))
+
+    def _schedule(self, key, due_time):
+        self.scheduler.schedule(key, due_time - time.time(), partial(self._run, key))
+
+    async def _run(self, key):
+        action, member_id = key
+        handler = self._handlers.get(action)
+        if handler is None:
+            print(f"Nenhum handler registrado para a ação {action}")
+            return
+
+        due_time = self._jobs.get(key)
+        try:
+            await handler(member_id)
+        except Exception as e:
+            print(f"Erro ao executar {action} para {member_id}: {e}")
+        finally:
+            # Tarefa executada (ou que falhou) não volta para a fila, a menos que tenha sido reagendada
+            if key in self._jobs and self._jobs[key] == due_time:
+                del self._jobs[key]
+                self.writer.mark_dirty(key)
+
+    async def flush(self):
+        await self.writer.close()
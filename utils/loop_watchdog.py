@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque, Counter
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mensagem que o asyncio registra (em modo debug) quando um callback passa de slow_callback_duration
+SLOW_CALLBACK_MESSAGE = "Executing %s took %.3f seconds"
+
+
+def _describe(frame_summary):
+    path = os.path.abspath(frame_summary.filename)
+    if path.startswith(PROJECT_ROOT + os.sep):
+        path = os.path.relpath(path, PROJECT_ROOT)
+    else:
+        path = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{path}:{frame_summary.lineno} em {frame_summary.name}"
+
+
+def _culprit(stack):
+    """Frame mais recente do projeto na pilha (quem chamou o código que travou o loop)"""
+    for frame_summary in reversed(stack):
+        if os.path.abspath(frame_summary.filename).startswith(PROJECT_ROOT + os.sep):
+            return _describe(frame_summary)
+    return _describe(stack[-1]) if stack else "desconhecido"
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Captura os avisos de callback lento do logger "asyncio" e repassa para o watchdog"""
+
+    def __init__(self, watchdog):
+        super().__init__(logging.WARNING)
+        self.watchdog = watchdog
+
+    def emit(self, record):
+        if record.msg == SLOW_CALLBACK_MESSAGE and record.args and len(record.args) == 2:
+            self.watchdog._record_slow_callback(str(record.args[0]), record.args[1])
+
+
+class LoopWatchdog:
+    """Vigia do event loop: mede o atraso continuamente e descobre quem travou o loop.
+
+    Uma task de batimento acorda a cada `interval` segundos e mede quanto passou do
+    horário esperado (o atraso do loop). Uma thread à parte acompanha esses batimentos;
+    quando o atraso passa de `stall_threshold`, ela amostra a pilha da thread do loop
+    (sys._current_frames) a cada `sample_interval` segundos enquanto o loop estiver
+    parado. No batimento seguinte o travamento vira um relatório com a duração e o
+    trecho do projeto que mais apareceu nas amostras.
+
+    Com `debug=True`, o modo debug do asyncio também é ligado e os callbacks que passam
+    de `slow_callback_duration` são registrados com o nome da task/corrotina. O modo
+    debug custa CPU: fica desligado por padrão.
+
+    `on_stall(report)` (corrotina) é chamado no event loop para cada travamento, no
+    máximo uma vez a cada `report_cooldown` segundos.
+    """
+
+    def __init__(self, interval=0.25, stall_threshold=0.5, sample_interval=0.05, debug=False,
+                 slow_callback_duration=0.1, histogram=None, on_stall=None, report_cooldown=60.0,
+                 max_reports=20):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.sample_interval = sample_interval
+        self.debug = debug
+        self.slow_callback_duration = slow_callback_duration
+        self.histogram = histogram
+        self.on_stall = on_stall
+        self.report_cooldown = report_cooldown
+
+        self.stalls = deque(maxlen=max_reports)
+        self.slow_callbacks = deque(maxlen=max_reports)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.slow_callback_count = 0
+
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        # Amostras do travamento em andamento (escritas pela thread, lidas pelo loop)
+        self._samples_lock = threading.Lock()
+        self._samples = Counter()
+        self._sample_stacks = {}
+        self._log_handler = None
+        self._last_report_at = 0.0
+        self._suppressed_reports = 0
+
+    def start(self):
+        """Inicia o batimento e a thread de amostragem (chamar de dentro do event loop)"""
+        if self._task is not None and not self._task.done():
+            return
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+
+        if self.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_callback_duration
+            self._log_handler = _SlowCallbackHandler(self)
+            logging.getLogger("asyncio").addHandler(self._log_handler)
+
+        self._task = loop.create_task(self._heartbeat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._log_handler:
+            logging.getLogger("asyncio").removeHandler(self._log_handler)
+            self._log_handler = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if self.histogram is not None:
+                self.histogram.observe(lag)
+            if lag >= self.stall_threshold:
+                self._finish_stall(lag)
+
+    def _sample_loop(self):
+        """Thread de amostragem: só olha a pilha do loop enquanto ele estiver travado"""
+        while not self._stop.wait(self.sample_interval):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue < self.stall_threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=40)
+            del frame
+            culprit = _culprit(stack)
+            with self._samples_lock:
+                self._samples[culprit] += 1
+                if culprit not in self._sample_stacks:
+                    self._sample_stacks[culprit] = [_describe(frame_summary) for frame_summary in stack[-8:]]
+
+    def _finish_stall(self, lag):
+        with self._samples_lock:
+            samples, stacks = self._samples, self._sample_stacks
+            self._samples, self._sample_stacks = Counter(), {}
+
+        if samples:
+            culprit, hits = samples.most_common(1)[0]
+            stack = stacks[culprit]
+        else:
+            culprit, hits, stack = "desconhecido (travamento curto demais para ser amostrado)", 0, []
+
+        report = {
+            "at": time.time(),
+            "duration": lag,
+            "culprit": culprit,
+            "samples": sum(samples.values()),
+            "culprit_samples": hits,
+            "stack": stack,
+        }
+        self.stalls.append(report)
+        self.stall_count += 1
+        print(f"Event loop travado por {lag:.3f}s - provável causa: {culprit}")
+        self._notify(report)
+
+    def _record_slow_callback(self, callback, duration):
+        self.slow_callbacks.append({"at": time.time(), "duration": duration, "callback": callback})
+        self.slow_callback_count += 1
+
+    def _notify(self, report):
+        if self.on_stall is None:
+            return
+        now = time.monotonic()
+        if now - self._last_report_at < self.report_cooldown:
+            self._suppressed_reports += 1
+            return
+        self._last_report_at = now
+        report = dict(report, suppressed=self._suppressed_reports)
+        self._suppressed_reports = 0
+        asyncio.get_running_loop().create_task(self._safe_notify(report))
+
+    async def _safe_notify(self, report):
+        try:
+            await self.on_stall(report)
+        except Exception as e:
+            print(f"Erro ao reportar travamento do event loop: {e}")
+
+    def metrics(self):
+        return {
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "stalls": self.stall_count,
+            "slow_callbacks": self.slow_callback_count,
+            "debug": self.debug,
+        }
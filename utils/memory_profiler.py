@@ -0,0 +1,141 @@
+import os
+import asyncio
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows não tem o módulo resource: a amostra sai sem o RSS máximo
+    resource = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Intervalo mínimo entre amostras (segundos): cada snapshot segura a GIL enquanto roda
+MIN_INTERVAL = 60
+
+# Arquivos do projeto -> subsistema (o resto do projeto conta como "bot")
+PROJECT_SUBSYSTEMS = {
+    "events/chat_bot.py": "chat_bot",
+    "utils/chat_storage.py": "chat_bot",
+    "utils/response_cache.py": "chat_bot",
+    "utils/admission.py": "chat_bot",
+    "utils/edit_coalescer.py": "chat_bot",
+    "events/focus_mode.py": "focus_mode",
+    "utils/job_queue.py": "focus_mode",
+    "events/study_cam_mode.py": "study_cam",
+    "utils/countdown.py": "study_cam",
+    "utils/deletion_scheduler.py": "study_cam",
+    "utils/event_router.py": "voice_router",
+    "utils/dispatcher.py": "dispatcher",
+}
+
+# Bibliotecas de fora do projeto, pelo trecho do caminho
+LIBRARY_SUBSYSTEMS = (
+    (os.sep + "discord" + os.sep, "discord.py"),
+    (os.sep + "aiohttp" + os.sep, "discord.py"),
+    (os.sep + "google" + os.sep, "gemini_sdk"),
+    (os.sep + "grpc" + os.sep, "gemini_sdk"),
+)
+
+
+def _subsystem_of(traceback):
+    """Subsistema responsável pela alocação: o frame mais recente do projeto ou, sem ele, a biblioteca"""
+    for frame in reversed(traceback):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(PROJECT_ROOT + os.sep):
+            relative = os.path.relpath(path, PROJECT_ROOT).replace(os.sep, "/")
+            return PROJECT_SUBSYSTEMS.get(relative, "bot")
+
+    path = os.path.abspath(traceback[-1].filename) if len(traceback) else ""
+    for fragment, name in LIBRARY_SUBSYSTEMS:
+        if fragment in path:
+            return name
+    return "python"
+
+
+def _max_rss_bytes():
+    """Pico de memória residente do processo, ou None onde não há o módulo resource"""
+    if resource is None:
+        return None
+    # ru_maxrss vem em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryProfiler:
+    """Amostragem periódica do uso de memória com tracemalloc, agrupada por subsistema.
+
+    Cada alocação ainda viva é atribuída ao frame mais recente do projeto na sua pilha
+    (até `frames` níveis), então o cache de membros do discord.py criado a partir do
+    gateway aparece como "discord.py" e o histórico do chat bot como "chat_bot".
+    O próprio tracemalloc tem custo de memória e CPU: fica desligado por padrão, e o
+    intervalo nunca é menor que `MIN_INTERVAL`.
+    """
+
+    def __init__(self, interval=300, frames=8, top=10):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.frames = frames
+        self.top = top
+        self.last_sample = None
+        self._task = None
+
+    def start_tracing(self):
+        """Liga o tracemalloc (o quanto antes, para pegar as alocações do início)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def start(self):
+        """Inicia a amostragem periódica (chamado no on_ready). Pode ser chamado mais de uma vez"""
+        self.start_tracing()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        tracemalloc.stop()
+
+    def sample(self):
+        """Tira um snapshot e devolve o total rastreado por subsistema (bytes), do maior para o menor"""
+        snapshot = tracemalloc.take_snapshot()
+        snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+        by_subsystem = {}
+        for stat in snapshot.statistics("traceback"):
+            name = _subsystem_of(stat.traceback)
+            by_subsystem[name] = by_subsystem.get(name, 0) + stat.size
+
+        current, peak = tracemalloc.get_traced_memory()
+        self.last_sample = {
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "max_rss_bytes": _max_rss_bytes(),
+            "subsystems": dict(sorted(by_subsystem.items(), key=lambda item: item[1], reverse=True)),
+        }
+        return self.last_sample
+
+    def format_report(self, sample=None):
+        sample = sample or self.last_sample
+        if not sample:
+            return "Nenhuma amostra de memória ainda."
+
+        mb = 1024 * 1024
+        max_rss = sample["max_rss_bytes"]
+        max_rss = "n/d" if max_rss is None else f"{max_rss / mb:.1f} MB"
+        lines = [f"Memória: {sample['traced_bytes'] / mb:.1f} MB rastreados "
+                 f"(pico {sample['traced_peak_bytes'] / mb:.1f} MB), RSS máx. {max_rss}"]
+        for name, size in list(sample["subsystems"].items())[:self.top]:
+            lines.append(f"  {name}: {size / mb:.2f} MB")
+        return "\n".join(lines)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # O snapshot percorre todas as alocações. Numa thread o loop ainda roda entre
+                # as trocas de GIL, mas take_snapshot segura a GIL por boa parte do tempo e
+                # atrasa o loop mesmo assim; por isso o intervalo tem um mínimo (MIN_INTERVAL)
+                sample = await asyncio.to_thread(self.sample)
+                print(self.format_report(sample))
+            except Exception as e:
+                print(f"Erro na amostragem de memória: {e}")
@@ -0,0 +1,135 @@
+import os
+import json
+import asyncio
+import tempfile
+
+
+def atomic_write_json(path, data, indent=None):
+    """Grava o JSON em um arquivo temporário e troca pelo definitivo (write + rename atômico)"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class WriteBehindWriter:
+    """Camada write-behind para arquivos JSON.
+
+    As alterações só marcam chaves como sujas; a gravação acontece em lote a cada
+    `flush_interval` segundos ou a cada `max_pending` alterações, o que vier primeiro.
+    A serialização e a escrita em disco rodam em uma thread (asyncio.to_thread), mas o
+    documento inteiro é serializado a cada gravação e o json.dump segura a GIL durante
+    boa parte desse tempo: com documentos grandes o event loop ainda trava por quase o
+    mesmo tempo da gravação síncrona, só que com menos frequência. Para dados grandes,
+    usar um armazenamento que grave só o que mudou (ex.: SQLite).
+
+    `snapshot(dirty_keys)` é chamado no event loop e deve devolver o documento
+    completo a ser gravado, copiando apenas o que pode mudar enquanto a escrita roda.
+    """
+
+    def __init__(self, path, snapshot, flush_interval=5.0, max_pending=20, indent=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.indent = indent
+        self._snapshot = snapshot
+        self._dirty = set()
+        self._pending_changes = 0
+        self._timer = None
+        self._flush_task = None
+        self._lock = None
+        self.flush_count = 0
+
+    @property
+    def pending_changes(self):
+        return self._pending_changes
+
+    def mark_dirty(self, key):
+        """Marca uma chave como alterada e agenda a gravação em lote"""
+        self._dirty.add(key)
+        self._pending_changes += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Fora do event loop (inicialização/encerramento): grava na hora
+            self.flush_sync()
+            return
+
+        if self._pending_changes >= self.max_pending:
+            self._start_flush(loop)
+        elif self._timer is None and (self._flush_task is None or self._flush_task.done()):
+            self._timer = loop.call_later(self.flush_interval, self._start_flush, loop)
+
+    def _start_flush(self, loop):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task and not self._flush_task.done():
+            return
+        self._flush_task = loop.create_task(self.flush())
+
+    async def flush(self):
+        """Grava todas as alterações pendentes em disco, fora do event loop"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+
+            dirty, self._dirty = self._dirty, set()
+            self._pending_changes = 0
+            data = self._snapshot(dirty)
+            try:
+                await asyncio.to_thread(atomic_write_json, self.path, data, self.indent)
+                self.flush_count += 1
+            except Exception as e:
+                print(f"Erro ao gravar {os.path.basename(self.path)}: {e}")
+                self._dirty |= dirty
+                self._pending_changes += len(dirty)
+                return
+
+        # Alterações feitas durante a escrita entram no próximo lote
+        if self._dirty:
+            loop = asyncio.get_running_loop()
+            if self._pending_changes >= self.max_pending:
+                self._flush_task = loop.create_task(self.flush())
+            elif self._timer is None:
+                self._timer = loop.call_later(self.flush_interval, self._start_flush, loop)
+
+    def flush_sync(self):
+        """Grava as alterações pendentes de forma síncrona (uso fora do event loop)"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        self._pending_changes = 0
+        try:
+            atomic_write_json(self.path, self._snapshot(dirty), self.indent)
+            self.flush_count += 1
+        except Exception as e:
+            print(f"Erro ao gravar {os.path.basename(self.path)}: {e}")
+            self._dirty |= dirty
+
+    async def close(self):
+        """Força a gravação final das alterações pendentes"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task and not self._flush_task.done():
+            await self._flush_task
+        await self.flush()
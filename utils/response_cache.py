@@ -0,0 +1,102 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Cache de respostas com TTL, despejo LRU e limite de memória.
+
+    `get_or_create(key, factory)` devolve a resposta em cache ou chama `factory()`
+    (corrotina) para gerá-la. Pedidos simultâneos com a mesma chave compartilham uma
+    única geração em andamento. A geração roda em uma task própria: se quem pediu
+    primeiro desistir (task cancelada), os outros continuam esperando o resultado.
+    Erros não ficam em cache.
+    """
+
+    def __init__(self, ttl=600.0, max_entries=256, max_bytes=1_000_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (valor, expira_em, tamanho em bytes), do menos para o mais recente
+        self._entries = OrderedDict()
+        # key -> task da geração em andamento
+        self._inflight = {}
+        self._bytes = 0
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Retorna o valor em cache (e marca como usado recentemente) ou None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        if key in self._entries:
+            self._remove(key)
+        size = len(str(key).encode("utf-8")) + len(str(value).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    async def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+        else:
+            self.misses += 1
+            task = asyncio.get_running_loop().create_task(self._create(key, factory))
+            # Evita o aviso de exceção não lida se todos os interessados desistirem
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _create(self, key, factory):
+        try:
+            value = await factory()
+            if value is not None:
+                self.set(key, value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def metrics(self):
+        lookups = self.hits + self.misses + self.deduplicated
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.deduplicated) / lookups if lookups else 0.0,
+        }
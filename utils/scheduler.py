@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+
+
+class DeadlineScheduler:
+    """Agendador único de prazos baseado em um heap indexado.
+
+    Todos os prazos (contadores regressivos, expulsões, etc.) ficam em um só heap e
+    um único TimerHandle do loop é armado para o prazo mais próximo. Nada acorda
+    enquanto nenhum prazo vence, e cancelar um prazo pela chave custa O(log n).
+    """
+
+    def __init__(self):
+        # Cada entrada é [deadline, seq, key, callback]
+        self._heap = []
+        # Posição de cada chave dentro do heap, para cancelamento em O(log n)
+        self._positions = {}
+        self._seq = itertools.count()
+        self._timer = None
+        self._timer_deadline = None
+        self._running_tasks = set()
+        # Quantas vezes o loop foi acordado para processar prazos vencidos
+        self.wakeups = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def schedule(self, key, delay, callback):
+        """Agenda `callback` (função assíncrona sem argumentos) para daqui a `delay` segundos.
+
+        Se a chave já estiver agendada, o prazo anterior é substituído.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(0.0, delay)
+
+        if key in self._positions:
+            index = self._positions[key]
+            entry = self._heap[index]
+            old_deadline = entry[0]
+            entry[0] = deadline
+            entry[1] = next(self._seq)
+            entry[3] = callback
+            if deadline < old_deadline:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+        else:
+            entry = [deadline, next(self._seq), key, callback]
+            self._heap.append(entry)
+            self._positions[key] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+
+        self._rearm(loop)
+
+    def cancel(self, key):
+        """Cancela o prazo associado à chave. Retorna True se havia algo agendado"""
+        index = self._positions.pop(key, None)
+        if index is None:
+            return False
+
+        last = self._heap.pop()
+        if index < len(self._heap):
+            self._heap[index] = last
+            self._positions[last[2]] = index
+            self._sift_up(index)
+            self._sift_down(self._positions[last[2]])
+
+        if not self._heap and self._timer:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = None
+        return True
+
+    def remaining(self, key):
+        """Retorna quantos segundos faltam para o prazo da chave (ou None)"""
+        index = self._positions.get(key)
+        if index is None:
+            return None
+        return max(0.0, self._heap[index][0] - asyncio.get_running_loop().time())
+
+    def close(self):
+        """Descarta todos os prazos pendentes"""
+        if self._timer:
+            self._timer.cancel()
+        self._timer = None
+        self._timer_deadline = None
+        self._heap.clear()
+        self._positions.clear()
+
+    def _rearm(self, loop):
+        """Arma o timer do loop para o prazo mais próximo, se ele mudou"""
+        if not self._heap:
+            return
+        next_deadline = self._heap[0][0]
+        if self._timer and self._timer_deadline <= next_deadline:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer_deadline = next_deadline
+        self._timer = loop.call_at(next_deadline, self._fire, loop)
+
+    def _fire(self, loop):
+        """Executa todos os prazos vencidos e rearma o timer para o próximo"""
+        self._timer = None
+        self._timer_deadline = None
+        self.wakeups += 1
+
+        now = loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, key, callback = self._heap[0]
+            self.cancel(key)
+            task = loop.create_task(self._run_callback(key, callback))
+            self._running_tasks.add(task)
+            task.add_done_callback(self._running_tasks.discard)
+
+        self._rearm(loop)
+
+    async def _run_callback(self, key, callback):
+        try:
+            await callback()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Erro ao executar prazo agendado {key}: {e}")
+
+    def _sift_up(self, index):
+        heap = self._heap
+        entry = heap[index]
+        while index > 0:
+            parent = (index - 1) // 2
+            if heap[parent][:2] <= entry[:2]:
+                break
+            heap[index] = heap[parent]
+            self._positions[heap[index][2]] = index
+            index = parent
+        heap[index] = entry
+        self._positions[entry[2]] = index
+
+    def _sift_down(self, index):
+        heap = self._heap
+        size = len(heap)
+        entry = heap[index]
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1][:2] < heap[child][:2]:
+                child += 1
+            if entry[:2] <= heap[child][:2]:
+                break
+            heap[index] = heap[child]
+            self._positions[heap[index][2]] = index
+            index = child
+        heap[index] = entry
+        self._positions[entry[2]] = index
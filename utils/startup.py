@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import asyncio
+from utils.persistence import atomic_write_json
+
+# Limite de ids por pedido de chunk do gateway (query_members)
+QUERY_MEMBERS_BATCH = 100
+
+
+async def resolve_members(guild, member_ids, timeout=10.0):
+    """Garante no cache do servidor só os membros indicados, pelo gateway (sem paginar a API REST).
+
+    Ids que já estão no cache são ignorados; os demais são pedidos em lotes de 100,
+    cada lote com até `timeout` segundos. Retorna quantos membros foram buscados.
+    """
+    missing = [member_id for member_id in set(member_ids) if guild.get_member(member_id) is None]
+    if not missing or guild.chunked:
+        return 0
+
+    fetched = 0
+    for start in range(0, len(missing), QUERY_MEMBERS_BATCH):
+        batch = missing[start:start + QUERY_MEMBERS_BATCH]
+        try:
+            members = await asyncio.wait_for(
+                guild.query_members(user_ids=batch, limit=len(batch), presences=False, cache=True),
+                timeout
+            )
+            fetched += len(members)
+        except asyncio.TimeoutError:
+            print(f"Tempo esgotado ao buscar {len(batch)} membro(s) pelo gateway")
+    return fetched
+
+
+async def resolve_member(guild, member_id):
+    """Membro do cache ou, se não estiver lá, buscado individualmente pelo gateway"""
+    member = guild.get_member(member_id)
+    if member is not None or guild.chunked:
+        return member
+    await resolve_members(guild, [member_id])
+    return guild.get_member(member_id)
+
+
+def command_tree_fingerprint(tree, guild):
+    """Hash dos comandos registrados para o servidor (nome, descrição, parâmetros...)"""
+    payload = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: command.get("name", ""))
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+async def sync_commands_if_changed(tree, guild, path):
+    """Chama tree.sync só quando os comandos mudaram desde a última sincronização.
+
+    O hash da árvore sincronizada fica salvo em `path`. Retorna True se sincronizou.
+    """
+    fingerprint = command_tree_fingerprint(tree, guild)
+    data = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Erro ao ler {os.path.basename(path)}: {e}")
+
+    if data.get(str(guild.id)) == fingerprint:
+        return False
+
+    await tree.sync(guild=guild)
+    data[str(guild.id)] = fingerprint
+    atomic_write_json(path, data, indent=4)
+    return True
@@ -0,0 +1,164 @@
+import time
+from collections import OrderedDict
+
+
+class TTLDict:
+    """Dicionário em memória em que cada chave expira sozinha.
+
+    A expiração é preguiçosa (uma chave vencida some quando é consultada) e, além
+    disso, as escritas fazem uma varredura completa a cada `sweep_interval` segundos,
+    sem precisar de task ou timer. Com `max_size`, as chaves gravadas há mais tempo
+    são descartadas primeiro. Os prazos são em epoch (time.time), então o conteúdo
+    pode ser salvo com `snapshot()` e recarregado com `restore()` após um reinício.
+    """
+
+    def __init__(self, ttl, max_size=None, sweep_interval=60.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        # key -> (valor, expira_em), da escrita mais antiga para a mais recente
+        self._data = OrderedDict()
+        self._last_sweep = time.time()
+
+        # Métricas
+        self.expired = 0
+        self.evicted = 0
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Grava `key` com validade de `ttl` segundos (ou até `expires_at`, em epoch)"""
+        now = time.time()
+        if expires_at is None:
+            expires_at = now + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+
+        if self.max_size is not None:
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evicted += 1
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def _get_entry(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._data[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        entry = self._get_entry(key)
+        return default if entry is None else entry[0]
+
+    def __getitem__(self, key):
+        entry = self._get_entry(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[0]
+
+    def __contains__(self, key):
+        return self._get_entry(key) is not None
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def pop(self, key, default=None):
+        entry = self._get_entry(key)
+        if entry is None:
+            return default
+        del self._data[key]
+        return entry[0]
+
+    def expires_at(self, key):
+        entry = self._get_entry(key)
+        return None if entry is None else entry[1]
+
+    def sweep(self, now=None):
+        """Remove todas as chaves vencidas. Retorna quantas foram removidas"""
+        now = time.time() if now is None else now
+        self._last_sweep = now
+        expired_keys = [key for key, (_, expires_at) in self._data.items() if expires_at <= now]
+        for key in expired_keys:
+            del self._data[key]
+        self.expired += len(expired_keys)
+        return len(expired_keys)
+
+    def __len__(self):
+        self.sweep()
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        self.sweep()
+        return list(self._data.keys())
+
+    def items(self):
+        self.sweep()
+        return [(key, value) for key, (value, _) in self._data.items()]
+
+    def clear(self):
+        self._data.clear()
+
+    def snapshot(self):
+        """Cópia serializável: {chave: [valor, expira_em]} só com as chaves ainda válidas"""
+        self.sweep()
+        return {key: [value, expires_at] for key, (value, expires_at) in self._data.items()}
+
+    def restore(self, snapshot, key_type=None):
+        """Recarrega um `snapshot()`; `key_type` converte as chaves (ex.: int, vindas de JSON)"""
+        now = time.time()
+        for key, (value, expires_at) in snapshot.items():
+            if expires_at > now:
+                self.set(key_type(key) if key_type else key, value, expires_at=expires_at)
+
+
+class TTLSet:
+    """Conjunto em memória em que cada elemento expira sozinho (ver TTLDict)"""
+
+    def __init__(self, ttl, max_size=None, sweep_interval=60.0):
+        self._items = TTLDict(ttl, max_size=max_size, sweep_interval=sweep_interval)
+
+    def add(self, item, ttl=None):
+        """Adiciona (ou renova) o elemento com validade de `ttl` segundos"""
+        self._items.set(item, True, ttl=ttl)
+
+    def discard(self, item):
+        self._items.pop(item)
+
+    def remove(self, item):
+        if item not in self._items:
+            raise KeyError(item)
+        del self._items[item]
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.keys())
+
+    def clear(self):
+        self._items.clear()
+
+    def sweep(self):
+        return self._items.sweep()
+
+    def snapshot(self):
+        """Cópia serializável: {elemento: expira_em}"""
+        return {item: expires_at for item, (_, expires_at) in self._items.snapshot().items()}
+
+    def restore(self, snapshot, key_type=None):
+        now = time.time()
+        for item, expires_at in snapshot.items():
+            if expires_at > now:
+                self._items.set(key_type(item) if key_type else item, True, expires_at=expires_at)